@@ -1,14 +1,29 @@
 """
 도큐메딕 API 서버
+
+직접 실행하면 Flask 개발 서버로 뜹니다. 운영 환경에서는 serve.py (gunicorn 프리포크)로 실행합니다.
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import io
 import os
-import tempfile
-import shutil
-from google import genai
-from google.genai import types
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from draft_cache import cache_directives, create_draft_cache, make_key
+from item_catalog import get_catalog
+from gemini_client import API_KEY, lazy_client
+from metrics import CONTENT_TYPE, Metrics
+from quota_governor import get_governor, quota_error_status
+from single_flight import SingleFlight, request_key
+from prompt_cache import (
+    PromptCache, generate_content, generate_content_stream, input_tokens_header
+)
+from draft_service import (
+    APPLICATION_MAX_PARALLEL, CATEGORY_MAP, INLINE_TEXT_MAX_BYTES, MODEL_NAME, PROMPT_VERSION,
+    SSE_HEADERS, StageTimer, build_chat_request, build_draft_request, collect_stream_metadata,
+    is_cacheable_draft, sse_event, validate_application_request, validate_chat_request, validate_draft_request
+)
 
 load_dotenv()
 
@@ -16,54 +31,71 @@ app = Flask(__name__)
 CORS(app)  # React에서 접근 가능하도록
 
 # --- 설정 ---
-API_KEY = os.getenv("GEMINI_API_KEY")
-FILE_SEARCH_STORE_NAME = "           "
-client = genai.Client(api_key=API_KEY)
-
-# 품목 항목별 매핑
-CATEGORY_MAP = {
-    "모양 및 구조(작용원리)": "모양및구조-작용원리",
-    "모양 및 구조(외형)": "모양및구조-외형",
-    "모양 및 구조(치수)": "모양및구조-치수",
-    "모양 및 구조(특성)": "모양및구조-특성",
-    "원재료": "원재료",
-    "성능": "성능",
-    "사용목적": "사용목적",
-    "사용방법": "사용방법",
-    "사용 시 주의사항": "사용시주의사항"
-}
-
-CATEGORY_TITLES = {
-    "모양및구조-작용원리": "작용원리",
-    "모양및구조-외형": "외형",
-    "모양및구조-치수": "치수",
-    "모양및구조-특성": "특성",
-    "원재료": "원재료",
-    "사용목적": "사용목적",
-    "성능": "성능",
-    "사용방법": "사용방법",
-    "사용시주의사항": "사용 시 주의사항"
-}
+# 로컬 BM25 인덱스 디렉토리 (bm25_index.py build 로 생성)
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "")
+# 로컬 밀집 벡터 인덱스 디렉토리 (vector_index.py build 로 생성)
+LOCAL_VECTOR_INDEX_DIR = os.getenv("LOCAL_VECTOR_INDEX_DIR", "")
+# 프로세스 공용 클라이언트 (첫 호출 시 생성, 연결 풀 + 할당량 관리)
+client = lazy_client()
+
+# 생성 초안 캐시 (DRAFT_CACHE_PATH 를 지정하면 워커 간 공유 디스크 캐시 사용)
+draft_cache = create_draft_cache()
+
+# 엔드포인트/단계별 지연 시간, 오류, 토큰 지표 (/api/metrics)
+metrics = Metrics()
+
+# 캐시/비캐시 입력 토큰 집계 (정적 프롬프트의 암시적 캐시 적중 확인)
+prompt_cache = PromptCache(MODEL_NAME, on_usage=metrics.count_tokens)
+
+# 품목 카탈로그 (ITEM_CATALOG_PATH, 시작 시 한 번 로드)
+item_catalog = get_catalog()
+
+# 동시에 들어온 같은 초안/채팅 요청은 한 번만 생성
+in_flight = SingleFlight()
+
+# 워커 시작 시간 (serve.py 가 기록, /api/health 로 확인)
+startup_timing = {}
+
+# 다른 모듈의 통계는 스크레이프할 때 읽음
+metrics.add_gauge_callback(
+    'documedix_gemini_queue_depth', '할당량 대기 중인 Gemini 호출 수', ('model',),
+    lambda: {(model,): stats['queue_depth'] for model, stats in get_governor().stats().items()})
+metrics.add_gauge_callback(
+    'documedix_gemini_throttled_total', 'Gemini 429 응답 수', ('model',),
+    lambda: {(model,): stats['throttled'] for model, stats in get_governor().stats().items()}, kind='counter')
+metrics.add_gauge_callback(
+    'documedix_draft_cache_lookups_total', '초안 캐시 조회 결과', ('result',),
+    lambda: {(result,): draft_cache.stats()[result] for result in ('memory_hits', 'disk_hits', 'misses')},
+    kind='counter')
+metrics.add_gauge_callback(
+    'documedix_single_flight_total', '동일 요청 묶음 실행/공유 수', ('result',),
+    lambda: {(result,): in_flight.stats()[result] for result in ('executed', 'coalesced')}, kind='counter')
+
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    metrics.request_started(g.metrics_endpoint)
+
+
+@app.after_request
+def finish_request_metrics(response):
+    """응답 시간은 응답을 닫을 때 기록 (SSE 스트림은 스트림이 끝날 때)"""
+    endpoint, start, status = g.metrics_endpoint, g.metrics_start, response.status_code
+    response.call_on_close(lambda: metrics.request_finished(endpoint, status, time.perf_counter() - start))
+    return response
 
 
 def upload_text_as_file(text_content, category):
-    """텍스트를 임시 파일로 저장하고 업로드"""
-    temp_fd, temp_file = tempfile.mkstemp(suffix='.txt', prefix='user_input_')
-    os.close(temp_fd)
-    
-    try:
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            f.write(text_content)
-        
-        uploaded = client.files.upload(
-            file=temp_file, 
-            config={'display_name': f'{category}_사용자입력.txt'}
-        )
-        return uploaded, temp_file
-    except Exception as e:
-        if os.path.exists(temp_file):
-            os.unlink(temp_file)
-        raise e
+    """텍스트를 디스크에 쓰지 않고 메모리에서 바로 업로드"""
+    return client.files.upload(
+        file=io.BytesIO(text_content.encode('utf-8')),
+        config={
+            'display_name': f'{category}_사용자입력.txt',
+            'mime_type': 'text/plain'
+        }
+    )
 
 
 def classify_and_generate(category, user_content, uploaded_files, grade=None, item_code=None):
@@ -78,98 +110,14 @@ def classify_and_generate(category, user_content, uploaded_files, grade=None, it
         item_code: 웹에서 선택한 품목코드 (예: A07040.03)
     
     Returns:
-        생성된 초안 텍스트
+        (생성된 초안 텍스트, 캐시/비캐시 입력 토큰 수)
     """
-    # 카테고리 매핑
-    mapped_category = CATEGORY_MAP.get(category, category)
-    section_title = CATEGORY_TITLES.get(mapped_category, category)
-    
-    # 웹에서 선택한 품목 정보 사용
-    target_code = item_code if item_code else "A07040.03"
-    target_grade = grade if grade else 2
-    
-    # 품목명은 코드에서 추출 (간단히 카테고리로 표시)
-    item_category_map = {
-        'A': '기구·기계',
-        'B': '재료',
-        'C': '치과재료',
-        'D': '의료용품'
-    }
-    item_category = item_category_map.get(target_code[0], '의료기기')
-    item_name = f"{target_grade}등급 {item_category} ({target_code})"
+    prompt = build_draft_request(category, user_content, grade, item_code)
     
-    # 2단계: File Search 설정 (메타데이터 필터링)
-    file_search_config = types.FileSearch(
-        file_search_store_names=[FILE_SEARCH_STORE_NAME]
-    )
-    
-    # 메타데이터 필터 적용
-    if target_code and mapped_category:
-        filter_conditions = [
-            f'classification_number="{target_code}"',
-            f'document_section:"{mapped_category}"'
-        ]
-        file_search_config.metadata_filter = ' AND '.join(filter_conditions)
-    
-    # 3단계: 유사 문서 검색 + 초안 생성 (통합)
-    generation_prompt = f"""
-당신은 '도큐메딕(Documedix)' AI 솔루션입니다.
-
-**[제품 정보]**
-- 등급: {target_grade}등급
-- 품목코드: {target_code}
-- 분류: {item_category}
-
-**[임무]**
-사용자가 제공한 제품 정보를 바탕으로 '의료기기 제조 허가 신청서'의 '{section_title}' 항목을 작성하세요.
-
-**[참조 지침]**
-1. File Search를 통해 품목코드 '{target_code}' ({target_grade}등급 {item_category})의 '{mapped_category}' 항목에 해당하는 기존 합격 문서들의 스타일과 용어를 정확히 모방하세요.
-2. 특히 **같은 품목코드({target_code})** 또는 **유사한 품목코드(같은 대분류)**의 승인 문서를 우선적으로 참조하세요.
-3. 식약처 고시나 가이드라인 문서가 검색되면 해당 작성 지침을 반드시 준수하세요.
-4. 기존 합격 사례의 문장 구조, 전문 용어, 표현 방식을 참고하세요.
-5. 사용자가 제공한 제품 정보를 최대한 반영하되, 누락된 정보는 합격 사례를 참고하여 보완하세요.
-
-**[사용자 제공 정보]**
-{user_content}
-
-**[출력 형식 - 매우 중요]**
-1. HTML 형식으로 작성하세요. 제목은 제외하고 본문만 작성하세요.
-2. **표가 필요한 경우 반드시 HTML 테이블 형식을 사용하세요:**
-   - <table> 태그 사용
-   - <thead>, <tbody> 구조 사용
-   - <th>로 헤더, <td>로 데이터 셀 작성
-   - border, cellpadding, cellspacing 등 스타일 속성 포함
-   - 예시:
-   <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse; width: 100%;">
-     <thead>
-       <tr>
-         <th>항목</th>
-         <th>내용</th>
-       </tr>
-     </thead>
-     <tbody>
-       <tr>
-         <td>제품명</td>
-         <td>예시 제품</td>
-       </tr>
-     </tbody>
-   </table>
-3. 마크다운 테이블(| 기호 사용)은 절대 사용하지 마세요.
-4. 일반 텍스트 형식의 표도 사용하지 마세요.
-5. 구조화된 정보는 항상 HTML 테이블로 표현하세요.
-"""
-
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[generation_prompt] + uploaded_files,
-            config=types.GenerateContentConfig(
-                tools=[types.Tool(file_search=file_search_config)]
-            )
-        )
+        response, input_tokens = generate_content(client, prompt_cache, prompt, MODEL_NAME, uploaded_files)
         
-        return response.text
+        return response.text, input_tokens
     except Exception as e:
         raise Exception(f"초안 생성 실패: {str(e)}")
 
@@ -188,6 +136,10 @@ def generate_draft_api():
         "files": [파일 업로드 - 추후 구현]
     }
     
+    Request Header (선택):
+        Cache-Control: no-cache  → 캐시를 조회하지 않고 새로 생성 (결과는 저장)
+        Cache-Control: no-store  → 캐시를 조회/저장하지 않음
+    
     Response:
     {
         "success": true,
@@ -202,66 +154,468 @@ def generate_draft_api():
         grade = data.get('grade')  # 웹에서 선택한 등급
         item_code = data.get('itemCode')  # 웹에서 선택한 품목코드
         
-        if not category:
+        validation_error = validate_draft_request(data)
+        if validation_error:
             return jsonify({
                 'success': False,
                 'draft': None,
-                'error': '카테고리를 선택해주세요.'
+                'error': validation_error
             }), 400
         
-        if not text_content.strip():
-            return jsonify({
-                'success': False,
-                'draft': None,
-                'error': '내용을 입력해주세요.'
-            }), 400
+        # 같은 입력으로 생성한 초안이 캐시에 있으면 바로 반환
+        directives = cache_directives(request.headers.get('Cache-Control'))
+        cache_key = make_key(CATEGORY_MAP.get(category, category), item_code, grade,
+                             text_content, PROMPT_VERSION, MODEL_NAME)
+        if not directives & {'no-cache', 'no-store'}:
+            cached_draft = draft_cache.get(cache_key)
+            if cached_draft is not None:
+                response = jsonify({
+                    'success': True,
+                    'draft': cached_draft,
+                    'error': None
+                })
+                response.headers['X-Draft-Cache'] = 'HIT'
+                return response
         
-        if not item_code:
-            return jsonify({
-                'success': False,
-                'draft': None,
-                'error': '품목을 선택해주세요.'
-            }), 400
+        timer = StageTimer()
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
         
-        # 사용자 텍스트를 임시 파일로 업로드
-        uploaded_file, temp_path = upload_text_as_file(text_content, category)
+        def generate():
+            uploaded_file = None
+            
+            if inline:
+                # 사용자 텍스트는 프롬프트에 인라인으로 포함 (업로드/삭제 왕복 없음)
+                user_content = text_content
+                uploaded_files = []
+            else:
+                # 큰 입력만 파일로 업로드하고 프롬프트에는 참조만 남김
+                with timer.stage('upload'):
+                    uploaded_file = upload_text_as_file(text_content, category)
+                user_content = f"(첨부된 '{category}_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            try:
+                # 초안 생성 (등급과 품목코드 전달)
+                with timer.stage('generate'):
+                    return classify_and_generate(
+                        category, user_content, uploaded_files, grade, item_code
+                    )
+            finally:
+                # 정리
+                if uploaded_file is not None:
+                    with timer.stage('cleanup'):
+                        try:
+                            client.files.delete(name=uploaded_file.name)
+                        except:
+                            pass
         
         try:
-            # 초안 생성 (등급과 품목코드 전달)
-            draft = classify_and_generate(category, text_content, [uploaded_file], grade, item_code)
+            # 같은 요청이 이미 생성 중이면 그 결과를 함께 받음
+            (draft, input_tokens), shared = in_flight.do(cache_key, generate)
+            if shared:
+                timer.mark('coalesced')
             
-            return jsonify({
+            if 'no-store' not in directives and not shared and is_cacheable_draft(draft):
+                draft_cache.put(cache_key, draft)
+            
+            response = jsonify({
                 'success': True,
                 'draft': draft,
                 'error': None
             })
+            response.headers['X-Input-Tokens'] = input_tokens_header(input_tokens)
         
         finally:
-            # 정리
-            try:
-                client.files.delete(name=uploaded_file.name)
-            except:
-                pass
-            if os.path.exists(temp_path):
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+            print(f"  ⏱ /api/generate-draft ({'inline' if inline else 'file'}): {timer.server_timing()}")
+            metrics.observe_timer('/api/generate-draft', timer)
+        
+        response.headers['Server-Timing'] = timer.server_timing()
+        response.headers['X-Draft-Cache'] = 'BYPASS' if directives & {'no-cache', 'no-store'} else 'MISS'
+        response.headers['X-Single-Flight'] = 'SHARED' if shared else 'LEADER'
+        return response
     
     except Exception as e:
+        metrics.count_error('/api/generate-draft', e)
         return jsonify({
             'success': False,
             'draft': None,
             'error': str(e)
-        }), 500
+        }), *quota_error_status(e)
+
+
+@app.route('/api/generate-draft/stream', methods=['POST'])
+def generate_draft_stream_api():
+    """
+    POST /api/generate-draft/stream
+    
+    /api/generate-draft 와 같은 요청 본문과 Cache-Control 헤더를 받아,
+    생성되는 HTML 조각을 Server-Sent Events 로 바로 전송합니다.
+    
+    Events:
+        event: chunk  data: {"html": "<p>..."}
+        event: done   data: {"success": true, "cache": "MISS", "usage": {...}, "grounding": {...},
+                             "timing": {"ttfb": ms, "total": ms, ...}}
+        event: error  data: {"success": false, "error": "..."}
+    
+    입력 검증 오류는 /api/generate-draft 와 같이 400 JSON 으로 응답합니다.
+    """
+    data = request.json or {}
+    category = data.get('category')
+    text_content = data.get('textContent', '')
+    grade = data.get('grade')
+    item_code = data.get('itemCode')
+    
+    validation_error = validate_draft_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'draft': None,
+            'error': validation_error
+        }), 400
+    
+    directives = cache_directives(request.headers.get('Cache-Control'))
+    bypass_cache = bool(directives & {'no-cache', 'no-store'})
+    cache_key = make_key(CATEGORY_MAP.get(category, category), item_code, grade,
+                         text_content, PROMPT_VERSION, MODEL_NAME)
+    timer = StageTimer()
+    
+    def events():
+        if not bypass_cache:
+            cached_draft = draft_cache.get(cache_key)
+            if cached_draft is not None:
+                timer.mark('ttfb')
+                yield sse_event('chunk', {'html': cached_draft})
+                yield sse_event('done', {'success': True, 'cache': 'HIT',
+                                         'timing': timer.as_dict()})
+                return
+        
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
+        uploaded_file = None
+        try:
+            if inline:
+                user_content = text_content
+                uploaded_files = []
+            else:
+                with timer.stage('upload'):
+                    uploaded_file = upload_text_as_file(text_content, category)
+                user_content = f"(첨부된 '{category}_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            prompt = build_draft_request(category, user_content, grade, item_code)
+            parts = []
+            metadata = {}
+            with timer.stage('generate'):
+                for chunk in generate_content_stream(client, prompt_cache, prompt, MODEL_NAME, uploaded_files):
+                    collect_stream_metadata(chunk, metadata)
+                    if chunk.text:
+                        timer.mark('ttfb')
+                        parts.append(chunk.text)
+                        yield sse_event('chunk', {'html': chunk.text})
+            
+            draft = ''.join(parts)
+            if 'no-store' not in directives and is_cacheable_draft(draft, metadata.get('finish_reason')):
+                draft_cache.put(cache_key, draft)
+            
+            yield sse_event('done', {
+                'success': True,
+                'cache': 'BYPASS' if bypass_cache else 'MISS',
+                'timing': timer.as_dict(),
+                **metadata
+            })
+        
+        except Exception as e:
+            metrics.count_error('/api/generate-draft/stream', e)
+            yield sse_event('error', {'success': False, 'error': f"초안 생성 실패: {str(e)}"})
+        
+        finally:
+            if uploaded_file is not None:
+                with timer.stage('cleanup'):
+                    try:
+                        client.files.delete(name=uploaded_file.name)
+                    except:
+                        pass
+            print(f"  ⏱ /api/generate-draft/stream ({'inline' if inline else 'file'}): {timer.server_timing()}")
+            metrics.observe_timer('/api/generate-draft/stream', timer)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/generate-application', methods=['POST'])
+def generate_application_api():
+    """
+    POST /api/generate-application
+    
+    제품 정보를 한 번만 받아 신청서 항목(CATEGORY_MAP)을 동시에 생성하고,
+    완료되는 순서대로 Server-Sent Events 로 전송합니다.
+    큰 입력은 한 번만 업로드해 모든 항목이 같은 파일을 참조합니다.
+    
+    Request Body:
+    {
+        "textContent": "사용자가 입력한 텍스트...",
+        "grade": 2,
+        "itemCode": "A07040.03",
+        "categories": ["원재료", "성능"]  (선택사항, 기본값: 전체 항목)
+    }
+    
+    Request Header (선택): Cache-Control (/api/generate-draft 와 동일, 항목별 캐시에 적용)
+    
+    Events:
+        event: section  data: {"category": "원재료", "success": true, "draft": "...", "error": null,
+                               "cache": "MISS", "inputTokens": {"input", "cached", "uncached"}, "elapsed": ms}
+        event: done     data: {"success": true, "completed": 9, "failed": [], "timing": {...}}
+    """
+    data = request.json or {}
+    text_content = data.get('textContent', '')
+    grade = data.get('grade')
+    item_code = data.get('itemCode')
+    categories = data.get('categories') or list(CATEGORY_MAP)
+    
+    validation_error = validate_application_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'sections': None,
+            'error': validation_error
+        }), 400
+    
+    directives = cache_directives(request.headers.get('Cache-Control'))
+    bypass_cache = bool(directives & {'no-cache', 'no-store'})
+    timer = StageTimer()
+    
+    def generate_section(category, user_content, uploaded_files):
+        start_time = time.perf_counter()
+        cache_key = make_key(CATEGORY_MAP[category], item_code, grade,
+                             text_content, PROMPT_VERSION, MODEL_NAME)
+        cache_status = 'BYPASS' if bypass_cache else 'MISS'
+        input_tokens = None
+        draft = None if bypass_cache else draft_cache.get(cache_key)
+        if draft is not None:
+            cache_status = 'HIT'
+        else:
+            draft, input_tokens = classify_and_generate(category, user_content, uploaded_files, grade, item_code)
+            if 'no-store' not in directives and is_cacheable_draft(draft):
+                draft_cache.put(cache_key, draft)
+        return draft, cache_status, input_tokens, (time.perf_counter() - start_time) * 1000
+    
+    def events():
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
+        uploaded_file = None
+        failed = []
+        executor = ThreadPoolExecutor(max_workers=max(1, min(APPLICATION_MAX_PARALLEL, len(categories))))
+        try:
+            if inline:
+                user_content = text_content
+                uploaded_files = []
+            else:
+                # 모든 항목이 공유하는 입력 파일은 한 번만 업로드
+                with timer.stage('upload'):
+                    uploaded_file = upload_text_as_file(text_content, '신청서')
+                user_content = "(첨부된 '신청서_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            with timer.stage('generate'):
+                futures = {
+                    executor.submit(generate_section, category, user_content, uploaded_files): category
+                    for category in categories
+                }
+                for future in as_completed(futures):
+                    category = futures[future]
+                    try:
+                        draft, cache_status, input_tokens, elapsed = future.result()
+                        timer.mark('ttfb')
+                        yield sse_event('section', {
+                            'category': category,
+                            'success': True,
+                            'draft': draft,
+                            'error': None,
+                            'cache': cache_status,
+                            'inputTokens': input_tokens,
+                            'elapsed': round(elapsed, 1)
+                        })
+                    except Exception as e:
+                        metrics.count_error('/api/generate-application', e)
+                        failed.append(category)
+                        yield sse_event('section', {
+                            'category': category,
+                            'success': False,
+                            'draft': None,
+                            'error': str(e)
+                        })
+            
+            yield sse_event('done', {
+                'success': not failed,
+                'completed': len(categories) - len(failed),
+                'failed': failed,
+                'timing': timer.as_dict()
+            })
+        
+        except Exception as e:
+            metrics.count_error('/api/generate-application', e)
+            yield sse_event('error', {'success': False, 'error': str(e)})
+        
+        finally:
+            # 클라이언트가 연결을 끊으면 아직 시작하지 않은 항목은 취소
+            executor.shutdown(wait=False, cancel_futures=True)
+            if uploaded_file is not None:
+                with timer.stage('cleanup'):
+                    try:
+                        client.files.delete(name=uploaded_file.name)
+                    except:
+                        pass
+            print(f"  ⏱ /api/generate-application ({len(categories)}개 항목, 실패 {len(failed)}개): "
+                  f"{timer.server_timing()}")
+            metrics.observe_timer('/api/generate-application', timer)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/items', methods=['GET'])
+def items_api():
+    """
+    GET /api/items?prefix=A0704&grade=2&limit=20
+    
+    품목코드 또는 품목명 앞부분으로 품목을 검색합니다 (자동완성).
+    
+    Response:
+    {
+        "success": true,
+        "items": [{"code": "A07040.03", "name": "...", "grade": 2}, ...],
+        "error": null
+    }
+    """
+    if item_catalog is None:
+        return jsonify({
+            'success': False,
+            'items': None,
+            'error': '품목 카탈로그가 설정되지 않았습니다.'
+        }), 503
+    
+    grade = request.args.get('grade', type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    items = item_catalog.search(request.args.get('prefix', ''), grade=grade, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'items': items,
+        'error': None
+    })
 
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """헬스 체크"""
+    """헬스 체크 (serve.py 로 실행했으면 워커 시작 시간 포함)"""
+    if startup_timing:
+        return jsonify({'status': 'ok', 'startup': startup_timing})
     return jsonify({'status': 'ok'})
 
 
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """초안 캐시, 캐시/비캐시 입력 토큰, 동일 요청 묶음(single-flight) 통계"""
+    return jsonify(dict(draft_cache.stats(), prompt_cache=prompt_cache.stats(),
+                        single_flight=in_flight.stats()))
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_api():
+    """Prometheus 텍스트 형식 지표 (엔드포인트/단계별 지연 시간, 처리 중 요청, 오류, 토큰)"""
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/api/quota-stats', methods=['GET'])
+def quota_stats():
+    """모델별 Gemini 호출 한도, 대기열 길이/대기 시간, 429 재시도 통계"""
+    return jsonify(get_governor().stats())
+
+
+@app.route('/api/search', methods=['POST'])
+def search_api():
+    """
+    POST /api/search
+    
+    로컬 인덱스에서 후보 문서를 검색합니다.
+    mode 가 "bm25"(기본)이면 BM25 역색인, "dense"이면 밀집 벡터 인덱스를 사용합니다.
+    
+    Request Body:
+    {
+        "query": "검색어...",
+        "mode": "bm25",
+        "topK": 10,
+        "grade": 2,
+        "itemCode": "A07040.03",
+        "category": "모양 및 구조(작용원리)",
+        "approvalNumber": "제허00-000호"
+    }
+    
+    Response:
+    {
+        "success": true,
+        "results": [{"score": 12.3, "display_name": "...", "metadata": {...}}, ...],
+        "error": null
+    }
+    """
+    try:
+        data = request.json
+        mode = data.get('mode', 'bm25')
+        index_dir = LOCAL_VECTOR_INDEX_DIR if mode == 'dense' else LOCAL_INDEX_DIR
+        
+        if not index_dir:
+            return jsonify({
+                'success': False,
+                'results': None,
+                'error': '로컬 인덱스가 설정되지 않았습니다.'
+            }), 503
+        
+        query = data.get('query', '')
+        if not query.strip():
+            return jsonify({
+                'success': False,
+                'results': None,
+                'error': '검색어를 입력해주세요.'
+            }), 400
+        
+        try:
+            top_k = int(data.get('topK', 10))
+        except (TypeError, ValueError):
+            top_k = 0
+        if top_k < 1:
+            return jsonify({
+                'success': False,
+                'results': None,
+                'error': 'topK 는 1 이상의 정수여야 합니다.'
+            }), 400
+        
+        category = data.get('category')
+        filters = {
+            'grade': data.get('grade'),
+            'classification_number': data.get('itemCode'),
+            'document_section': CATEGORY_MAP.get(category, category),
+            'approval_number': data.get('approvalNumber')
+        }
+        
+        if mode == 'dense':
+            import vector_index
+            search_index = vector_index.search
+        else:
+            import bm25_index
+            search_index = bm25_index.search
+        results = search_index(index_dir, query, top_k=top_k, filters=filters)
+        
+        return jsonify({
+            'success': True,
+            'results': results,
+            'error': None
+        })
+    
+    except Exception as e:
+        metrics.count_error('/api/search', e)
+        return jsonify({
+            'success': False,
+            'results': None,
+            'error': str(e)
+        }), *quota_error_status(e)
+
+
 @app.route('/api/chat', methods=['POST'])
 def chat_api():
     """
@@ -285,61 +639,31 @@ def chat_api():
         user_message = data.get('message', '')
         category = data.get('category', '')
         
-        if not user_message.strip():
+        validation_error = validate_chat_request(data)
+        if validation_error:
             return jsonify({
                 'success': False,
                 'reply': None,
-                'error': '메시지를 입력해주세요.'
+                'error': validation_error
             }), 400
         
-        # File Search 설정
-        file_search_config = types.FileSearch(
-            file_search_store_names=[FILE_SEARCH_STORE_NAME]
-        )
-        
-        # 카테고리가 있으면 메타데이터 필터 적용
-        if category and category in CATEGORY_MAP:
-            mapped_category = CATEGORY_MAP[category]
-            file_search_config.metadata_filter = f'document_section:"{mapped_category}"'
-        
-        # 채팅 프롬프트
-        chat_prompt = f"""
-당신은 의료기기 제조 허가 신청서 작성을 돕는 전문 AI 어시스턴트입니다.
-
-**[역할]**
-- 의료기기 제조 허가 신청서 작성에 대한 질문에 답변합니다.
-- File Search를 통해 관련 규정, 가이드라인, 합격 사례를 참조합니다.
-- 명확하고 실용적인 답변을 제공합니다.
-
-**[사용자 질문]**
-{user_message}
-
-**[답변 지침]**
-1. 간결하고 이해하기 쉽게 답변하세요.
-2. 관련 규정이나 사례가 있으면 참조하세요.
-3. 필요시 예시를 들어 설명하세요.
-4. **표가 필요한 경우 반드시 HTML 테이블 형식을 사용하세요:**
-   - <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse; width: 100%;"> 형식 사용
-   - <thead>, <tbody>, <th>, <td> 태그 사용
-   - 마크다운 테이블(| 기호) 절대 사용 금지
-   - 일반 텍스트 표 형식 사용 금지
-5. 답변은 HTML 형식으로 작성하되, 가독성 좋은 구조를 유지하세요.
-"""
+        prompt = build_chat_request(user_message, category)
         
         try:
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=[chat_prompt],
-                config=types.GenerateContentConfig(
-                    tools=[types.Tool(file_search=file_search_config)]
-                )
+            # 같은 질문이 이미 생성 중이면 그 결과를 함께 받음
+            (response, input_tokens), shared = in_flight.do(
+                request_key('chat', category, user_message, PROMPT_VERSION, MODEL_NAME),
+                lambda: generate_content(client, prompt_cache, prompt, MODEL_NAME),
             )
             
-            return jsonify({
+            reply = jsonify({
                 'success': True,
                 'reply': response.text,
                 'error': None
             })
+            reply.headers['X-Input-Tokens'] = input_tokens_header(input_tokens)
+            reply.headers['X-Single-Flight'] = 'SHARED' if shared else 'LEADER'
+            return reply
         
         except Exception as e:
             import traceback
@@ -351,11 +675,61 @@ def chat_api():
         import traceback
         error_detail = traceback.format_exc()
         print(f"  /api/chat 오류:\n{error_detail}")
+        metrics.count_error('/api/chat', e)
         return jsonify({
             'success': False,
             'reply': None,
             'error': str(e)
-        }), 500
+        }), *quota_error_status(e)
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream_api():
+    """
+    POST /api/chat/stream
+    
+    /api/chat 과 같은 요청 본문을 받아 답변 HTML 조각을 Server-Sent Events 로 전송합니다.
+    이벤트 형식은 /api/generate-draft/stream 과 같습니다 (done 이벤트에 cache 필드 없음).
+    """
+    data = request.json or {}
+    user_message = data.get('message', '')
+    category = data.get('category', '')
+    
+    validation_error = validate_chat_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'reply': None,
+            'error': validation_error
+        }), 400
+    
+    prompt = build_chat_request(user_message, category)
+    timer = StageTimer()
+    
+    def events():
+        try:
+            metadata = {}
+            with timer.stage('generate'):
+                for chunk in generate_content_stream(client, prompt_cache, prompt, MODEL_NAME):
+                    collect_stream_metadata(chunk, metadata)
+                    if chunk.text:
+                        timer.mark('ttfb')
+                        yield sse_event('chunk', {'html': chunk.text})
+            
+            yield sse_event('done', {'success': True, 'timing': timer.as_dict(),
+                                     **metadata})
+        
+        except Exception as e:
+            import traceback
+            print(f"  /api/chat/stream 오류:\n{traceback.format_exc()}")
+            metrics.count_error('/api/chat/stream', e)
+            yield sse_event('error', {'success': False, 'error': f"채팅 응답 생성 실패: {str(e)}"})
+        
+        finally:
+            print(f"  ⏱ /api/chat/stream: {timer.server_timing()}")
+            metrics.observe_timer('/api/chat/stream', timer)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream', headers=SSE_HEADERS)
 
 
 if __name__ == '__main__':
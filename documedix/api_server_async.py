@@ -0,0 +1,497 @@
+"""
+도큐메딕 비동기 API 서버 (ASGI)
+
+api_server.py 와 같은 요청/응답 형식의 /api/generate-draft, /api/chat, /api/health 를
+Quart(Flask 호환 비동기 프레임워크)와 genai 비동기 클라이언트(client.aio)로 제공합니다.
+Gemini 호출을 기다리는 동안 스레드를 점유하지 않으므로, 프로세스당 하나의 이벤트 루프에서
+많은 요청을 동시에 처리할 수 있습니다.
+
+실행:
+    hypercorn api_server_async:app --bind 0.0.0.0:5000
+"""
+import io
+import time
+import asyncio
+import traceback
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from dotenv import load_dotenv
+from draft_cache import cache_directives, create_draft_cache, make_key
+from item_catalog import get_catalog
+from gemini_client import API_KEY, lazy_client
+from quota_governor import get_governor, quota_error_status
+from single_flight import SingleFlight, request_key
+from prompt_cache import (
+    PromptCache, generate_content_async, generate_content_stream_async, input_tokens_header
+)
+from draft_service import (
+    APPLICATION_MAX_PARALLEL, CATEGORY_MAP, INLINE_TEXT_MAX_BYTES, MODEL_NAME, PROMPT_VERSION,
+    SSE_HEADERS, StageTimer, build_chat_request, build_draft_request, collect_stream_metadata,
+    is_cacheable_draft, sse_event, validate_application_request, validate_chat_request, validate_draft_request
+)
+
+load_dotenv()
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")  # React에서 접근 가능하도록
+
+# --- 설정 ---
+# 프로세스 공용 클라이언트 (첫 호출 시 생성, 연결 풀 + 할당량 관리)
+client = lazy_client()
+
+# 생성 초안 캐시
+draft_cache = create_draft_cache()
+
+# 캐시/비캐시 입력 토큰 집계 (정적 프롬프트의 암시적 캐시 적중 확인)
+prompt_cache = PromptCache(MODEL_NAME)
+
+# 품목 카탈로그 (ITEM_CATALOG_PATH, 시작 시 한 번 로드)
+item_catalog = get_catalog()
+
+# 동시에 들어온 같은 초안/채팅 요청은 한 번만 생성
+in_flight = SingleFlight()
+
+
+async def upload_text_as_file(text_content, category):
+    """텍스트를 디스크에 쓰지 않고 메모리에서 바로 업로드"""
+    return await client.aio.files.upload(
+        file=io.BytesIO(text_content.encode('utf-8')),
+        config={
+            'display_name': f'{category}_사용자입력.txt',
+            'mime_type': 'text/plain'
+        }
+    )
+
+
+async def classify_and_generate(category, user_content, uploaded_files, grade=None, item_code=None):
+    """품목 분류 후 초안 생성 (api_server.classify_and_generate 의 비동기 버전)"""
+    prompt = build_draft_request(category, user_content, grade, item_code)
+    
+    try:
+        response, input_tokens = await generate_content_async(
+            client, prompt_cache, prompt, MODEL_NAME, uploaded_files
+        )
+        
+        return response.text, input_tokens
+    except Exception as e:
+        raise Exception(f"초안 생성 실패: {str(e)}")
+
+
+@app.route('/api/generate-draft', methods=['POST'])
+async def generate_draft_api():
+    """POST /api/generate-draft (요청/응답 형식은 api_server.generate_draft_api 와 동일)"""
+    try:
+        data = await request.get_json()
+        category = data.get('category')
+        text_content = data.get('textContent', '')
+        grade = data.get('grade')
+        item_code = data.get('itemCode')
+        
+        validation_error = validate_draft_request(data)
+        if validation_error:
+            return jsonify({
+                'success': False,
+                'draft': None,
+                'error': validation_error
+            }), 400
+        
+        directives = cache_directives(request.headers.get('Cache-Control'))
+        cache_key = make_key(CATEGORY_MAP.get(category, category), item_code, grade,
+                             text_content, PROMPT_VERSION, MODEL_NAME)
+        if not directives & {'no-cache', 'no-store'}:
+            cached_draft = draft_cache.get(cache_key)
+            if cached_draft is not None:
+                response = jsonify({
+                    'success': True,
+                    'draft': cached_draft,
+                    'error': None
+                })
+                response.headers['X-Draft-Cache'] = 'HIT'
+                return response
+        
+        timer = StageTimer()
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
+        
+        async def generate():
+            uploaded_file = None
+            
+            if inline:
+                user_content = text_content
+                uploaded_files = []
+            else:
+                with timer.stage('upload'):
+                    uploaded_file = await upload_text_as_file(text_content, category)
+                user_content = f"(첨부된 '{category}_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            try:
+                with timer.stage('generate'):
+                    return await classify_and_generate(
+                        category, user_content, uploaded_files, grade, item_code
+                    )
+            finally:
+                if uploaded_file is not None:
+                    with timer.stage('cleanup'):
+                        try:
+                            await client.aio.files.delete(name=uploaded_file.name)
+                        except Exception:
+                            pass
+        
+        try:
+            (draft, input_tokens), shared = await in_flight.do_async(cache_key, generate)
+            if shared:
+                timer.mark('coalesced')
+            
+            if 'no-store' not in directives and not shared and is_cacheable_draft(draft):
+                draft_cache.put(cache_key, draft)
+            
+            response = jsonify({
+                'success': True,
+                'draft': draft,
+                'error': None
+            })
+            response.headers['X-Input-Tokens'] = input_tokens_header(input_tokens)
+        
+        finally:
+            print(f"  ⏱ /api/generate-draft ({'inline' if inline else 'file'}): {timer.server_timing()}")
+        
+        response.headers['Server-Timing'] = timer.server_timing()
+        response.headers['X-Draft-Cache'] = 'BYPASS' if directives & {'no-cache', 'no-store'} else 'MISS'
+        response.headers['X-Single-Flight'] = 'SHARED' if shared else 'LEADER'
+        return response
+    
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'draft': None,
+            'error': str(e)
+        }), *quota_error_status(e)
+
+
+@app.route('/api/generate-draft/stream', methods=['POST'])
+async def generate_draft_stream_api():
+    """POST /api/generate-draft/stream (이벤트 형식은 api_server.generate_draft_stream_api 와 동일)"""
+    data = await request.get_json() or {}
+    category = data.get('category')
+    text_content = data.get('textContent', '')
+    grade = data.get('grade')
+    item_code = data.get('itemCode')
+    
+    validation_error = validate_draft_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'draft': None,
+            'error': validation_error
+        }), 400
+    
+    directives = cache_directives(request.headers.get('Cache-Control'))
+    bypass_cache = bool(directives & {'no-cache', 'no-store'})
+    cache_key = make_key(CATEGORY_MAP.get(category, category), item_code, grade,
+                         text_content, PROMPT_VERSION, MODEL_NAME)
+    timer = StageTimer()
+    
+    async def events():
+        if not bypass_cache:
+            cached_draft = draft_cache.get(cache_key)
+            if cached_draft is not None:
+                timer.mark('ttfb')
+                yield sse_event('chunk', {'html': cached_draft})
+                yield sse_event('done', {'success': True, 'cache': 'HIT',
+                                         'timing': timer.as_dict()})
+                return
+        
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
+        uploaded_file = None
+        try:
+            if inline:
+                user_content = text_content
+                uploaded_files = []
+            else:
+                with timer.stage('upload'):
+                    uploaded_file = await upload_text_as_file(text_content, category)
+                user_content = f"(첨부된 '{category}_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            prompt = build_draft_request(category, user_content, grade, item_code)
+            parts = []
+            metadata = {}
+            with timer.stage('generate'):
+                async for chunk in generate_content_stream_async(
+                    client, prompt_cache, prompt, MODEL_NAME, uploaded_files
+                ):
+                    collect_stream_metadata(chunk, metadata)
+                    if chunk.text:
+                        timer.mark('ttfb')
+                        parts.append(chunk.text)
+                        yield sse_event('chunk', {'html': chunk.text})
+            
+            draft = ''.join(parts)
+            if 'no-store' not in directives and is_cacheable_draft(draft, metadata.get('finish_reason')):
+                draft_cache.put(cache_key, draft)
+            
+            yield sse_event('done', {
+                'success': True,
+                'cache': 'BYPASS' if bypass_cache else 'MISS',
+                'timing': timer.as_dict(),
+                **metadata
+            })
+        
+        except Exception as e:
+            yield sse_event('error', {'success': False, 'error': f"초안 생성 실패: {str(e)}"})
+        
+        finally:
+            if uploaded_file is not None:
+                with timer.stage('cleanup'):
+                    try:
+                        await client.aio.files.delete(name=uploaded_file.name)
+                    except Exception:
+                        pass
+            print(f"  ⏱ /api/generate-draft/stream ({'inline' if inline else 'file'}): {timer.server_timing()}")
+    
+    response = Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.timeout = None  # 생성 시간이 길어도 스트림을 끊지 않음
+    return response
+
+
+@app.route('/api/generate-application', methods=['POST'])
+async def generate_application_api():
+    """POST /api/generate-application (이벤트 형식은 api_server.generate_application_api 와 동일)"""
+    data = await request.get_json() or {}
+    text_content = data.get('textContent', '')
+    grade = data.get('grade')
+    item_code = data.get('itemCode')
+    categories = data.get('categories') or list(CATEGORY_MAP)
+    
+    validation_error = validate_application_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'sections': None,
+            'error': validation_error
+        }), 400
+    
+    directives = cache_directives(request.headers.get('Cache-Control'))
+    bypass_cache = bool(directives & {'no-cache', 'no-store'})
+    timer = StageTimer()
+    semaphore = asyncio.Semaphore(max(1, APPLICATION_MAX_PARALLEL))
+    
+    async def generate_section(category, user_content, uploaded_files):
+        async with semaphore:
+            start_time = time.perf_counter()
+            cache_key = make_key(CATEGORY_MAP[category], item_code, grade,
+                                 text_content, PROMPT_VERSION, MODEL_NAME)
+            try:
+                cache_status = 'BYPASS' if bypass_cache else 'MISS'
+                input_tokens = None
+                draft = None if bypass_cache else draft_cache.get(cache_key)
+                if draft is not None:
+                    cache_status = 'HIT'
+                else:
+                    draft, input_tokens = await classify_and_generate(
+                        category, user_content, uploaded_files, grade, item_code
+                    )
+                    if 'no-store' not in directives and is_cacheable_draft(draft):
+                        draft_cache.put(cache_key, draft)
+            except Exception as e:
+                return {
+                    'category': category,
+                    'success': False,
+                    'draft': None,
+                    'error': str(e)
+                }
+            return {
+                'category': category,
+                'success': True,
+                'draft': draft,
+                'error': None,
+                'cache': cache_status,
+                'inputTokens': input_tokens,
+                'elapsed': round((time.perf_counter() - start_time) * 1000, 1)
+            }
+    
+    async def events():
+        inline = len(text_content.encode('utf-8')) <= INLINE_TEXT_MAX_BYTES
+        uploaded_file = None
+        tasks = []
+        failed = []
+        try:
+            if inline:
+                user_content = text_content
+                uploaded_files = []
+            else:
+                with timer.stage('upload'):
+                    uploaded_file = await upload_text_as_file(text_content, '신청서')
+                user_content = "(첨부된 '신청서_사용자입력.txt' 파일을 참조하세요.)"
+                uploaded_files = [uploaded_file]
+            
+            with timer.stage('generate'):
+                tasks = [
+                    asyncio.create_task(generate_section(category, user_content, uploaded_files))
+                    for category in categories
+                ]
+                for next_done in asyncio.as_completed(tasks):
+                    section = await next_done
+                    timer.mark('ttfb')
+                    if not section['success']:
+                        failed.append(section['category'])
+                    yield sse_event('section', section)
+            
+            yield sse_event('done', {
+                'success': not failed,
+                'completed': len(categories) - len(failed),
+                'failed': failed,
+                'timing': timer.as_dict()
+            })
+        
+        except Exception as e:
+            yield sse_event('error', {'success': False, 'error': str(e)})
+        
+        finally:
+            # 클라이언트가 연결을 끊으면 남은 항목 생성을 취소
+            for task in tasks:
+                task.cancel()
+            if uploaded_file is not None:
+                with timer.stage('cleanup'):
+                    try:
+                        await client.aio.files.delete(name=uploaded_file.name)
+                    except Exception:
+                        pass
+            print(f"  ⏱ /api/generate-application ({len(categories)}개 항목, 실패 {len(failed)}개): "
+                  f"{timer.server_timing()}")
+    
+    response = Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.timeout = None
+    return response
+
+
+@app.route('/api/items', methods=['GET'])
+async def items_api():
+    """GET /api/items (응답 형식은 api_server.items_api 와 동일)"""
+    if item_catalog is None:
+        return jsonify({
+            'success': False,
+            'items': None,
+            'error': '품목 카탈로그가 설정되지 않았습니다.'
+        }), 503
+    
+    grade = request.args.get('grade', type=int)
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    items = item_catalog.search(request.args.get('prefix', ''), grade=grade, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'items': items,
+        'error': None
+    })
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """헬스 체크"""
+    return jsonify({'status': 'ok'})
+
+
+@app.route('/api/cache-stats', methods=['GET'])
+async def cache_stats():
+    """초안 캐시, 캐시/비캐시 입력 토큰, 동일 요청 묶음(single-flight) 통계"""
+    return jsonify(dict(draft_cache.stats(), prompt_cache=prompt_cache.stats(),
+                        single_flight=in_flight.stats()))
+
+
+@app.route('/api/quota-stats', methods=['GET'])
+async def quota_stats():
+    """모델별 Gemini 호출 한도, 대기열 길이/대기 시간, 429 재시도 통계"""
+    return jsonify(get_governor().stats())
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat_api():
+    """POST /api/chat (요청/응답 형식은 api_server.chat_api 와 동일)"""
+    try:
+        data = await request.get_json()
+        user_message = data.get('message', '')
+        category = data.get('category', '')
+        
+        validation_error = validate_chat_request(data)
+        if validation_error:
+            return jsonify({
+                'success': False,
+                'reply': None,
+                'error': validation_error
+            }), 400
+        
+        prompt = build_chat_request(user_message, category)
+        
+        (response, input_tokens), shared = await in_flight.do_async(
+            request_key('chat', category, user_message, PROMPT_VERSION, MODEL_NAME),
+            lambda: generate_content_async(client, prompt_cache, prompt, MODEL_NAME),
+        )
+        
+        reply = jsonify({
+            'success': True,
+            'reply': response.text,
+            'error': None
+        })
+        reply.headers['X-Input-Tokens'] = input_tokens_header(input_tokens)
+        reply.headers['X-Single-Flight'] = 'SHARED' if shared else 'LEADER'
+        return reply
+    
+    except Exception as e:
+        print(f"  /api/chat 오류:\n{traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'reply': None,
+            'error': f"채팅 응답 생성 실패: {str(e)}"
+        }), *quota_error_status(e)
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream_api():
+    """POST /api/chat/stream (이벤트 형식은 api_server.chat_stream_api 와 동일)"""
+    data = await request.get_json() or {}
+    user_message = data.get('message', '')
+    category = data.get('category', '')
+    
+    validation_error = validate_chat_request(data)
+    if validation_error:
+        return jsonify({
+            'success': False,
+            'reply': None,
+            'error': validation_error
+        }), 400
+    
+    prompt = build_chat_request(user_message, category)
+    timer = StageTimer()
+    
+    async def events():
+        try:
+            metadata = {}
+            with timer.stage('generate'):
+                async for chunk in generate_content_stream_async(client, prompt_cache, prompt, MODEL_NAME):
+                    collect_stream_metadata(chunk, metadata)
+                    if chunk.text:
+                        timer.mark('ttfb')
+                        yield sse_event('chunk', {'html': chunk.text})
+            
+            yield sse_event('done', {'success': True, 'timing': timer.as_dict(),
+                                     **metadata})
+        
+        except Exception as e:
+            print(f"  /api/chat/stream 오류:\n{traceback.format_exc()}")
+            yield sse_event('error', {'success': False, 'error': f"채팅 응답 생성 실패: {str(e)}"})
+        
+        finally:
+            print(f"  ⏱ /api/chat/stream: {timer.server_timing()}")
+    
+    response = Response(events(), mimetype='text/event-stream', headers=SSE_HEADERS)
+    response.timeout = None
+    return response
+
+
+if __name__ == '__main__':
+    if not API_KEY:
+        print(" 오류: GEMINI_API_KEY가 설정되지 않았습니다.")
+        exit(1)
+    
+    app.run(host='0.0.0.0', port=5000, debug=False)
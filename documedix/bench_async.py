@@ -0,0 +1,93 @@
+"""
+동기(Flask) / 비동기(Quart) API 서버 동시성 벤치마크
+
+두 서버의 genai 클라이언트를 fake_genai.FakeClient 로 바꿔 끼우고,
+같은 수의 동시 요청을 보냈을 때의 처리량을 비교합니다.
+동기 서버는 요청마다 스레드 하나가 generate_content 를 기다리므로 동시 처리 수가 스레드 수로 제한되고,
+비동기 서버는 하나의 이벤트 루프에서 모든 요청을 동시에 기다립니다.
+
+사용법:
+    python bench_async.py --requests 64 --threads 8 --latency 1.0
+"""
+import os
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+import api_server
+import api_server_async
+from bench_load import bench_item
+from fake_genai import FakeClient
+
+# 캐시를 건너뛰어 매 요청이 생성 호출까지 가도록 합니다
+HEADERS = {'Cache-Control': 'no-store'}
+
+
+def make_payload(i):
+    # 품목 카탈로그가 있으면 카탈로그의 품목 (검증 오류 대신 생성 호출을 측정)
+    item_code, grade = bench_item()
+    return {
+        'category': '모양 및 구조(외형)',
+        'textContent': f'벤치마크 입력 {i}',
+        'grade': grade,
+        'itemCode': item_code,
+    }
+
+
+def bench_sync(num_requests, num_threads):
+    """Flask test_client 를 스레드 풀(= WSGI 워커 스레드 수)로 호출합니다."""
+    flask_client = api_server.app.test_client()
+
+    def call(i):
+        response = flask_client.post('/api/generate-draft', json=make_payload(i), headers=HEADERS)
+        return response.status_code
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        statuses = list(executor.map(call, range(num_requests)))
+    return time.perf_counter() - start_time, statuses
+
+
+async def bench_async(num_requests):
+    """Quart test_client 를 하나의 이벤트 루프에서 동시에 호출합니다."""
+    quart_client = api_server_async.app.test_client()
+
+    async def call(i):
+        response = await quart_client.post('/api/generate-draft', json=make_payload(i), headers=HEADERS)
+        return response.status_code
+
+    start_time = time.perf_counter()
+    statuses = await asyncio.gather(*(call(i) for i in range(num_requests)))
+    return time.perf_counter() - start_time, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="동기/비동기 API 서버 동시성 벤치마크")
+    parser.add_argument("--requests", type=int, default=64, help="총 요청 수")
+    parser.add_argument("--threads", type=int, default=8, help="동기 서버 워커 스레드 수")
+    parser.add_argument("--latency", type=float, default=1.0, help="가짜 generate_content 지연(초)")
+    args = parser.parse_args()
+
+    api_server.client = FakeClient(args.latency)
+    api_server_async.client = FakeClient(args.latency)
+
+    print(f"요청 {args.requests}개, 생성 지연 {args.latency}초")
+
+    sync_elapsed, sync_statuses = bench_sync(args.requests, args.threads)
+    sync_rps = args.requests / sync_elapsed
+    print(f"  동기 (Flask, 스레드 {args.threads}개): {sync_elapsed:.2f}초, {sync_rps:.1f} req/s, "
+          f"성공 {sync_statuses.count(200)}/{args.requests}")
+
+    async_elapsed, async_statuses = asyncio.run(bench_async(args.requests))
+    async_rps = args.requests / async_elapsed
+    print(f"  비동기 (Quart, 이벤트 루프 1개): {async_elapsed:.2f}초, {async_rps:.1f} req/s, "
+          f"성공 {async_statuses.count(200)}/{args.requests}")
+
+    print(f"  처리량 향상: {async_rps / sync_rps:.1f}배")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""
+API 서버 오프라인 부하 테스트
+
+api_server(또는 api_server_async)의 genai 클라이언트를 fake_genai.FakeClient 로 바꿔 끼우고
+(quota_governor 로 감싸 실제와 같은 한도/재시도 경로를 탐),
+/api/generate-draft, /api/chat (및 /stream 엔드포인트)에 목표 RPS 로 요청을 보내
+처리량, p50/p95/p99 응답 시간, 오류율을 측정합니다. 할당량은 쓰지 않습니다.
+
+- 요청은 정해진 시각에 보내는 개방형(open-loop) 부하입니다. 응답 시간은 예정 송신 시각부터 재므로
+  서버 스레드가 모자라 대기한 시간도 포함됩니다 (coordinated omission 방지).
+- 동기 서버는 --threads 개의 스레드(= WSGI 워커 스레드 수)로 처리합니다.
+- 스트리밍 엔드포인트는 첫 바이트까지의 시간(TTFB)도 측정합니다 (동기 서버만).
+  200 응답이라도 error 이벤트가 오면 오류로 셉니다.
+- 가짜 백엔드 응답 수와 prompt_cache 의 usage 기록 수(및 /api/metrics 의 prompt 토큰 합계)가 같은지 확인합니다.
+  스트림 응답 하나가 청크 수만큼 집계되는 회귀를 잡기 위한 것입니다 (실제 API 처럼 모든 청크에 usage 가 실림).
+- 결과는 --output (기본 bench_results/load_<시각>_<커밋>.json) 에 저장되며
+  --compare 로 두 결과(예: 커밋 전후)를 비교합니다.
+
+사용법:
+    python bench_load.py --endpoints generate-draft chat --rps 10 --duration 30
+    python bench_load.py --latency 2 --distribution lognormal --spread 0.6 --rate-limit-rate 0.05
+    python bench_load.py --server async --endpoints chat --rps 50
+    python bench_load.py --compare bench_results/before.json bench_results/after.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import functools
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+
+from fake_genai import LATENCY_DISTRIBUTIONS, FakeClient
+from quota_governor import QuotaGovernor, govern
+
+# 엔드포인트 이름 → 경로
+ENDPOINTS = {
+    'generate-draft': '/api/generate-draft',
+    'generate-draft/stream': '/api/generate-draft/stream',
+    'chat': '/api/chat',
+    'chat/stream': '/api/chat/stream',
+}
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_results")
+PERCENTILES = (50, 95, 99)
+# 품목 카탈로그가 없을 때 쓰는 품목 (validate_item 이 검증을 생략함)
+DEFAULT_BENCH_ITEM = ('A12345.01', 2)
+
+
+@functools.lru_cache(maxsize=None)
+def bench_item():
+    """
+    요청 검증을 통과하는 (itemCode, grade) 를 반환합니다.
+    품목 카탈로그(ITEM_CATALOG_PATH/master_codebook.json)가 있으면 카탈로그의 품목을 골라,
+    벤치마크가 생성 대신 400 검증 오류를 측정하지 않도록 합니다.
+    """
+    from item_catalog import get_catalog
+    catalog = get_catalog()
+    if not catalog:
+        return DEFAULT_BENCH_ITEM
+    for code, grade in zip(catalog.codes, catalog.grades):
+        if grade is not None:
+            return code, grade
+    return catalog.codes[0], None
+
+
+def make_payload(endpoint, i):
+    if endpoint.startswith('chat'):
+        return {'message': f'부하 테스트 질문 {i}: 작용원리 항목은 어떻게 작성하나요?', 'category': '모양 및 구조(작용원리)'}
+    item_code, grade = bench_item()
+    return {
+        'category': '모양 및 구조(외형)',
+        'textContent': f'부하 테스트 입력 {i}',
+        'grade': grade,
+        'itemCode': item_code,
+    }
+
+
+def build_schedule(endpoints, rps, duration, arrival, duplicate_rate, rng):
+    """
+    [(송신 시각 오프셋(초), 엔드포인트, 요청 본문), ...] (시각 순)
+
+    엔드포인트마다 rps 로 요청을 보냅니다. duplicate_rate 비율의 요청은 직전 요청과 같은 본문입니다
+    (single-flight 병합 확인용, 기본 0 이면 모든 요청이 서로 다름).
+    """
+    schedule = []
+    for endpoint in endpoints:
+        offset = 0.0
+        payload = None
+        i = 0
+        while True:
+            offset += rng.expovariate(rps) if arrival == 'poisson' else 1 / rps
+            if offset > duration:
+                break
+            if payload is None or rng.random() >= duplicate_rate:
+                payload = make_payload(endpoint, i)
+                i += 1
+            schedule.append((offset, endpoint, payload))
+    return sorted(schedule, key=lambda item: item[0])
+
+
+def percentile(sorted_values, p):
+    """최근접 순위 백분위수"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def is_stream_error(body) -> bool:
+    return b'event: error' in body
+
+
+def call_sync(flask_client, endpoint, payload, scheduled):
+    """Flask test_client 로 요청 하나를 보내고 결과를 기록합니다 (본문을 끝까지 읽음)."""
+    record = {'endpoint': endpoint, 'status': None, 'latency': None, 'ttfb': None, 'shared': False}
+    try:
+        response = flask_client.post(ENDPOINTS[endpoint], json=payload,
+                                     headers={'Cache-Control': 'no-store'}, buffered=False)
+        body = b''
+        try:
+            for chunk in response.response:
+                if record['ttfb'] is None and chunk:
+                    record['ttfb'] = time.perf_counter() - scheduled
+                body += chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+        finally:
+            response.close()
+        record['status'] = 'stream_error' if response.status_code == 200 and is_stream_error(body) \
+            else response.status_code
+        record['shared'] = response.headers.get('X-Single-Flight') == 'SHARED'
+    except Exception as e:
+        record['status'] = type(e).__name__
+    record['latency'] = time.perf_counter() - scheduled
+    return record
+
+
+def run_sync(schedule, threads):
+    import api_server
+
+    flask_client = api_server.app.test_client()
+    futures = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        start = time.perf_counter()
+        for offset, endpoint, payload in schedule:
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(call_sync, flask_client, endpoint, payload, start + offset))
+        records = [future.result() for future in futures]
+    return records, time.perf_counter() - start
+
+
+async def run_async(schedule):
+    import api_server_async
+
+    quart_client = api_server_async.app.test_client()
+
+    async def call(endpoint, payload, scheduled):
+        record = {'endpoint': endpoint, 'status': None, 'latency': None, 'ttfb': None, 'shared': False}
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        try:
+            response = await quart_client.post(ENDPOINTS[endpoint], json=payload,
+                                               headers={'Cache-Control': 'no-store'})
+            body = await response.get_data()
+            record['status'] = 'stream_error' if response.status_code == 200 and is_stream_error(body) \
+                else response.status_code
+            record['shared'] = response.headers.get('X-Single-Flight') == 'SHARED'
+        except Exception as e:
+            record['status'] = type(e).__name__
+        record['latency'] = time.perf_counter() - scheduled
+        return record
+
+    start = time.perf_counter()
+    records = await asyncio.gather(*(call(endpoint, payload, start + offset)
+                                     for offset, endpoint, payload in schedule))
+    return records, time.perf_counter() - start
+
+
+def summarize(records, elapsed, duration):
+    """엔드포인트별 처리량/응답 시간/오류율"""
+    summary = {}
+    for endpoint in dict.fromkeys(record['endpoint'] for record in records):
+        rows = [record for record in records if record['endpoint'] == endpoint]
+        ok = [record for record in rows if record['status'] == 200]
+        statuses = {}
+        for record in rows:
+            statuses[str(record['status'])] = statuses.get(str(record['status']), 0) + 1
+        latencies = sorted(record['latency'] * 1000 for record in ok)
+        ttfbs = sorted(record['ttfb'] * 1000 for record in ok if record['ttfb'] is not None)
+
+        result = {
+            'requests': len(rows),
+            'ok': len(ok),
+            'offered_rps': len(rows) / duration,
+            'throughput_rps': len(ok) / elapsed,
+            'error_rate': 1 - len(ok) / len(rows),
+            'statuses': statuses,
+            'coalesced': sum(1 for record in rows if record['shared']),
+            'latency_ms': {
+                **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+                'mean': sum(latencies) / len(latencies) if latencies else None,
+                'max': latencies[-1] if latencies else None,
+            },
+        }
+        if endpoint.endswith('/stream') and ttfbs:
+            result['ttfb_ms'] = {f"p{p}": percentile(ttfbs, p) for p in PERCENTILES}
+        summary[endpoint] = result
+    return summary
+
+
+def check_usage_records(fake, server):
+    """
+    모델 응답 하나당 usage 가 정확히 한 번 집계되었는지 확인합니다.
+
+    Returns:
+        {"backend_calls", "usage_records", "ok"} (+ 동기 서버는 "metrics_prompt_tokens", "prompt_cache_input_tokens")
+    """
+    cache_stats = server.prompt_cache.stats()
+    result = {'backend_calls': fake.calls, 'usage_records': cache_stats['requests']}
+    ok = fake.calls == cache_stats['requests']
+    metrics = getattr(server, 'metrics', None)
+    if metrics is not None:
+        prompt_tokens = sum(value for (kind, _, _), value in metrics.tokens._values.items() if kind == 'prompt')
+        result['metrics_prompt_tokens'] = prompt_tokens
+        result['prompt_cache_input_tokens'] = cache_stats['input_tokens']
+        ok = ok and prompt_tokens == cache_stats['input_tokens']
+    result['ok'] = ok
+    return result
+
+
+def git_revision():
+    """(커밋 해시, 작업 트리 변경 여부) — git 이 없으면 (None, None)"""
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=cwd, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def format_ms(value):
+    return f"{value:.0f}" if value is not None else "-"
+
+
+def print_summary(summary):
+    print(f"\n{'엔드포인트':<24} {'요청':>6} {'성공':>6} {'처리량':>8} {'오류율':>7} "
+          f"{'p50':>7} {'p95':>7} {'p99':>7} {'TTFB p95':>9}")
+    for endpoint, result in summary.items():
+        latency = result['latency_ms']
+        ttfb = result.get('ttfb_ms', {}).get('p95')
+        print(f"{endpoint:<24} {result['requests']:>6} {result['ok']:>6} "
+              f"{result['throughput_rps']:>7.1f}/s {result['error_rate']:>7.1%} "
+              f"{format_ms(latency['p50']):>7} {format_ms(latency['p95']):>7} {format_ms(latency['p99']):>7} "
+              f"{format_ms(ttfb):>9}")
+        errors = {status: count for status, count in result['statuses'].items() if status != '200'}
+        if errors:
+            print(f"{'':<24} 오류: {', '.join(f'{status} × {count}' for status, count in errors.items())}")
+
+
+def compare(base_path, new_path):
+    """두 결과 파일의 엔드포인트별 지표를 비교합니다."""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    def label(result):
+        commit = (result.get('git') or {}).get('commit') or '?'
+        return f"{commit[:8]}{'+' if (result.get('git') or {}).get('dirty') else ''} ({result.get('timestamp')})"
+
+    print(f"기준: {label(base)}")
+    print(f"비교: {label(new)}")
+    if base.get('config') != new.get('config'):
+        changed = sorted(key for key in set(base.get('config', {})) | set(new.get('config', {}))
+                         if base.get('config', {}).get(key) != new.get('config', {}).get(key))
+        print(f"⚠ 실행 설정이 다릅니다: {', '.join(changed)}")
+
+    metrics = [
+        ('처리량(req/s)', lambda r: r['throughput_rps']),
+        ('오류율', lambda r: r['error_rate']),
+        ('p50(ms)', lambda r: r['latency_ms']['p50']),
+        ('p95(ms)', lambda r: r['latency_ms']['p95']),
+        ('p99(ms)', lambda r: r['latency_ms']['p99']),
+    ]
+    for endpoint in dict.fromkeys(list(base['endpoints']) + list(new['endpoints'])):
+        print(f"\n[{endpoint}]")
+        if endpoint not in base['endpoints'] or endpoint not in new['endpoints']:
+            print("   한쪽 결과에만 있습니다.")
+            continue
+        for name, get in metrics:
+            before, after = get(base['endpoints'][endpoint]), get(new['endpoints'][endpoint])
+            if before is None or after is None:
+                continue
+            change = f"{(after - before) / before:+.1%}" if before else "-"
+            print(f"   {name:<14} {before:>10.3f} → {after:>10.3f}  ({change})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API 서버 오프라인 부하 테스트 (가짜 Gemini 백엔드)")
+    parser.add_argument("--endpoints", nargs="+", default=['generate-draft', 'chat'], choices=list(ENDPOINTS))
+    parser.add_argument("--rps", type=float, default=10.0, help="엔드포인트별 목표 초당 요청 수")
+    parser.add_argument("--duration", type=float, default=20.0, help="요청을 보내는 시간(초)")
+    parser.add_argument("--arrival", choices=('constant', 'poisson'), default='constant', help="요청 간격 분포")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="직전 요청과 같은 본문을 보낼 비율")
+    parser.add_argument("--server", choices=('sync', 'async'), default='sync', help="api_server / api_server_async")
+    parser.add_argument("--threads", type=int, default=8, help="동기 서버 요청 처리 스레드 수")
+    parser.add_argument("--latency", type=float, default=1.0, help="가짜 generate_content 평균 지연(초)")
+    parser.add_argument("--distribution", choices=LATENCY_DISTRIBUTIONS, default='lognormal', help="지연 시간 분포")
+    parser.add_argument("--spread", type=float, default=0.4, help="지연 분포 퍼짐 (fake_genai.make_latency_sampler)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 주입 확률")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 주입 확률")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="가짜 백엔드 분당 호출 한도 (넘으면 429)")
+    parser.add_argument("--retry-delay", type=float, default=1.0, help="429 응답의 retryDelay(초)")
+    parser.add_argument("--seed", type=int, default=0, help="난수 시드")
+    parser.add_argument("--output", help="결과 JSON 경로 (기본 bench_results/load_<시각>_<커밋>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="두 결과 파일 비교")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    rng = random.Random(args.seed)
+    fake = FakeClient(
+        args.latency, distribution=args.distribution, spread=args.spread, error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate, rpm_limit=args.rpm_limit, retry_delay=args.retry_delay,
+        seed=args.seed,
+    )
+    # 프로세스 공용 governor 대신 이번 실행 전용 (이전 실행의 통계/차단 상태가 섞이지 않도록)
+    governor = QuotaGovernor()
+    client = govern(fake, governor)
+    if args.server == 'sync':
+        import api_server as server
+    else:
+        import api_server_async as server
+    server.client = client
+
+    schedule = build_schedule(args.endpoints, args.rps, args.duration, args.arrival, args.duplicate_rate, rng)
+    print(f"🚀 {args.server} 서버, {', '.join(args.endpoints)} 각 {args.rps:g} req/s × {args.duration:g}초 "
+          f"(요청 {len(schedule)}개), 지연 {args.distribution} 평균 {args.latency:g}초")
+
+    if args.server == 'sync':
+        records, elapsed = run_sync(schedule, args.threads)
+    else:
+        records, elapsed = asyncio.run(run_async(schedule))
+
+    summary = summarize(records, elapsed, args.duration)
+    print_summary(summary)
+    usage_check = check_usage_records(fake, server)
+
+    commit, dirty = git_revision()
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git': {'commit': commit, 'dirty': dirty},
+        'python': sys.version.split()[0],
+        'config': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'elapsed': elapsed,
+        'backend': {
+            'calls': fake.calls,
+            'injected': fake.injected,
+            'governor': governor.stats(),
+            'usage_check': usage_check,
+        },
+        'endpoints': summary,
+    }
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(
+            RESULTS_DIR, f"load_{datetime.now():%Y%m%d_%H%M%S}_{(commit or 'nogit')[:8]}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=1)
+    print(f"\n💾 결과 저장: {output_path}")
+    print(f"   가짜 백엔드 호출 {fake.calls}회, 주입된 오류 {fake.injected}")
+    if usage_check['ok']:
+        print(f"   ✓ usage 기록 {usage_check['usage_records']}회 (응답당 1회)")
+    else:
+        print(f"   ⚠ usage 기록이 응답 수와 다릅니다: {usage_check}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
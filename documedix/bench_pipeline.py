@@ -0,0 +1,103 @@
+"""
+generate_draft 생성 방식 벤치마크 (three_step vs single_pass)
+
+같은 입력 파일과 품목 분류 결과로 두 방식의 품목 항목별 생성을 각각 실행하고,
+모델 호출 수, 토큰 사용량, 전체 소요 시간을 비교합니다.
+1단계(품목 분류)는 두 방식이 공유하므로 한 번만 실행하고 측정에서 제외합니다.
+
+사용법:
+    python bench_pipeline.py 파일1.pdf 파일2.pdf ...       # 실제 API 사용
+    python bench_pipeline.py --fake --latency 1.0           # 가짜 클라이언트 (오프라인)
+"""
+import os
+import time
+import argparse
+
+import generate_draft
+from generate_draft import (
+    DOCUMENT_CATEGORIES, PIPELINE_MODES, CATEGORY_WORKERS, generate_category_drafts,
+    group_files_by_category, model_stats, step1_identify_classification, upload_input_file
+)
+from fake_genai import FakeClient, FakeFile
+from tracing import TRACE_PATH, span
+
+
+def run_mode(mode, grouped_files, uploaded_by_path, cls_info, max_workers):
+    """한 가지 생성 방식을 실행하고 통계를 반환합니다."""
+    model_stats.reset()
+    start_time = time.perf_counter()
+    with span("bench_mode", {'documedix.pipeline_mode': mode, 'documedix.category_workers': max_workers}):
+        drafts, sources = generate_category_drafts(grouped_files, uploaded_by_path, cls_info, max_workers, mode)
+    stats = model_stats.snapshot()
+    stats['elapsed'] = time.perf_counter() - start_time
+    stats['sections'] = sum(1 for draft in drafts.values() if draft)
+    stats['sources'] = sum(len(s) for s in sources.values())
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate_draft 생성 방식 벤치마크")
+    parser.add_argument("files", nargs="*", help="분석할 제품 기술 문서 (생략 시 INPUT_FILE_PATHS)")
+    parser.add_argument("--modes", nargs="+", default=list(PIPELINE_MODES), choices=PIPELINE_MODES)
+    parser.add_argument("--workers", type=int, default=CATEGORY_WORKERS, help="동시에 실행할 항목 수")
+    parser.add_argument("--fake", action="store_true", help="가짜 클라이언트로 실행 (API 호출 없음)")
+    parser.add_argument("--latency", type=float, default=1.0, help="--fake 사용 시 호출당 지연(초)")
+    args = parser.parse_args()
+
+    paths = args.files or generate_draft.INPUT_FILE_PATHS
+    if args.fake:
+        generate_draft.client = FakeClient(args.latency)
+        # 파일을 지정하지 않으면 항목마다 가상 파일 하나씩
+        paths = paths or [f"{category}.pdf" for category in DOCUMENT_CATEGORIES]
+    else:
+        if not generate_draft.API_KEY:
+            print("❌ 오류: API 키가 설정되지 않았습니다.")
+            return
+        if not paths:
+            print("❌ 오류: 분석할 파일이 지정되지 않았습니다.")
+            return
+
+    # 업로드, 파일 분류, 1단계까지 한 트레이스(루트 span) 아래에 기록
+    with span("bench_pipeline", {
+        'documedix.pipeline_modes': ','.join(args.modes),
+        'documedix.category_workers': args.workers,
+        'documedix.fake_client': args.fake,
+    }) as run_span:
+        uploaded_by_path = {}
+        try:
+            if args.fake:
+                uploaded_by_path = {path: FakeFile(f"files/{i}", os.path.basename(path))
+                                    for i, path in enumerate(paths)}
+            else:
+                for path in paths:
+                    uploaded_by_path[path] = upload_input_file(path)
+
+            grouped_files = group_files_by_category(paths)
+            cls_info = step1_identify_classification(list(uploaded_by_path.values()))
+
+            results = {mode: run_mode(mode, grouped_files, uploaded_by_path, cls_info, args.workers)
+                       for mode in args.modes}
+        finally:
+            if not args.fake:
+                for uploaded in uploaded_by_path.values():
+                    try:
+                        generate_draft.client.files.delete(name=uploaded.name)
+                    except Exception:
+                        pass
+
+    print("\n" + "=" * 60)
+    print(f"📊 생성 방식 비교 (항목 {len(grouped_files)}개, 작업자 {args.workers}개)")
+    print("=" * 60)
+    print(f"{'방식':<12} {'호출':>5} {'입력 토큰':>10} {'검색 토큰':>10} {'출력 토큰':>10} "
+          f"{'전체 토큰':>10} {'호출 지연합':>10} {'소요 시간':>9}")
+    for mode, stats in results.items():
+        print(f"{mode:<12} {stats['calls']:>5} {stats['prompt_tokens']:>10} {stats['tool_use_tokens']:>10} "
+              f"{stats['output_tokens']:>10} {stats['total_tokens']:>10} {stats['latency']:>9.1f}s "
+              f"{stats['elapsed']:>8.1f}s")
+
+    if TRACE_PATH:
+        print(f"\n🧭 트레이스 {run_span.trace_id} 기록됨: {TRACE_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+"""
+로컬 BM25 역색인 검색 엔진
+
+File Search Store 에 올리는 것과 같은 승인 문서 코퍼스를 로컬에서 색인하여,
+후보 문서만 필요할 때 generate_content 왕복 없이 밀리초 단위로 검색합니다.
+
+- 한글은 공백 분리가 부정확하므로 문자 n-gram(기본 2-gram)으로 토큰화합니다.
+- 포스팅은 용어별 오프셋 + 평탄화된 NumPy 배열(doc_id, tf)로 저장하고,
+  로드 시 mmap 으로 열어 여러 워커 프로세스가 페이지를 공유합니다.
+- grade / classification_number / document_section / approval_number 로
+  점수 계산 전에 사전 필터링합니다.
+
+사용법:
+    python bm25_index.py build <데이터 디렉토리> <인덱스 디렉토리>
+    python bm25_index.py query <인덱스 디렉토리> "검색어" --grade 2 --section 성능
+"""
+import os
+import re
+import json
+import time
+import argparse
+import unicodedata
+from array import array
+from collections import Counter
+
+import numpy as np
+
+from corpus import FILTER_KEYS, extract_text, iter_corpus_files, metadata_to_dict, parse_metadata_for_store
+
+# --- 설정 ---
+# BM25 파라미터
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 한글 문자 n-gram 길이
+NGRAM_SIZE = 2
+
+# 인덱스 디렉토리 구성 파일
+META_FILE = "meta.json"
+VOCAB_FILE = "vocab.json"
+DOCS_FILE = "docs.json"
+
+_TOKEN_PATTERN = re.compile(r"[가-힣]+|[a-z0-9]+(?:[.\-][a-z0-9]+)*")
+_HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+
+def tokenize(text: str, ngram_size: int = NGRAM_SIZE) -> list:
+    """
+    텍스트를 색인용 토큰으로 분리합니다.
+
+    한글 구간은 문자 n-gram으로, 영문/숫자 구간(품목코드, 단위 등)은 단어 그대로 사용합니다.
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text):
+        if _HANGUL_PATTERN.match(run):
+            if len(run) <= ngram_size:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + ngram_size] for i in range(len(run) - ngram_size + 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class BM25Index:
+    """
+    배열 기반 포스팅을 사용하는 BM25 역색인
+
+    Attributes:
+        vocab: {토큰: 용어 ID}
+        docs: 문서별 {path, display_name, metadata} 리스트
+        term_offsets: 용어 ID별 포스팅 시작 위치 (길이 V+1)
+        post_docs: 포스팅 문서 ID 배열
+        post_tfs: 포스팅 용어 빈도 배열
+        doc_lens: 문서 길이(토큰 수) 배열
+    """
+
+    def __init__(self, vocab, docs, term_offsets, post_docs, post_tfs, doc_lens,
+                 k1=BM25_K1, b=BM25_B, ngram_size=NGRAM_SIZE):
+        self.vocab = vocab
+        self.docs = docs
+        self.term_offsets = term_offsets
+        self.post_docs = post_docs
+        self.post_tfs = post_tfs
+        self.doc_lens = doc_lens
+        self.k1 = k1
+        self.b = b
+        self.ngram_size = ngram_size
+
+        self.num_docs = len(docs)
+        avgdl = float(doc_lens.mean()) if self.num_docs else 0.0
+        self.avgdl = avgdl or 1.0
+        # 문서 길이 정규화 항을 미리 계산
+        self._norms = (k1 * (1 - b + b * doc_lens / self.avgdl)).astype(np.float32)
+        self._build_filter_columns()
+
+    def _build_filter_columns(self):
+        """필터 키마다 문서별 값 코드 배열을 만들어 빠른 마스크 생성에 사용합니다."""
+        self._filter_values = {}
+        self._filter_codes = {}
+        for key in FILTER_KEYS:
+            values = {}
+            codes = np.full(self.num_docs, -1, dtype=np.int32)
+            for doc_id, doc in enumerate(self.docs):
+                value = doc["metadata"].get(key)
+                if value is None:
+                    continue
+                codes[doc_id] = values.setdefault(str(value), len(values))
+            self._filter_values[key] = values
+            self._filter_codes[key] = codes
+
+    def filter_mask(self, filters=None):
+        """
+        메타데이터 필터에 해당하는 문서 마스크를 반환합니다.
+
+        Args:
+            filters: {키: 값 또는 값 리스트}, 예: {"grade": 2, "document_section": "성능"}
+
+        Returns:
+            필터가 없으면 None, 있으면 bool 배열
+        """
+        if not filters:
+            return None
+
+        mask = np.ones(self.num_docs, dtype=bool)
+        for key, wanted in filters.items():
+            if wanted is None:
+                continue
+            if key not in self._filter_codes:
+                raise ValueError(f"지원하지 않는 필터 키입니다: {key}")
+            if not isinstance(wanted, (list, tuple, set)):
+                wanted = [wanted]
+            values = self._filter_values[key]
+            codes = [values[str(v)] for v in wanted if str(v) in values]
+            mask &= np.isin(self._filter_codes[key], codes)
+        return mask
+
+    def search(self, query: str, top_k: int = 10, filters=None) -> list:
+        """
+        BM25 점수 기준 상위 top_k 문서를 반환합니다.
+
+        Args:
+            query: 검색어 (자연어 문장 가능)
+            top_k: 반환할 문서 수 (1 ~ 문서 수 범위로 보정)
+            filters: filter_mask 와 같은 형식의 메타데이터 필터
+
+        Returns:
+            [{"doc_id", "score", "path", "display_name", "metadata"}, ...]
+        """
+        query_terms = Counter(t for t in tokenize(query, self.ngram_size) if t in self.vocab)
+        if not query_terms or not self.num_docs:
+            return []
+        top_k = max(1, min(int(top_k), self.num_docs))
+
+        mask = self.filter_mask(filters)
+        if mask is not None and not mask.any():
+            return []
+
+        doc_chunks = []
+        weight_chunks = []
+        for term, query_tf in query_terms.items():
+            term_id = self.vocab[term]
+            start, end = self.term_offsets[term_id], self.term_offsets[term_id + 1]
+            docs = self.post_docs[start:end]
+            tfs = self.post_tfs[start:end].astype(np.float32)
+            df = end - start
+            idf = np.log(1.0 + (self.num_docs - df + 0.5) / (df + 0.5))
+
+            if mask is not None:
+                keep = mask[docs]
+                docs = docs[keep]
+                tfs = tfs[keep]
+                if not len(docs):
+                    continue
+
+            weights = (idf * query_tf) * tfs * (self.k1 + 1) / (tfs + self._norms[docs])
+            doc_chunks.append(docs)
+            weight_chunks.append(weights)
+
+        if not doc_chunks:
+            return []
+
+        scores = np.bincount(
+            np.concatenate(doc_chunks),
+            weights=np.concatenate(weight_chunks),
+            minlength=self.num_docs,
+        )
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            top = np.argpartition(scores[candidates], -top_k)[-top_k:]
+            candidates = candidates[top]
+        ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                "doc_id": int(doc_id),
+                "score": float(scores[doc_id]),
+                **self.docs[doc_id],
+            }
+            for doc_id in ranked
+        ]
+
+    def save(self, index_dir: str):
+        """인덱스를 디렉토리에 저장합니다. 배열은 .npy 로 저장하여 mmap 로드가 가능합니다."""
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "term_offsets.npy"), self.term_offsets)
+        np.save(os.path.join(index_dir, "post_docs.npy"), self.post_docs)
+        np.save(os.path.join(index_dir, "post_tfs.npy"), self.post_tfs)
+        np.save(os.path.join(index_dir, "doc_lens.npy"), self.doc_lens)
+        with open(os.path.join(index_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "num_docs": self.num_docs,
+                "num_terms": len(self.vocab),
+                "num_postings": int(len(self.post_docs)),
+                "k1": self.k1,
+                "b": self.b,
+                "ngram_size": self.ngram_size,
+            }, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True):
+        """저장된 인덱스를 로드합니다. mmap=True 이면 포스팅 배열을 복사 없이 매핑합니다."""
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, VOCAB_FILE), encoding="utf-8") as f:
+            vocab = json.load(f)
+        with open(os.path.join(index_dir, DOCS_FILE), encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(
+            vocab=vocab,
+            docs=docs,
+            term_offsets=np.load(os.path.join(index_dir, "term_offsets.npy"), mmap_mode=mmap_mode),
+            post_docs=np.load(os.path.join(index_dir, "post_docs.npy"), mmap_mode=mmap_mode),
+            post_tfs=np.load(os.path.join(index_dir, "post_tfs.npy"), mmap_mode=mmap_mode),
+            doc_lens=np.load(os.path.join(index_dir, "doc_lens.npy")),
+            k1=meta["k1"],
+            b=meta["b"],
+            ngram_size=meta["ngram_size"],
+        )
+
+
+class BM25IndexBuilder:
+    """문서를 하나씩 추가하여 BM25Index 를 만듭니다. 용어별 포스팅은 array 로 누적합니다."""
+
+    def __init__(self, ngram_size: int = NGRAM_SIZE):
+        self.ngram_size = ngram_size
+        self.vocab = {}
+        self.docs = []
+        self._postings_docs = []
+        self._postings_tfs = []
+        self._doc_lens = array("i")
+
+    def add_document(self, text: str, path: str, metadata: dict):
+        """문서 하나를 색인에 추가하고 문서 ID를 반환합니다."""
+        doc_id = len(self.docs)
+        term_counts = Counter(tokenize(text, self.ngram_size))
+        for term, tf in term_counts.items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.vocab)
+                self._postings_docs.append(array("i"))
+                self._postings_tfs.append(array("H"))
+            self._postings_docs[term_id].append(doc_id)
+            self._postings_tfs[term_id].append(min(tf, 65535))
+
+        self._doc_lens.append(sum(term_counts.values()))
+        self.docs.append({
+            "path": path,
+            "display_name": os.path.basename(path),
+            "metadata": metadata,
+        })
+        return doc_id
+
+    def build(self) -> BM25Index:
+        """누적된 포스팅을 평탄화하여 BM25Index 를 만듭니다."""
+        lengths = np.fromiter((len(p) for p in self._postings_docs), dtype=np.int64, count=len(self.vocab))
+        term_offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=term_offsets[1:])
+
+        post_docs = np.empty(int(term_offsets[-1]), dtype=np.int32)
+        post_tfs = np.empty(int(term_offsets[-1]), dtype=np.uint16)
+        for term_id, (docs, tfs) in enumerate(zip(self._postings_docs, self._postings_tfs)):
+            start, end = term_offsets[term_id], term_offsets[term_id + 1]
+            post_docs[start:end] = np.frombuffer(docs, dtype=np.int32)
+            post_tfs[start:end] = np.frombuffer(tfs, dtype=np.uint16)
+
+        return BM25Index(
+            vocab=self.vocab,
+            docs=self.docs,
+            term_offsets=term_offsets,
+            post_docs=post_docs,
+            post_tfs=post_tfs,
+            doc_lens=np.frombuffer(self._doc_lens, dtype=np.int32).copy(),
+            ngram_size=self.ngram_size,
+        )
+
+
+def build_index(data_root_dir: str, index_dir: str, text_loader=extract_text) -> BM25Index:
+    """
+    data_root_dir 을 순회하며 BM25 인덱스를 만들고 index_dir 에 저장합니다.
+
+    Args:
+        data_root_dir: upload_script.py 의 DATA_ROOT_DIR 과 같은 코퍼스 루트
+        index_dir: 인덱스를 저장할 디렉토리
+        text_loader: 파일 경로를 받아 텍스트를 반환하는 함수
+
+    Returns:
+        생성된 BM25Index
+    """
+    print(f"로컬 인덱스 생성 시작: {data_root_dir}")
+    start_time = time.time()
+    builder = BM25IndexBuilder()
+    skipped_count = 0
+
+    for file_path in iter_corpus_files(data_root_dir):
+        metadata = parse_metadata_for_store(file_path, data_root_dir)
+        if not metadata:
+            skipped_count += 1
+            continue
+
+        try:
+            text = text_loader(file_path)
+        except Exception as e:
+            print(f"  ✗ 텍스트 추출 실패: {os.path.basename(file_path)} ({e})")
+            skipped_count += 1
+            continue
+
+        if not text.strip():
+            skipped_count += 1
+            continue
+
+        builder.add_document(text, os.path.relpath(file_path, data_root_dir), metadata_to_dict(metadata))
+        if len(builder.docs) % 1000 == 0:
+            print(f"  - {len(builder.docs)}개 문서 색인됨...")
+
+    index = builder.build()
+    index.save(index_dir)
+
+    print(f"\n{'='*60}")
+    print(f"색인된 문서: {index.num_docs}개 / 건너뜀: {skipped_count}개")
+    print(f"용어 수: {len(index.vocab)}개 / 포스팅 수: {len(index.post_docs)}개")
+    print(f"소요 시간: {time.time() - start_time:.1f}초")
+    print(f"저장 위치: {index_dir}")
+    print(f"{'='*60}")
+    return index
+
+
+# --- API 서버용 인프로세스 API ---
+
+_loaded_indexes = {}
+
+
+def get_index(index_dir: str) -> BM25Index:
+    """프로세스당 한 번만 인덱스를 로드하여 재사용합니다."""
+    index = _loaded_indexes.get(index_dir)
+    if index is None:
+        index = _loaded_indexes[index_dir] = BM25Index.load(index_dir)
+    return index
+
+
+def search(index_dir: str, query: str, top_k: int = 10, filters=None) -> list:
+    """index_dir 의 인덱스에서 검색합니다. Flask 핸들러에서 직접 호출할 수 있습니다."""
+    return get_index(index_dir).search(query, top_k=top_k, filters=filters)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 BM25 인덱스 생성 및 검색")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="코퍼스에서 인덱스 생성")
+    build_parser.add_argument("data_dir", help="승인 문서 루트 디렉토리")
+    build_parser.add_argument("index_dir", help="인덱스 저장 디렉토리")
+
+    query_parser = subparsers.add_parser("query", help="인덱스 검색")
+    query_parser.add_argument("index_dir", help="인덱스 디렉토리")
+    query_parser.add_argument("query", help="검색어")
+    query_parser.add_argument("--top-k", type=int, default=10)
+    query_parser.add_argument("--grade", type=int)
+    query_parser.add_argument("--code", help="품목코드 (classification_number)")
+    query_parser.add_argument("--section", help="항목 (document_section)")
+    query_parser.add_argument("--approval", help="허가번호 (approval_number)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.data_dir, args.index_dir)
+        return
+
+    filters = {
+        "grade": args.grade,
+        "classification_number": args.code,
+        "document_section": args.section,
+        "approval_number": args.approval,
+    }
+    index = get_index(args.index_dir)
+    start_time = time.perf_counter()
+    results = index.search(args.query, top_k=args.top_k, filters=filters)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    print(f"검색 결과 {len(results)}건 ({elapsed_ms:.2f} ms)")
+    for rank, result in enumerate(results, 1):
+        meta = result["metadata"]
+        print(f"{rank:2d}. [{result['score']:.3f}] {result['display_name']}")
+        print(f"    {meta.get('grade')}등급 / {meta.get('classification_number')} / {meta.get('document_section')}")
+
+
+if __name__ == "__main__":
+    main()
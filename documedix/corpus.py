@@ -0,0 +1,125 @@
+"""
+승인 문서 코퍼스 공통 유틸리티
+
+upload_script.py 가 File Search Store 에 올리는 것과 같은 디렉토리 구조
+(classN/N등급_품목코드/회사명_허가번호_항목.pdf)를 순회하고,
+경로에서 메타데이터를 추출하며, 로컬 인덱싱을 위한 텍스트를 뽑아냅니다.
+"""
+import os
+import re
+
+# 지원하는 파일 확장자
+SUPPORTED_EXTENSIONS = ['.pdf', '.txt', '.xlsx', '.xls', '.csv']
+
+# 로컬 인덱스에서 사전 필터로 사용하는 메타데이터 키
+FILTER_KEYS = ['grade', 'classification_number', 'document_section', 'approval_number']
+
+
+def parse_metadata_for_store(file_path: str, base_dir: str) -> list:
+    """
+    파일 경로에서 File Search Store의 custom_metadata 형식에 맞는 메타데이터를 파싱합니다.
+    """
+    relative_path = os.path.relpath(file_path, base_dir)
+    parts = relative_path.split(os.sep)
+
+    if len(parts) < 3:
+        return []
+
+    grade_match = re.match(r"class(\d+)", parts[0])
+    grade = int(grade_match.group(1)) if grade_match else None
+
+    classification_part = parts[1]
+    classification_number_match = re.match(r"\d+등급_([A-Z0-9.]+)", classification_part)
+    classification_number = classification_number_match.group(1) if classification_number_match else None
+
+    filename_without_ext = os.path.splitext(parts[2])[0]
+    file_name_parts = filename_without_ext.split('_', 2)
+
+    company_name = file_name_parts[0] if len(file_name_parts) > 0 else None
+    approval_number = file_name_parts[1] if len(file_name_parts) > 1 else None
+    document_section = file_name_parts[2] if len(file_name_parts) > 2 else None
+
+    metadata = []
+    if grade is not None:
+        metadata.append({"key": "grade", "numeric_value": grade})
+    if classification_number:
+        metadata.append({"key": "classification_number", "string_value": classification_number})
+    if company_name:
+        metadata.append({"key": "company_name", "string_value": company_name})
+    if approval_number:
+        metadata.append({"key": "approval_number", "string_value": approval_number})
+    if document_section:
+        metadata.append({"key": "document_section", "string_value": document_section})
+
+    return metadata
+
+
+def metadata_to_dict(metadata: list) -> dict:
+    """custom_metadata 리스트를 {key: value} 딕셔너리로 변환합니다."""
+    result = {}
+    for item in metadata:
+        if "numeric_value" in item:
+            result[item["key"]] = item["numeric_value"]
+        else:
+            result[item["key"]] = item.get("string_value")
+    return result
+
+
+def iter_corpus_files(data_root_dir: str, extensions=None):
+    """
+    data_root_dir 을 순회하며 지원 형식의 파일 경로를 반환합니다.
+    순서가 실행마다 같도록 디렉토리와 파일명을 정렬합니다.
+    """
+    extensions = extensions or SUPPORTED_EXTENSIONS
+    for root, dirs, files in os.walk(data_root_dir):
+        dirs.sort()
+        for file in sorted(files):
+            if os.path.splitext(file)[1].lower() in extensions:
+                yield os.path.join(root, file)
+
+
+def _read_text_file(file_path):
+    """UTF-8 로 읽고, 실패하면 CP949(한글 윈도우)로 다시 읽습니다."""
+    for encoding in ('utf-8-sig', 'cp949'):
+        try:
+            with open(file_path, 'r', encoding=encoding) as f:
+                return f.read()
+        except UnicodeDecodeError:
+            continue
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+
+def extract_text(file_path: str) -> str:
+    """
+    로컬 인덱싱용으로 파일에서 텍스트를 추출합니다.
+
+    Args:
+        file_path: PDF, TXT, CSV, Excel 파일 경로
+
+    Returns:
+        추출된 텍스트 (추출할 수 없으면 빈 문자열)
+    """
+    file_ext = os.path.splitext(file_path)[1].lower()
+
+    if file_ext in ('.txt', '.csv'):
+        return _read_text_file(file_path)
+
+    if file_ext == '.pdf':
+        import pdfplumber
+        pages = []
+        with pdfplumber.open(file_path) as pdf:
+            for page in pdf.pages:
+                pages.append(page.extract_text() or "")
+        return "\n".join(pages)
+
+    if file_ext in ('.xlsx', '.xls'):
+        import pandas as pd
+        sheets = pd.read_excel(file_path, sheet_name=None, header=None, dtype=str)
+        lines = []
+        for frame in sheets.values():
+            for row in frame.fillna("").itertuples(index=False):
+                lines.append(" ".join(cell for cell in row if cell))
+        return "\n".join(lines)
+
+    return ""
@@ -1,6 +1,5 @@
 # File Search Store 삭제
-import os
-from google import genai
+from gemini_client import API_KEY, get_client
 from dotenv import load_dotenv
 
 # .env 파일에서 환경 변수 로드
@@ -16,15 +15,13 @@ def delete_file_search_store():
     print("--- File Search Store 삭제 ---")
 
     # API 키 설정 확인
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
+    if not API_KEY:
         print("오류: API key가 설정되지 않았습니다.")
         print(".env 파일에 GEMINI_API_KEY를 설정해주세요.")
         return
 
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_client()
         
         print("\n" + "="*60)
         print("=== File Search Store 정보 ===")
@@ -72,14 +69,12 @@ def list_all_stores():
     """
     print("--- 모든 File Search Store 목록 ---")
     
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
+    if not API_KEY:
         print("오류: API key가 설정되지 않았습니다.")
         return
 
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_client()
         
         stores = list(client.file_search_stores.list())
         
@@ -0,0 +1,195 @@
+"""
+생성 초안 2단계 캐시
+
+같은 품목/등급/항목에 대해 같은(공백만 다른) 입력으로 초안을 다시 생성할 때
+classify_and_generate 호출을 건너뛰기 위한 캐시입니다.
+
+- 1단계: 프로세스 내 LRU (TTL 적용)
+- 2단계: 선택적 디스크 캐시 (SQLite WAL) — 같은 서버의 모든 워커 프로세스가 공유
+- 키: (매핑된 항목, 품목코드, 등급, 정규화된 입력, 프롬프트 버전, 모델)의 SHA-256
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """유니코드 정규화(NFC) 후 연속 공백을 하나로 줄이고 앞뒤 공백을 제거합니다."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def make_key(mapped_category, item_code, grade, text, prompt_version, model) -> str:
+    """초안 캐시 키를 만듭니다."""
+    payload = json.dumps(
+        [mapped_category, item_code, str(grade) if grade is not None else None,
+         normalize_text(text), prompt_version, model],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DraftCache:
+    """
+    메모리 LRU + 디스크(SQLite) 2단계 캐시
+
+    Args:
+        max_entries: 메모리 LRU 최대 항목 수
+        ttl: 항목 유효 시간(초)
+        disk_path: 디스크 캐시 SQLite 경로, 빈 값이면 메모리 캐시만 사용
+        purge_interval: 만료된 디스크 항목을 삭제하는 최소 간격(초)
+    """
+
+    def __init__(self, max_entries=512, ttl=24 * 3600, disk_path="", purge_interval=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.purge_interval = purge_interval
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._local = threading.local()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.purged = 0
+
+        if disk_path:
+            # 테이블만 만들고 연결은 닫음 (serve.py 가 포크 전에 만든 캐시를 워커가 물려받아도
+            # 부모의 SQLite 연결을 공유하지 않도록, 연결은 사용하는 스레드에서 새로 엶)
+            conn = sqlite3.connect(disk_path, timeout=5)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS drafts (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+                )
+                self._last_purge = time.time()
+                self.purged += conn.execute(
+                    "DELETE FROM drafts WHERE expires_at <= ?", (self._last_purge,)
+                ).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+
+    def _disk(self):
+        """스레드별 SQLite 연결 (워커 프로세스 간에는 WAL 로 공유)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        """캐시된 값을 반환합니다. 없으면 None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+        if self.disk_path:
+            try:
+                row = self._disk().execute(
+                    "SELECT value, expires_at FROM drafts WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"  ⚠ 디스크 캐시 조회 실패: {e}")
+                row = None
+            if row is not None:
+                value = json.loads(row[0])
+                self._put_memory(key, value, row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        """값을 두 단계 캐시에 모두 저장합니다."""
+        expires_at = time.time() + self.ttl
+        self._put_memory(key, value, expires_at)
+        if self.disk_path:
+            try:
+                conn = self._disk()
+                conn.execute(
+                    "INSERT OR REPLACE INTO drafts (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"  ⚠ 디스크 캐시 저장 실패: {e}")
+            if time.time() - self._last_purge >= self.purge_interval:
+                self.purge_expired()
+        with self._lock:
+            self.stores += 1
+
+    def purge_expired(self) -> int:
+        """만료된 디스크 항목을 삭제하고 삭제한 행 수를 반환합니다."""
+        if not self.disk_path:
+            return 0
+        now = time.time()
+        with self._lock:
+            self._last_purge = now
+        try:
+            conn = self._disk()
+            deleted = conn.execute("DELETE FROM drafts WHERE expires_at <= ?", (now,)).rowcount
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"  ⚠ 디스크 캐시 정리 실패: {e}")
+            return 0
+        with self._lock:
+            self.purged += deleted
+        return deleted
+
+    def _put_memory(self, key, value, expires_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "purged": self.purged,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
+
+
+def create_draft_cache() -> DraftCache:
+    """환경 변수 설정으로 DraftCache 를 만듭니다 (DRAFT_CACHE_PATH 를 지정하면 디스크 캐시 사용)."""
+    return DraftCache(
+        max_entries=int(os.getenv("DRAFT_CACHE_MAX_ENTRIES", "512")),
+        ttl=int(os.getenv("DRAFT_CACHE_TTL", str(24 * 3600))),
+        disk_path=os.getenv("DRAFT_CACHE_PATH", ""),
+        purge_interval=int(os.getenv("DRAFT_CACHE_PURGE_INTERVAL", "3600")),
+    )
+
+
+def cache_directives(cache_control: str) -> set:
+    """Cache-Control 헤더 값을 지시어 집합으로 파싱합니다 (예: 'no-cache, no-store')."""
+    return {d.strip().lower() for d in (cache_control or "").split(",") if d.strip()}
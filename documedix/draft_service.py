@@ -0,0 +1,335 @@
+"""
+초안 생성/채팅 요청 공통 로직
+
+Flask 서버(api_server.py)와 비동기 서버(api_server_async.py)가 함께 사용하는
+입력 검증, 품목 항목 매핑, 프롬프트 및 File Search 설정 구성을 모아 둔 모듈입니다.
+"""
+import os
+import json
+import time
+from contextlib import contextmanager
+from google.genai import types
+from dotenv import load_dotenv
+from item_catalog import get_catalog
+from prompt_cache import PromptParts
+
+load_dotenv()
+
+# --- 설정 ---
+FILE_SEARCH_STORE_NAME = "           "
+MODEL_NAME = "gemini-2.5-flash"
+# 프롬프트 문구를 바꾸면 올려서 이전 캐시 항목을 무효화합니다
+PROMPT_VERSION = "3"
+# 사용자 입력이 이 크기(바이트)를 넘을 때만 파일로 업로드하고, 이하면 프롬프트에 인라인으로 포함
+INLINE_TEXT_MAX_BYTES = int(os.getenv("INLINE_TEXT_MAX_BYTES", str(512 * 1024)))
+# /api/generate-application 에서 동시에 생성할 항목 수
+APPLICATION_MAX_PARALLEL = int(os.getenv("APPLICATION_MAX_PARALLEL", "9"))
+
+# 품목 항목별 매핑
+CATEGORY_MAP = {
+    "모양 및 구조(작용원리)": "모양및구조-작용원리",
+    "모양 및 구조(외형)": "모양및구조-외형",
+    "모양 및 구조(치수)": "모양및구조-치수",
+    "모양 및 구조(특성)": "모양및구조-특성",
+    "원재료": "원재료",
+    "성능": "성능",
+    "사용목적": "사용목적",
+    "사용방법": "사용방법",
+    "사용 시 주의사항": "사용시주의사항"
+}
+
+CATEGORY_TITLES = {
+    "모양및구조-작용원리": "작용원리",
+    "모양및구조-외형": "외형",
+    "모양및구조-치수": "치수",
+    "모양및구조-특성": "특성",
+    "원재료": "원재료",
+    "사용목적": "사용목적",
+    "성능": "성능",
+    "사용방법": "사용방법",
+    "사용시주의사항": "사용 시 주의사항"
+}
+
+# --- 정적 프롬프트 (요청마다 같은 지시문, system_instruction 으로 전달되어 암시적 캐시 대상) ---
+DRAFT_SYSTEM_PROMPT = """
+당신은 '도큐메딕(Documedix)' AI 솔루션입니다.
+사용자가 제공한 제품 정보를 바탕으로 '의료기기 제조 허가 신청서'의 항목을 작성합니다.
+
+**[출력 형식 - 매우 중요]**
+1. HTML 형식으로 작성하세요. 제목은 제외하고 본문만 작성하세요.
+2. **표가 필요한 경우 반드시 HTML 테이블 형식을 사용하세요:**
+   - <table> 태그 사용
+   - <thead>, <tbody> 구조 사용
+   - <th>로 헤더, <td>로 데이터 셀 작성
+   - border, cellpadding, cellspacing 등 스타일 속성 포함
+   - 예시:
+   <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse; width: 100%;">
+     <thead>
+       <tr>
+         <th>항목</th>
+         <th>내용</th>
+       </tr>
+     </thead>
+     <tbody>
+       <tr>
+         <td>제품명</td>
+         <td>예시 제품</td>
+       </tr>
+     </tbody>
+   </table>
+3. 마크다운 테이블(| 기호 사용)은 절대 사용하지 마세요.
+4. 일반 텍스트 형식의 표도 사용하지 마세요.
+5. 구조화된 정보는 항상 HTML 테이블로 표현하세요.
+"""
+
+CHAT_SYSTEM_PROMPT = """
+당신은 의료기기 제조 허가 신청서 작성을 돕는 전문 AI 어시스턴트입니다.
+
+**[역할]**
+- 의료기기 제조 허가 신청서 작성에 대한 질문에 답변합니다.
+- File Search를 통해 관련 규정, 가이드라인, 합격 사례를 참조합니다.
+- 명확하고 실용적인 답변을 제공합니다.
+
+**[답변 지침]**
+1. 간결하고 이해하기 쉽게 답변하세요.
+2. 관련 규정이나 사례가 있으면 참조하세요.
+3. 필요시 예시를 들어 설명하세요.
+4. **표가 필요한 경우 반드시 HTML 테이블 형식을 사용하세요:**
+   - <table border="1" cellpadding="5" cellspacing="0" style="border-collapse: collapse; width: 100%;"> 형식 사용
+   - <thead>, <tbody>, <th>, <td> 태그 사용
+   - 마크다운 테이블(| 기호) 절대 사용 금지
+   - 일반 텍스트 표 형식 사용 금지
+5. 답변은 HTML 형식으로 작성하되, 가독성 좋은 구조를 유지하세요.
+"""
+
+
+class StageTimer:
+    """요청 단계별 소요 시간(ms)을 기록합니다."""
+    
+    def __init__(self):
+        self.stages = {}
+        self._start = time.perf_counter()
+    
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - start) * 1000
+    
+    def mark(self, name):
+        """요청 시작부터 지금까지의 시간을 기록합니다 (예: 첫 바이트 전송 시점 'ttfb')."""
+        self.stages.setdefault(name, (time.perf_counter() - self._start) * 1000)
+    
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self._start) * 1000
+    
+    def as_dict(self):
+        """단계별 소요 시간(ms, 소수점 1자리)과 전체 시간"""
+        timing = {name: round(ms, 1) for name, ms in self.stages.items()}
+        timing['total'] = round(self.total_ms, 1)
+        return timing
+    
+    def server_timing(self):
+        """Server-Timing 헤더 값 (브라우저 개발자 도구에서 확인 가능)"""
+        entries = [f'{name};dur={ms:.1f}' for name, ms in self.stages.items()]
+        entries.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(entries)
+
+
+# SSE 응답 헤더 (프록시 버퍼링 방지)
+SSE_HEADERS = {
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no'
+}
+
+
+def sse_event(event, data):
+    """Server-Sent Events 메시지 하나를 만듭니다."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def collect_stream_metadata(chunk, metadata):
+    """
+    스트리밍 청크에서 토큰 사용량, 그라운딩(File Search 인용) 메타데이터, 종료 사유를 모읍니다.
+    모두 보통 마지막 청크에 실리므로 가장 최근 값으로 덮어씁니다.
+    """
+    usage = getattr(chunk, 'usage_metadata', None)
+    if usage is not None:
+        metadata['usage'] = usage.model_dump(mode='json', exclude_none=True)
+    for candidate in getattr(chunk, 'candidates', None) or []:
+        grounding = getattr(candidate, 'grounding_metadata', None)
+        if grounding is not None:
+            metadata['grounding'] = grounding.model_dump(mode='json', exclude_none=True)
+        finish_reason = getattr(candidate, 'finish_reason', None)
+        if finish_reason is not None:
+            metadata['finish_reason'] = getattr(finish_reason, 'value', finish_reason)
+    return metadata
+
+
+def is_cacheable_draft(draft, finish_reason=None) -> bool:
+    """
+    초안 캐시에 저장해도 되는 응답인지 판별합니다.
+    빈 응답(안전 차단, 후보 없음 등)이나 정상 종료(STOP)가 아닌 응답을 캐시하면
+    TTL 동안 같은 요청에 잘못된 결과가 HIT 로 반환되므로 저장하지 않습니다.
+    """
+    return bool(draft and draft.strip()) and finish_reason in (None, 'STOP')
+
+
+def validate_item(data):
+    """
+    품목 카탈로그가 있으면 itemCode/grade 를 검증합니다 (Gemini 호출 전에 잘못된 요청 차단).
+    
+    Returns:
+        오류 메시지, 문제가 없거나 카탈로그가 없으면 None
+    """
+    catalog = get_catalog()
+    if catalog is None:
+        return None
+    grade = data.get('grade')
+    try:
+        grade = int(grade) if grade not in (None, '') else None
+    except (TypeError, ValueError):
+        return f"잘못된 등급입니다: {grade}"
+    return catalog.validate(data.get('itemCode'), grade)
+
+
+def validate_draft_request(data):
+    """
+    /api/generate-draft 요청 본문을 검증합니다.
+    
+    Returns:
+        오류 메시지, 문제가 없으면 None
+    """
+    if not data.get('category'):
+        return '카테고리를 선택해주세요.'
+    if not data.get('textContent', '').strip():
+        return '내용을 입력해주세요.'
+    if not data.get('itemCode'):
+        return '품목을 선택해주세요.'
+    return validate_item(data)
+
+
+def validate_application_request(data):
+    """
+    /api/generate-application 요청 본문을 검증합니다.
+    
+    Returns:
+        오류 메시지, 문제가 없으면 None
+    """
+    if not data.get('textContent', '').strip():
+        return '내용을 입력해주세요.'
+    if not data.get('itemCode'):
+        return '품목을 선택해주세요.'
+    unknown = [c for c in data.get('categories') or [] if c not in CATEGORY_MAP]
+    if unknown:
+        return f"알 수 없는 항목입니다: {', '.join(unknown)}"
+    return validate_item(data)
+
+
+def validate_chat_request(data):
+    """/api/chat 요청 본문을 검증합니다. 오류 메시지 또는 None 을 반환합니다."""
+    if not data.get('message', '').strip():
+        return '메시지를 입력해주세요.'
+    return None
+
+
+def build_draft_request(category, user_content, grade=None, item_code=None):
+    """
+    초안 생성 프롬프트와 File Search 설정을 구성합니다.
+    
+    Args:
+        category: 웹에서 선택한 카테고리 (예: '모양 및 구조(작용원리)')
+        user_content: 사용자가 입력한 텍스트
+        grade: 웹에서 선택한 등급 (1, 2, 3, 4)
+        item_code: 웹에서 선택한 품목코드 (예: A07040.03)
+    
+    Returns:
+        PromptParts (정적 지시문 / 제품 정보와 사용자 입력 / File Search 도구)
+    """
+    # 카테고리 매핑
+    mapped_category = CATEGORY_MAP.get(category, category)
+    section_title = CATEGORY_TITLES.get(mapped_category, category)
+    
+    # 웹에서 선택한 품목 정보 사용 (등급을 보내지 않으면 카탈로그의 등급)
+    catalog = get_catalog()
+    catalog_item = catalog.get(item_code) if catalog and item_code else None
+    target_code = item_code if item_code else "A07040.03"
+    target_grade = grade if grade else (catalog_item or {}).get('grade') or 2
+    
+    # 분류는 코드 첫 글자로 표시하고, 품목명은 카탈로그에 있을 때만 포함
+    item_category_map = {
+        'A': '기구·기계',
+        'B': '재료',
+        'C': '치과재료',
+        'D': '의료용품'
+    }
+    item_category = item_category_map.get(target_code[0], '의료기기')
+    item_name = catalog_item['name'] if catalog_item and catalog_item['name'] else None
+    item_name_line = f"\n- 품목명: {item_name}" if item_name else ""
+    
+    # 2단계: File Search 설정 (메타데이터 필터링)
+    file_search_config = types.FileSearch(
+        file_search_store_names=[FILE_SEARCH_STORE_NAME]
+    )
+    
+    # 메타데이터 필터 적용
+    if target_code and mapped_category:
+        filter_conditions = [
+            f'classification_number="{target_code}"',
+            f'document_section:"{mapped_category}"'
+        ]
+        file_search_config.metadata_filter = ' AND '.join(filter_conditions)
+    
+    # 3단계: 유사 문서 검색 + 초안 생성 (통합)
+    generation_prompt = f"""
+**[제품 정보]**
+- 등급: {target_grade}등급
+- 품목코드: {target_code}{item_name_line}
+- 분류: {item_category}
+
+**[임무]**
+사용자가 제공한 제품 정보를 바탕으로 '의료기기 제조 허가 신청서'의 '{section_title}' 항목을 작성하세요.
+
+**[참조 지침]**
+1. File Search를 통해 품목코드 '{target_code}' ({target_grade}등급 {item_category})의 '{mapped_category}' 항목에 해당하는 기존 합격 문서들의 스타일과 용어를 정확히 모방하세요.
+2. 특히 **같은 품목코드({target_code})** 또는 **유사한 품목코드(같은 대분류)**의 승인 문서를 우선적으로 참조하세요.
+3. 식약처 고시나 가이드라인 문서가 검색되면 해당 작성 지침을 반드시 준수하세요.
+4. 기존 합격 사례의 문장 구조, 전문 용어, 표현 방식을 참고하세요.
+5. 사용자가 제공한 제품 정보를 최대한 반영하되, 누락된 정보는 합격 사례를 참고하여 보완하세요.
+
+**[사용자 제공 정보]**
+{user_content}
+"""
+
+    return PromptParts(DRAFT_SYSTEM_PROMPT, generation_prompt, [types.Tool(file_search=file_search_config)],
+                       label=mapped_category)
+
+
+def build_chat_request(user_message, category=''):
+    """
+    채팅 프롬프트와 File Search 설정을 구성합니다.
+    
+    Returns:
+        PromptParts (정적 지시문 / 사용자 질문 / File Search 도구)
+    """
+    # File Search 설정
+    file_search_config = types.FileSearch(
+        file_search_store_names=[FILE_SEARCH_STORE_NAME]
+    )
+    
+    # 카테고리가 있으면 메타데이터 필터 적용
+    if category and category in CATEGORY_MAP:
+        mapped_category = CATEGORY_MAP[category]
+        file_search_config.metadata_filter = f'document_section:"{mapped_category}"'
+    
+    # 채팅 프롬프트 (동적 부분: 사용자 질문)
+    chat_prompt = f"""
+**[사용자 질문]**
+{user_message}
+"""
+
+    return PromptParts(CHAT_SYSTEM_PROMPT, chat_prompt, [types.Tool(file_search=file_search_config)],
+                       label='chat')
@@ -0,0 +1,269 @@
+"""
+오프라인 벤치마크용 가짜 genai 클라이언트
+
+실제 API 호출 없이 generate_content 지연 시간만 흉내 냅니다.
+동기(client.models)와 비동기(client.aio.models) 인터페이스를 모두 제공하므로
+api_server.client / api_server_async.client 를 바꿔 끼워 동시성 비교에 사용합니다.
+
+부하 테스트(bench_load.py)용으로 다음을 설정할 수 있습니다.
+- 지연 시간 분포: fixed / uniform / normal / lognormal / exponential (평균 latency, 퍼짐 spread)
+- 오류 주입: error_rate 확률로 503, rate_limit_rate 확률 또는 rpm_limit 초과 시 429 (RetryInfo 포함)
+  실제 API 와 같은 google.genai.errors 예외를 발생시키므로 quota_governor 재시도 경로를 그대로 탑니다.
+"""
+import math
+import time
+import random
+import asyncio
+import itertools
+import threading
+from collections import deque
+
+from google.genai import errors, types
+
+# 토큰 수 추정치: 텍스트는 2자당 1토큰, 첨부 파일은 파일당 고정 토큰
+CHARS_PER_TOKEN = 2
+FILE_TOKENS = 1000
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+
+def make_latency_sampler(distribution, mean, spread=0.0, rng=None):
+    """
+    지연 시간(초) 표본 함수를 만듭니다.
+
+    Args:
+        distribution: LATENCY_DISTRIBUTIONS 중 하나
+        mean: 평균 지연 시간
+        spread: uniform 은 ±spread 초, normal 은 표준편차(초), lognormal 은 로그 표준편차(sigma)
+                (fixed/exponential 은 사용하지 않음, exponential 은 평균이 mean 인 지수 분포)
+    """
+    rng = rng or random.Random()
+    if distribution == "fixed":
+        return lambda: mean
+    if distribution == "uniform":
+        return lambda: max(0.0, rng.uniform(mean - spread, mean + spread))
+    if distribution == "normal":
+        return lambda: max(0.0, rng.gauss(mean, spread))
+    if distribution == "lognormal":
+        # 평균이 mean 이 되도록 mu 를 맞춤 (꼬리가 긴 실제 API 지연에 가까움)
+        mu = math.log(mean) - spread ** 2 / 2 if mean > 0 else 0.0
+        return lambda: rng.lognormvariate(mu, spread) if mean > 0 else 0.0
+    if distribution == "exponential":
+        return lambda: rng.expovariate(1 / mean) if mean > 0 else 0.0
+    raise ValueError(f"알 수 없는 지연 분포입니다: {distribution} (가능한 값: {', '.join(LATENCY_DISTRIBUTIONS)})")
+
+
+def rate_limit_error(retry_delay):
+    """실제 API 의 429 RESOURCE_EXHAUSTED 응답과 같은 형식의 예외"""
+    return errors.ClientError(429, {'error': {
+        'code': 429,
+        'message': 'Resource has been exhausted (e.g. check quota).',
+        'status': 'RESOURCE_EXHAUSTED',
+        'details': [{
+            '@type': 'type.googleapis.com/google.rpc.RetryInfo',
+            'retryDelay': f"{retry_delay:g}s",
+        }],
+    }})
+
+
+def server_error():
+    return errors.ServerError(503, {'error': {
+        'code': 503,
+        'message': 'The model is overloaded. Please try again later.',
+        'status': 'UNAVAILABLE',
+    }})
+
+
+class FakeResponse:
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+        self.candidates = []
+
+
+def estimate_usage(contents, text, system_tokens=0):
+    """프롬프트/첨부 파일/응답 길이로 토큰 사용량을 추정합니다."""
+    prompt_tokens = system_tokens
+    for part in contents:
+        if isinstance(part, str):
+            prompt_tokens += len(part) // CHARS_PER_TOKEN
+        else:
+            prompt_tokens += FILE_TOKENS
+    output_tokens = len(text) // CHARS_PER_TOKEN
+    return types.GenerateContentResponseUsageMetadata(
+        prompt_token_count=prompt_tokens,
+        candidates_token_count=output_tokens,
+        total_token_count=prompt_tokens + output_tokens,
+    )
+
+
+def _split(text, num_chunks):
+    size = max(1, -(-len(text) // num_chunks))
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _stream_usage(usage, chunks, i):
+    """i 번째 청크까지의 누적 usage_metadata (실제 API 처럼 모든 청크에 실림)"""
+    output_tokens = len(''.join(chunks[:i + 1])) // CHARS_PER_TOKEN
+    return usage.model_copy(update={
+        'candidates_token_count': output_tokens,
+        'total_token_count': usage.prompt_token_count + output_tokens,
+    })
+
+
+class FakeFile:
+    def __init__(self, name, display_name=None):
+        self.name = name
+        self.display_name = display_name
+
+
+class _Models:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def generate_content(self, model, contents, config=None):
+        self._owner.inject_error()
+        time.sleep(self._owner.sample_latency())
+        return self._owner.respond(model, contents, config)
+
+    def generate_content_stream(self, model, contents, config=None):
+        """첫 청크까지 지연 시간의 first_chunk 비율, 나머지 청크는 남은 지연 시간을 나눠 전송합니다."""
+        owner = self._owner
+        owner.inject_error()
+        response = owner.respond(model, contents, config)
+        chunks = _split(response.text, owner.stream_chunks)
+        first_chunk_latency, chunk_interval = owner.stream_timing()
+        time.sleep(first_chunk_latency)
+        for i, text in enumerate(chunks):
+            if i:
+                time.sleep(chunk_interval)
+            yield FakeResponse(text, _stream_usage(response.usage_metadata, chunks, i))
+
+
+class _AsyncModels:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def generate_content(self, model, contents, config=None):
+        self._owner.inject_error()
+        await asyncio.sleep(self._owner.sample_latency())
+        return self._owner.respond(model, contents, config)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        owner = self._owner
+        owner.inject_error()
+        response = owner.respond(model, contents, config)
+        chunks = _split(response.text, owner.stream_chunks)
+        first_chunk_latency, chunk_interval = owner.stream_timing()
+
+        async def stream():
+            await asyncio.sleep(first_chunk_latency)
+            for i, text in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(chunk_interval)
+                yield FakeResponse(text, _stream_usage(response.usage_metadata, chunks, i))
+
+        return stream()
+
+
+class _Files:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def upload(self, file, config=None):
+        return FakeFile(f"files/fake-{next(self._owner.counter)}", (config or {}).get('display_name'))
+
+    def delete(self, name, config=None):
+        return None
+
+
+class _AsyncFiles:
+    def __init__(self, owner):
+        self._owner = owner
+
+    async def upload(self, file, config=None):
+        return self._owner.files.upload(file, config)
+
+    async def delete(self, name, config=None):
+        return None
+
+
+class _Aio:
+    def __init__(self, owner):
+        self.models = _AsyncModels(owner)
+        self.files = _AsyncFiles(owner)
+
+
+class FakeClient:
+    """
+    genai.Client 대용
+
+    Args:
+        latency: generate_content 한 번의 (평균) 지연 시간(초)
+        stream_chunks: generate_content_stream 이 나눠 보내는 청크 수
+        first_chunk: 스트리밍 시 첫 청크까지 걸리는 시간의 비율 (latency 대비)
+        distribution: 지연 시간 분포 (LATENCY_DISTRIBUTIONS 중 하나)
+        spread: 분포의 퍼짐 (make_latency_sampler 참고)
+        error_rate: 호출이 503 으로 실패할 확률
+        rate_limit_rate: 호출이 429 로 실패할 확률
+        rpm_limit: 최근 60초 호출 수가 이 값을 넘으면 429 (0 이면 제한 없음)
+        retry_delay: 429 응답의 RetryInfo.retryDelay (초)
+        seed: 난수 시드 (같은 값이면 같은 지연/오류 순서)
+    """
+
+    def __init__(self, latency=1.0, stream_chunks=8, first_chunk=0.2, distribution="fixed", spread=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, rpm_limit=0, retry_delay=1.0, seed=None):
+        self.latency = latency
+        self.stream_chunks = max(1, stream_chunks)
+        self.first_chunk = first_chunk
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rpm_limit = rpm_limit
+        self.retry_delay = retry_delay
+        self._rng = random.Random(seed)
+        self._sample = make_latency_sampler(distribution, latency, spread, self._rng)
+        self._recent_calls = deque()
+        self.counter = itertools.count()
+        self.calls = 0
+        self.injected = {'429': 0, '503': 0}
+        self._lock = threading.Lock()
+        self.models = _Models(self)
+        self.files = _Files(self)
+        self.aio = _Aio(self)
+
+    def sample_latency(self):
+        with self._lock:
+            return self._sample()
+
+    def stream_timing(self):
+        """(첫 청크까지 지연, 이후 청크 간격) — 호출마다 지연 시간을 새로 뽑음"""
+        latency = self.sample_latency()
+        first_chunk_latency = latency * self.first_chunk
+        return first_chunk_latency, (latency - first_chunk_latency) / max(1, self.stream_chunks - 1)
+
+    def inject_error(self):
+        """설정된 확률/분당 한도에 따라 429 또는 503 예외를 발생시킵니다."""
+        with self._lock:
+            now = time.monotonic()
+            while self._recent_calls and now - self._recent_calls[0] >= 60:
+                self._recent_calls.popleft()
+            draw = self._rng.random()
+            if draw < self.rate_limit_rate or (self.rpm_limit and len(self._recent_calls) >= self.rpm_limit):
+                self.injected['429'] += 1
+                error = rate_limit_error(self.retry_delay)
+            elif draw < self.rate_limit_rate + self.error_rate:
+                self.injected['503'] += 1
+                error = server_error()
+            else:
+                self._recent_calls.append(now)
+                return
+        raise error
+
+    def respond(self, model, contents, config=None):
+        with self._lock:
+            self.calls += 1
+        text = f"<p>가짜 응답 ({model})</p>"
+        system_tokens = 0
+        if config is not None and config.system_instruction:
+            system_tokens = len(config.system_instruction) // CHARS_PER_TOKEN
+        return FakeResponse(text, estimate_usage(contents, text, system_tokens))
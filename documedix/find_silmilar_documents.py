@@ -1,16 +1,15 @@
 
 import os
-import time
 import re
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from upload_utils import upload_file
+from gemini_client import API_KEY, get_client
 
 # .env 파일에서 환경 변수를 로드합니다.
 load_dotenv()
 
 # --- 설정 ---
-API_KEY = os.getenv("GEMINI_API_KEY")
 
 # 검색할 파일 검색 스토어의 전체 이름입니다.
 FILE_SEARCH_STORE_NAME = ""
@@ -21,47 +20,13 @@ INPUT_FILE_PATHS = [
 
 # --- 스크립트 본문 ---
 
-def upload_file_with_retry(client, path, max_retries=3):
-    """지수 백오프를 사용하여 파일 업로드를 재시도합니다."""
-    import tempfile
-    import shutil
-    
-    # 한글 파일명 문제 해결: 임시 영문 파일로 복사
-    file_ext = os.path.splitext(path)[1]
-    temp_fd, temp_file = tempfile.mkstemp(suffix=file_ext, prefix='upload_')
-    os.close(temp_fd)
-    
-    try:
-        shutil.copy2(path, temp_file)
-        
-        for attempt in range(max_retries):
-            try:
-                # 임시 파일 업로드 (display_name에 원본 파일명 사용)
-                uploaded = client.files.upload(
-                    file=temp_file,
-                    config={'display_name': os.path.basename(path)}
-                )
-                return uploaded
-            except Exception as e:
-                if attempt < max_retries - 1:
-                    time.sleep(2 ** attempt)
-                    print(f"파일 업로드 재시도 중... ({attempt + 1}/{max_retries})")
-                    continue
-                raise e
-    finally:
-        # 임시 파일 정리
-        if os.path.exists(temp_file):
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
-
 def get_file_summary(client, file_path: str) -> str:
     """Gemini를 사용하여 파일의 핵심 내용을 요약합니다."""
     print(f"'{os.path.basename(file_path)}' 파일 분석 중...")
     try:
-        # 1. 파일 업로드
-        uploaded_file = upload_file_with_retry(client, path=file_path)
+        # 1. 파일 업로드 (429/5xx 재시도는 quota_governor 가 처리)
+        # 원본 파일을 그대로 스트리밍 (display_name에 원본 파일명 사용)
+        uploaded_file = upload_file(client, file_path)
         
         # 2. 요약 요청
         prompt = "이 문서는 의료기기에 대한 기술문서의 일부입니다. 이 파일의 핵심 내용을 다른 문서와 비교하기 쉽도록 주요 특징, 기능, 사양 위주로 요약해주세요."
@@ -94,7 +59,7 @@ def find_similar_documents():
 
     
     # 요약용 클라이언트 객체는 이 스크립트의 get_file_summary 함수에 필요합니다.
-    client = genai.Client(api_key=API_KEY)
+    client = get_client()
 
     # 1. 각 입력 파일 요약
     print("--- 1단계: 입력 파일 분석 및 요약 ---")
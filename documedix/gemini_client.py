@@ -0,0 +1,141 @@
+"""
+공용 Gemini 클라이언트
+
+스크립트/서버마다 import 시점에 genai.Client 를 따로 만들고 HTTP 연결 풀 설정 없이 쓰던 것을
+이 모듈 하나로 모읍니다.
+
+- get_client(): 프로세스당 하나의 클라이언트를 처음 사용할 때 생성 (quota_governor 로 감쌈)
+  httpx 연결 풀 크기를 동시 호출 수에 맞추고 keep-alive 연결을 재사용합니다.
+  (기본 httpx 설정은 keep-alive 연결 20개라 동시 호출이 많으면 연결을 매번 새로 맺습니다.)
+- lazy_client(): 모듈 전역 변수로 둘 수 있는 지연 생성 래퍼 (import 만으로는 클라이언트를 만들지 않음)
+- resolve_store(): 표시 이름 → File Search Store 조회 결과를 프로세스 내와 파일(GEMINI_STORE_CACHE_PATH)에 캐시
+  (매 실행마다 file_search_stores.list() 로 모든 Store 를 훑지 않고, 캐시된 이름으로 get 한 번만 호출)
+"""
+import os
+import json
+import threading
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- 설정 ---
+API_KEY = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
+# 연결 풀 크기 (지정하면 get_client 의 pool_size 보다 우선)
+HTTP_POOL_SIZE = int(os.getenv("GEMINI_HTTP_POOL_SIZE", "0"))
+# pool_size 를 지정하지 않았을 때의 기본값 (API 서버 동시 요청 기준)
+DEFAULT_POOL_SIZE = 32
+# 유휴 keep-alive 연결 유지 시간(초)
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GEMINI_HTTP_KEEPALIVE", "60"))
+# Store 표시 이름 → 이름 캐시 파일 (빈 값이면 프로세스 내에서만 캐시)
+STORE_CACHE_PATH = os.getenv("GEMINI_STORE_CACHE_PATH", ".gemini_store_cache.json")
+
+_client = None
+_client_lock = threading.Lock()
+_stores = {}
+_store_lock = threading.Lock()
+
+
+def _http_options(pool_size):
+    import httpx
+    from google.genai import types
+
+    limits = httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return types.HttpOptions(client_args={'limits': limits}, async_client_args={'limits': limits})
+
+
+def get_client(pool_size=None):
+    """
+    프로세스 공용 클라이언트를 반환합니다 (처음 호출할 때 생성).
+
+    Args:
+        pool_size: HTTP 연결 풀 크기 (동시 호출 수), 처음 생성할 때만 적용
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            from google import genai
+            from quota_governor import govern
+
+            size = HTTP_POOL_SIZE or pool_size or DEFAULT_POOL_SIZE
+            _client = govern(genai.Client(api_key=API_KEY, http_options=_http_options(size)))
+        return _client
+
+
+class LazyClient:
+    """처음 속성에 접근할 때 get_client() 를 호출하는 래퍼"""
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size
+
+    def __getattr__(self, name):
+        return getattr(get_client(self.pool_size), name)
+
+
+def lazy_client(pool_size=None) -> LazyClient:
+    """모듈 전역 client 로 쓸 지연 생성 래퍼를 반환합니다."""
+    return LazyClient(pool_size)
+
+
+def _load_store_cache() -> dict:
+    if not STORE_CACHE_PATH or not os.path.exists(STORE_CACHE_PATH):
+        return {}
+    try:
+        with open(STORE_CACHE_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def remember_store(store):
+    """Store 를 표시 이름으로 캐시합니다 (새로 생성한 Store 등록용)."""
+    with _store_lock:
+        _stores[store.display_name] = store
+        if not STORE_CACHE_PATH:
+            return
+        names = _load_store_cache()
+        names[store.display_name] = store.name
+        try:
+            with open(STORE_CACHE_PATH, 'w', encoding='utf-8') as f:
+                json.dump(names, f, ensure_ascii=False, indent=1)
+        except OSError as e:
+            print(f"  ⚠ Store 캐시 저장 실패: {e}")
+
+
+def resolve_store(display_name: str, client=None):
+    """
+    표시 이름으로 File Search Store 를 찾습니다. 없으면 None.
+    캐시된 이름이 있으면 get 으로 확인만 하고, 없거나 삭제된 Store 면 목록에서 찾습니다.
+
+    Args:
+        display_name: Store 표시 이름
+        client: 사용할 클라이언트 (None 이면 get_client())
+    """
+    with _store_lock:
+        store = _stores.get(display_name)
+    if store is not None:
+        return store
+
+    from google.genai import errors
+
+    client = client or get_client()
+    cached_name = _load_store_cache().get(display_name)
+    if cached_name:
+        try:
+            store = client.file_search_stores.get(name=cached_name)
+        except errors.APIError as e:
+            print(f"  ⚠ 캐시된 Store({cached_name})를 찾을 수 없어 목록에서 다시 찾습니다: {e.code}")
+            store = None
+
+    if store is None:
+        store = next(
+            (s for s in client.file_search_stores.list() if s.display_name == display_name), None
+        )
+
+    if store is not None:
+        remember_store(store)
+    return store
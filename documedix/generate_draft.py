@@ -1,15 +1,27 @@
 import os
 import time
 import json
-from google import genai
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from google.genai import types
 from dotenv import load_dotenv
+from upload_utils import upload_file
+from item_classifier import classify_product
+from gemini_client import API_KEY, lazy_client
+from tracing import TRACE_PATH, bind, current_span, span, traced
 
 load_dotenv()
 
 # --- 설정 ---
-API_KEY = os.getenv("GEMINI_API_KEY")
 FILE_SEARCH_STORE_NAME = ""
+MODEL_NAME = "gemini-2.5-flash"
+# 품목 항목별 생성 방식
+#   three_step : 2단계(유사 문서 요약) → 3단계(초안 생성), 항목당 모델 호출/검색 2회
+#   single_pass: File Search 를 사용하는 한 번의 호출로 초안 생성 + 그라운딩 근거 반환
+PIPELINE_MODES = ("three_step", "single_pass")
+PIPELINE_MODE = os.getenv("DRAFT_PIPELINE_MODE", "three_step")
+# 품목 항목별 2단계→3단계를 동시에 실행할 작업자 수 (1이면 순차 실행)
+CATEGORY_WORKERS = int(os.getenv("CATEGORY_WORKERS", "4"))
 
 # --- 품목 항목 정의 ---
 DOCUMENT_CATEGORIES = [
@@ -37,14 +49,104 @@ CATEGORY_KEYWORDS = {
     "사용시주의사항": ["주의사항", "경고", "주의", "금기사항"]
 }
 
+# 품목 항목별 한국어 제목 매핑
+CATEGORY_TITLES = {
+    "모양및구조-작용원리": "작용원리",
+    "모양및구조-외형": "외형",
+    "모양및구조-치수": "치수",
+    "모양및구조-특성": "특성",
+    "원재료": "원재료",
+    "사용목적": "사용목적",
+    "성능": "성능",
+    "사용방법": "사용방법",
+    "사용시주의사항": "사용 시 주의사항"
+}
+
 # 분석할 새 제품의 기술 문서 파일 경로 목록
 INPUT_FILE_PATHS = [
 ]
 
-client = genai.Client(api_key=API_KEY)
+# 카테고리 동시 생성 수만큼 연결 풀 확보
+client = lazy_client(pool_size=CATEGORY_WORKERS)
+
+
+class ModelCallStats:
+    """모델 호출 수, 토큰 사용량, 호출 지연 시간 누계 (스레드 안전)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.latency = 0.0
+            self.prompt_tokens = 0
+            self.tool_use_tokens = 0
+            self.output_tokens = 0
+            self.total_tokens = 0
+    
+    def record(self, response, elapsed):
+        usage = getattr(response, 'usage_metadata', None)
+        with self._lock:
+            self.calls += 1
+            self.latency += elapsed
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_token_count or 0
+                self.tool_use_tokens += usage.tool_use_prompt_token_count or 0
+                self.output_tokens += usage.candidates_token_count or 0
+                self.total_tokens += usage.total_token_count or 0
+    
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'latency': self.latency,
+                'prompt_tokens': self.prompt_tokens,
+                'tool_use_tokens': self.tool_use_tokens,
+                'output_tokens': self.output_tokens,
+                'total_tokens': self.total_tokens,
+            }
+
+
+# 프로세스 전체 모델 호출 통계
+model_stats = ModelCallStats()
 
 # --- 헬퍼 함수 ---
 
+def generate_content(contents, config):
+    """client.models.generate_content 를 호출하고 호출 수/토큰/지연 시간을 기록합니다."""
+    with span("gemini.generate_content", {
+        'gen_ai.system': 'gemini',
+        'gen_ai.operation.name': 'generate_content',
+        'gen_ai.request.model': MODEL_NAME,
+    }) as call_span:
+        start_time = time.perf_counter()
+        response = client.models.generate_content(model=MODEL_NAME, contents=contents, config=config)
+        model_stats.record(response, time.perf_counter() - start_time)
+        call_span.record_usage(getattr(response, 'usage_metadata', None))
+        call_span.set_attribute('documedix.retrieval.chunks', len(extract_grounding_sources(response)))
+    return response
+
+
+def extract_grounding_sources(response):
+    """
+    응답의 그라운딩 메타데이터에서 File Search 가 참조한 문서 조각을 추출합니다.
+    
+    Returns:
+        [{"title": 문서 이름, "text": 참조된 내용 일부}, ...]
+    """
+    sources = []
+    for candidate in getattr(response, 'candidates', None) or []:
+        grounding = getattr(candidate, 'grounding_metadata', None)
+        for chunk in getattr(grounding, 'grounding_chunks', None) or []:
+            context = chunk.retrieved_context
+            if context is None:
+                continue
+            sources.append({'title': context.title, 'text': (context.text or '')[:300]})
+    return sources
+
+
 def classify_file_by_category(file_path):
     """
     파일 경로나 이름을 분석하여 어떤 품목 항목에 해당하는지 판별합니다.
@@ -66,6 +168,7 @@ def classify_file_by_category(file_path):
     return None
 
 
+@traced("group_files")
 def group_files_by_category(file_paths):
     """
     여러 파일들을 품목 항목별로 그룹화합니다.
@@ -94,31 +197,32 @@ def group_files_by_category(file_paths):
     # 빈 카테고리 제거
     grouped = {k: v for k, v in grouped.items() if v}
     
+    current_span().set_attributes({
+        'documedix.files': len(file_paths),
+        'documedix.categories': len(grouped),
+        'documedix.unclassified_files': len(unclassified),
+    })
     return grouped
 
 
-def upload_temp_file(path):
-    """분석용 임시 파일 업로드 (한글 처리 포함)"""
-    import tempfile, shutil
-    file_ext = os.path.splitext(path)[1]
-    temp_fd, temp_file = tempfile.mkstemp(suffix=file_ext, prefix='analyze_')
-    os.close(temp_fd)
-    shutil.copy2(path, temp_file)
-    
-    try:
-        uploaded = client.files.upload(file=temp_file, config={'display_name': os.path.basename(path)})
-        return uploaded, temp_file
-    except Exception as e:
-        if os.path.exists(temp_file): 
-            os.unlink(temp_file)
-        raise e
+def upload_input_file(path):
+    """분석용 파일 업로드 (원본 파일을 그대로 스트리밍, 한글 파일명 지원)"""
+    with span("upload", {'file.name': os.path.basename(path)}) as upload_span:
+        if os.path.exists(path):
+            upload_span.set_attribute('file.size', os.path.getsize(path))
+        return upload_file(client, path)
 
 # --- 3단계 워크플로우 ---
 
-def step1_identify_classification(user_files):
+@traced("step1_identify_classification")
+def step1_identify_classification(user_files, candidates=None):
     """
     1단계: 사용자의 문서를 분석하여 품목 코드와 등급을 추론합니다.
     File Search Store에서 관련 규정 문서를 참조합니다.
+    
+    Args:
+        user_files: 업로드된 사용자 파일 리스트
+        candidates: 품목 분류 코드북에서 찾은 후보 품목코드 리스트 (있으면 프롬프트에 포함)
     """
     print("\n🔍 [1단계] 제품 품목 분류 분석 중...")
     
@@ -143,10 +247,11 @@ def step1_identify_classification(user_files):
 }
 ```
 """
+    if candidates:
+        prompt += f"\n**참고: 품목 분류 코드북에서 찾은 후보 품목코드:** {', '.join(candidates)}\n"
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        response = generate_content(
             contents=[prompt] + user_files,
             config=types.GenerateContentConfig(
                 response_mime_type="application/json",
@@ -174,6 +279,7 @@ def step1_identify_classification(user_files):
         print(f"   💡 근거: {result.get('reason')[:100]}...")
         return result
     except json.JSONDecodeError as e:
+        current_span().record_exception(e)
         print(f"   ⚠️ JSON 파싱 실패: {e}")
         print(f"   응답 내용: {response.text[:200]}...")
         print("   파일 경로에서 메타데이터를 추출합니다.")
@@ -198,10 +304,12 @@ def step1_identify_classification(user_files):
         
         return {"classification_code": None, "grade": None, "item_name": None, "reason": "추출 실패"}
     except Exception as e:
+        current_span().record_exception(e)
         print(f"   ⚠️ 분류 실패: {e}")
         return {"classification_code": None, "grade": None, "item_name": None, "reason": "오류 발생"}
 
 
+@traced("step2_search_similar_documents")
 def step2_search_similar_documents(user_files, classification_info, category=None):
     """
     2단계: 확정된 품목 코드를 필터로 사용하여 
@@ -217,6 +325,7 @@ def step2_search_similar_documents(user_files, classification_info, category=Non
     """
     target_code = classification_info.get("classification_code")
     target_grade = classification_info.get("grade")
+    current_span().set_attribute('documedix.category', category)
     
     category_text = f" [{category}]" if category else ""
     print(f"\n🔎 [2단계]{category_text} [{target_code}] 관련 합격 사례 검색 중...")
@@ -272,8 +381,7 @@ def step2_search_similar_documents(user_files, classification_info, category=Non
 """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        response = generate_content(
             contents=[search_prompt] + user_files,
             config=types.GenerateContentConfig(
                 tools=[types.Tool(file_search=file_search_config)]
@@ -283,10 +391,12 @@ def step2_search_similar_documents(user_files, classification_info, category=Non
         print(f"   ✅ 유사 문서 검색 완료")
         return response.text
     except Exception as e:
+        current_span().record_exception(e)
         print(f"   ⚠️ 검색 실패: {e}")
         return ""
 
 
+@traced("step3_generate_draft")
 def step3_generate_draft(user_files, classification_info, similar_docs, category=None):
     """
     3단계: 검색된 합격 사례를 참조하여 
@@ -303,6 +413,7 @@ def step3_generate_draft(user_files, classification_info, similar_docs, category
     """
     target_code = classification_info.get("classification_code")
     item_name = classification_info.get("item_name", "의료기기")
+    current_span().set_attribute('documedix.category', category)
     
     category_text = f" [{category}]" if category else ""
     print(f"\n✍️ [3단계]{category_text} 기술문서 초안 생성 중...")
@@ -321,20 +432,7 @@ def step3_generate_draft(user_files, classification_info, similar_docs, category
 
     # 품목 항목별 맞춤 생성 프롬프트
     if category:
-        # 품목 항목별 한국어 제목 매핑
-        category_titles = {
-            "모양및구조-작용원리": "작용원리",
-            "모양및구조-외형": "외형",
-            "모양및구조-치수": "치수",
-            "모양및구조-특성": "특성",
-            "원재료": "원재료",
-            "사용목적": "사용목적",
-            "성능": "성능",
-            "사용방법": "사용방법",
-            "사용시주의사항": "사용 시 주의사항"
-        }
-        
-        section_title = category_titles.get(category, category)
+        section_title = CATEGORY_TITLES.get(category, category)
         
         generation_prompt = f"""
 당신은 '도큐메딕(Documedix)' AI 솔루션입니다.
@@ -406,8 +504,7 @@ Markdown 형식으로 각 항목을 명확하게 구분하여 작성하세요.
 """
 
     try:
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
+        response = generate_content(
             contents=[generation_prompt] + user_files,
             config=types.GenerateContentConfig(
                 tools=[types.Tool(file_search=file_search_config)]
@@ -417,14 +514,168 @@ Markdown 형식으로 각 항목을 명확하게 구분하여 작성하세요.
         print(f"   ✅ 초안 생성 완료")
         return response.text
     except Exception as e:
+        current_span().record_exception(e)
         print(f"   ⚠️ 생성 실패: {e}")
         return ""
 
 
+@traced("step_single_pass_generate")
+def step_single_pass_generate(user_files, classification_info, category):
+    """
+    단일 호출 모드: File Search 검색과 초안 생성을 한 번의 모델 호출로 처리합니다.
+    2단계 요약을 거치지 않으므로 검색된 문서 조각이 그대로 생성에 사용되며,
+    어떤 문서를 참조했는지는 응답의 그라운딩 메타데이터로 확인합니다.
+    
+    Args:
+        user_files: 업로드된 사용자 파일 리스트
+        classification_info: 1단계에서 분석된 품목 분류 정보
+        category: 품목 항목 (예: '모양및구조-작용원리')
+    
+    Returns:
+        (생성된 초안 텍스트, 참조 문서 조각 리스트)
+    """
+    target_code = classification_info.get("classification_code")
+    target_grade = classification_info.get("grade")
+    item_name = classification_info.get("item_name", "의료기기")
+    section_title = CATEGORY_TITLES.get(category, category)
+    current_span().set_attribute('documedix.category', category)
+    
+    print(f"\n✍️ [검색+생성] [{category}] 기술문서 초안 생성 중...")
+    
+    file_search_config = types.FileSearch(
+        file_search_store_names=[FILE_SEARCH_STORE_NAME]
+    )
+    
+    generation_prompt = f"""
+당신은 '도큐메딕(Documedix)' AI 솔루션입니다.
+
+**[임무]**
+사용자의 제품 파일을 바탕으로 '의료기기 제조 허가 신청서'의 '{section_title}' 항목을 작성하세요.
+
+**[참조 지침]**
+1. File Search를 통해 품목코드 '{target_code}' ({target_grade}등급, {item_name})의 '{category}' 항목에 해당하는 기존 합격 문서와 식약처 작성 가이드라인을 직접 검색하세요.
+2. 다른 품목코드, 등급, 또는 항목의 문서는 참조하지 마세요.
+3. 검색된 합격 문서들의 스타일과 용어, 문장 구조, 표현 방식을 정확히 모방하세요.
+4. 가이드라인 문서가 검색되면 해당 작성 지침을 반드시 준수하세요.
+5. 사용자가 제공한 제품 정보를 최대한 반영하되, 누락된 정보는 합격 사례를 참고하여 보완하세요.
+
+**[출력 형식]**
+Markdown 형식으로 작성하세요.
+
+---
+
+## {section_title}
+
+(작성 내용)
+
+---
+"""
+
+    try:
+        response = generate_content(
+            contents=[generation_prompt] + user_files,
+            config=types.GenerateContentConfig(
+                tools=[types.Tool(file_search=file_search_config)]
+            )
+        )
+        
+        sources = extract_grounding_sources(response)
+        print(f"   ✅ 초안 생성 완료 (참조 문서 조각 {len(sources)}개)")
+        return response.text, sources
+    except Exception as e:
+        current_span().record_exception(e)
+        print(f"   ⚠️ 생성 실패: {e}")
+        return "", []
+
+
+def run_category_pipeline(category, category_uploaded_files, classification_info, mode=PIPELINE_MODE):
+    """
+    품목 항목 하나의 초안을 생성합니다.
+    
+    Args:
+        mode: "three_step" 이면 2단계(유사 문서 검색) → 3단계(초안 생성),
+              "single_pass" 이면 검색과 생성을 한 번의 호출로 처리
+    
+    Returns:
+        (초안, 참조 문서 조각 리스트) — three_step 모드는 참조 문서 조각을 반환하지 않음
+    """
+    with span("category_pipeline", {
+        'documedix.category': category,
+        'documedix.pipeline_mode': mode,
+        'documedix.files': len(category_uploaded_files),
+    }):
+        if mode == "single_pass":
+            return step_single_pass_generate(category_uploaded_files, classification_info, category)
+        
+        similar_docs = step2_search_similar_documents(
+            category_uploaded_files, 
+            classification_info, 
+            category=category
+        )
+        draft = step3_generate_draft(
+            category_uploaded_files, 
+            classification_info, 
+            similar_docs,
+            category=category
+        )
+        return draft, []
+
+
+def generate_category_drafts(grouped_files, uploaded_by_path, classification_info,
+                             max_workers=CATEGORY_WORKERS, mode=PIPELINE_MODE):
+    """
+    품목 항목별 초안을 생성합니다. 각 항목의 생성 체인은 작업자 풀에서 독립적으로 실행됩니다.
+    
+    Args:
+        grouped_files: {품목항목: [파일경로, ...]}
+        uploaded_by_path: {파일경로: 업로드된 Gemini 파일 객체}
+        classification_info: 1단계에서 분석된 품목 분류 정보
+        max_workers: 동시에 실행할 항목 수 (1이면 순차 실행)
+        mode: 생성 방식 (PIPELINE_MODES 중 하나)
+    
+    Returns:
+        ({품목항목: 초안}, {품목항목: 참조 문서 조각 리스트}) (DOCUMENT_CATEGORIES 순서)
+    """
+    if mode not in PIPELINE_MODES:
+        raise ValueError(f"알 수 없는 생성 방식입니다: {mode} (가능한 값: {', '.join(PIPELINE_MODES)})")
+    
+    # 각 항목에는 해당 항목으로 분류된 파일만 전달
+    category_files = {}
+    for category, file_paths in grouped_files.items():
+        category_uploaded_files = [uploaded_by_path[p] for p in file_paths if p in uploaded_by_path]
+        if category_uploaded_files:
+            category_files[category] = category_uploaded_files
+    
+    if max_workers <= 1:
+        results = {
+            category: run_category_pipeline(category, files, classification_info, mode)
+            for category, files in category_files.items()
+        }
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                # bind: 작업자 스레드의 span 을 호출한 스레드의 span 아래에 기록
+                category: executor.submit(bind(run_category_pipeline), category, files, classification_info, mode)
+                for category, files in category_files.items()
+            }
+            results = {category: future.result() for category, future in futures.items()}
+    
+    ordered = [category for category in DOCUMENT_CATEGORIES if category in results]
+    drafts = {category: results[category][0] for category in ordered}
+    sources = {category: results[category][1] for category in ordered}
+    return drafts, sources
+
+
 # --- 메인 실행 ---
 
-def main():
-    """도큐메딕 문서 생성 파이프라인 실행"""
+def main(max_workers=CATEGORY_WORKERS, mode=PIPELINE_MODE):
+    """
+    도큐메딕 문서 생성 파이프라인 실행
+    
+    Args:
+        max_workers: 품목 항목별 생성을 동시에 실행할 작업자 수 (1이면 순차 실행)
+        mode: 품목 항목별 생성 방식 ("three_step" 또는 "single_pass")
+    """
     print("="*60)
     print("📄 도큐메딕(Documedix) - AI 기반 의료기기 기술문서 생성")
     print("="*60)
@@ -437,6 +688,21 @@ def main():
         print("❌ 오류: 분석할 파일이 지정되지 않았습니다.")
         return
 
+    with span("generate_draft", {
+        'gen_ai.request.model': MODEL_NAME,
+        'documedix.pipeline_mode': mode,
+        'documedix.category_workers': max_workers,
+        'documedix.files': len(INPUT_FILE_PATHS),
+    }) as run_span:
+        run_pipeline(max_workers, mode)
+    
+    if TRACE_PATH:
+        print(f"\n🧭 트레이스 {run_span.trace_id} 기록됨: {TRACE_PATH}")
+        print(f"   python trace_view.py {TRACE_PATH} --trace {run_span.trace_id}")
+
+
+def run_pipeline(max_workers, mode):
+    """파일 분류 → 업로드 → 1단계 → 품목 항목별 생성 → 저장 → 정리 (main 에서 호출)"""
     # 0. 파일을 품목 항목별로 그룹화
     print("\n📂 파일 분류 중...")
     grouped_files = group_files_by_category(INPUT_FILE_PATHS)
@@ -446,14 +712,14 @@ def main():
 
     # 1. 사용자 파일 업로드
     uploaded_files = []
-    temp_paths = []
+    uploaded_by_path = {}
     
     print("\n📤 파일 업로드 중...")
     for path in INPUT_FILE_PATHS:
         try:
-            up_file, temp_path = upload_temp_file(path)
+            up_file = upload_input_file(path)
             uploaded_files.append(up_file)
-            temp_paths.append(temp_path)
+            uploaded_by_path[path] = up_file
             print(f"   ✅ {os.path.basename(path)}")
         except Exception as e:
             print(f"   ❌ {os.path.basename(path)}: {e}")
@@ -463,38 +729,18 @@ def main():
         return
 
     try:
-        # 2. 품목 분류 분석 (1단계)
-        cls_info = step1_identify_classification(uploaded_files)
-        
-        # 3. 품목별 문서 생성
-        category_drafts = {}
-        
-        for category, file_paths in grouped_files.items():
-            # 해당 카테고리의 파일만 필터링
-            category_uploaded_files = [
-                uf for uf in uploaded_files 
-                if any(fp in [p for p in file_paths] for fp in INPUT_FILE_PATHS)
-            ]
-            
-            if not category_uploaded_files:
-                continue
-            
-            # 2단계: 해당 품목 항목의 유사 문서 검색
-            similar_docs = step2_search_similar_documents(
-                category_uploaded_files, 
-                cls_info, 
-                category=category
-            )
-            
-            # 3단계: 해당 품목 항목의 초안 생성
-            draft = step3_generate_draft(
-                category_uploaded_files, 
-                cls_info, 
-                similar_docs,
-                category=category
+        # 2. 품목 분류 분석 (1단계: 캐시/경로/코드북으로 결정되지 않을 때만 LLM 호출)
+        with span("classify_product") as classify_span:
+            cls_info = classify_product(
+                INPUT_FILE_PATHS,
+                lambda candidates: step1_identify_classification(uploaded_files, candidates)
             )
-            
-            category_drafts[category] = draft
+            classify_span.set_attribute('documedix.classification_code', cls_info.get('classification_code'))
+        
+        # 3. 품목별 문서 생성 (항목별 생성 체인을 동시에 실행)
+        category_drafts, category_sources = generate_category_drafts(
+            grouped_files, uploaded_by_path, cls_info, max_workers, mode
+        )
         
         # 4. 결과 통합 및 출력
         print("\n" + "="*60)
@@ -510,7 +756,8 @@ def main():
         
         # 5. 결과를 파일로 저장
         output_path = os.path.join(os.path.dirname(__file__), "generated_draft.md")
-        with open(output_path, "w", encoding="utf-8") as f:
+        with span("save", {'documedix.sections': len(category_drafts)}), \
+                open(output_path, "w", encoding="utf-8") as f:
             f.write(f"# 품목 분류 정보\n\n")
             f.write(f"- 품목코드: {cls_info.get('classification_code')}\n")
             f.write(f"- 등급: {cls_info.get('grade')}등급\n")
@@ -523,6 +770,10 @@ def main():
                 if category in category_drafts:
                     f.write(f"\n## [{category}]\n\n")
                     f.write(category_drafts[category])
+                    if category_sources.get(category):
+                        f.write("\n\n### 참조 문서\n\n")
+                        for title in dict.fromkeys(source['title'] for source in category_sources[category]):
+                            f.write(f"- {title}\n")
                     f.write("\n\n---\n")
         
         print(f"\n💾 초안이 저장되었습니다: {output_path}")
@@ -535,17 +786,15 @@ def main():
     finally:
         # 정리
         print("\n🧹 임시 파일 정리 중...")
-        for f in uploaded_files:
-            try:
-                client.files.delete(name=f.name)
-            except:
-                pass
-        for p in temp_paths:
-            if os.path.exists(p): 
+        with span("cleanup", {'documedix.files': len(uploaded_files)}) as cleanup_span:
+            deleted = 0
+            for f in uploaded_files:
                 try:
-                    os.unlink(p)
+                    client.files.delete(name=f.name)
+                    deleted += 1
                 except:
                     pass
+            cleanup_span.set_attribute('documedix.deleted_files', deleted)
         print("   ✅ 정리 완료")
 
 
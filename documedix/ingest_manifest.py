@@ -0,0 +1,255 @@
+"""
+업로드 매니페스트 (SQLite, WAL)
+
+파일별 경로/크기/수정시각/내용 해시/메타데이터/Store 문서 이름/상태를 로컬에 기록합니다.
+
+- 재실행 시 크기와 수정시각이 그대로인 파일은 해시 계산 없이 stat 만으로 건너뜁니다.
+- 크기나 수정시각이 바뀐 파일만 해시를 다시 계산하고, 내용이 바뀌었으면 다시 업로드합니다.
+- 업로드 작업 이름을 기록해 두므로, 중단된 실행을 다시 시작하면
+  진행 중이던 작업은 다시 업로드하지 않고 이어서 완료를 확인합니다.
+- 데이터 루트별 첫 실행 전에 Store 에 이미 있는 문서를 표시 이름으로 맞춰 기록합니다
+  (IngestionPipeline 이 adopt() 로 채우고 mark_bootstrapped() 로 완료 표시). 매니페스트 없이 올라간 문서를
+  다시 업로드하지 않기 위한 것입니다. upload_master_data.py 와 upload_script.py 가 같은 Store 와
+  매니페스트를 쓰므로 Store 단위가 아니라 데이터 루트 단위로 기록합니다.
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+# --- 설정 ---
+DEFAULT_MANIFEST_PATH = os.getenv("INGEST_MANIFEST_PATH", "ingest_manifest.sqlite3")
+
+# 파일 상태
+STATUS_UPLOADING = "uploading"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+# 근접 중복으로 Store 에서 삭제한 파일 (대표 문서가 되면 다시 업로드)
+STATUS_DEDUPLICATED = "deduplicated"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    store_name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    display_name TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    operation_name TEXT,
+    document_name TEXT,
+    previous_document_name TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (store_name, path)
+);
+CREATE INDEX IF NOT EXISTS idx_files_status ON files (store_name, status);
+CREATE TABLE IF NOT EXISTS bootstrapped_roots (
+    store_name TEXT NOT NULL,
+    data_root TEXT NOT NULL,
+    bootstrapped_at REAL NOT NULL,
+    PRIMARY KEY (store_name, data_root)
+);
+"""
+
+
+def hash_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """파일 내용의 SHA-256 해시를 계산합니다."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IngestManifest:
+    """
+    Store 별 업로드 상태를 기록하는 SQLite 매니페스트
+
+    여러 업로드 스레드에서 동시에 호출할 수 있도록 하나의 연결을 잠금으로 보호합니다.
+
+    Args:
+        db_path: SQLite 파일 경로
+        store_name: File Search Store 이름 (같은 DB에 여러 Store 기록 가능)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_MANIFEST_PATH, store_name: str = ""):
+        self.db_path = db_path
+        self.store_name = store_name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, path: str):
+        """경로의 기록을 반환합니다. 없으면 None."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM files WHERE store_name = ? AND path = ?",
+                (self.store_name, os.path.abspath(path)),
+            ).fetchone()
+
+    def check(self, path: str):
+        """
+        파일을 업로드해야 하는지 판단합니다.
+
+        Returns:
+            (업로드 필요 여부, 내용 해시 또는 None)
+            크기와 수정시각이 기록과 같고 완료/진행 중 상태면 해시를 계산하지 않습니다.
+        """
+        stat = os.stat(path)
+        row = self.get(path)
+        if row is not None and row["status"] in (STATUS_DONE, STATUS_UPLOADING):
+            if row["size"] == stat.st_size and row["mtime_ns"] == stat.st_mtime_ns:
+                return False, row["content_hash"]
+
+        content_hash = hash_file(path)
+        if row is not None and row["status"] == STATUS_DONE and row["content_hash"] == content_hash:
+            # 내용은 같고 수정시각만 바뀐 경우: stat 정보만 갱신
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE files SET size = ?, mtime_ns = ?, updated_at = ? WHERE store_name = ? AND path = ?",
+                    (stat.st_size, stat.st_mtime_ns, time.time(), self.store_name, os.path.abspath(path)),
+                )
+                self._conn.commit()
+            return False, content_hash
+
+        return True, content_hash
+
+    def is_bootstrapped(self, data_root: str) -> bool:
+        """data_root 에 대해 Store 문서 목록으로 매니페스트를 채운 적이 있는지"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM bootstrapped_roots WHERE store_name = ? AND data_root = ?",
+                (self.store_name, os.path.abspath(data_root)),
+            ).fetchone() is not None
+
+    def mark_bootstrapped(self, data_root: str):
+        """data_root 의 매니페스트 채우기가 끝났음을 기록합니다."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bootstrapped_roots (store_name, data_root, bootstrapped_at) VALUES (?, ?, ?)",
+                (self.store_name, os.path.abspath(data_root), time.time()),
+            )
+            self._conn.commit()
+
+    def adopt(self, path, content_hash, display_name, metadata, document_name):
+        """
+        매니페스트 없이 업로드되어 Store 에 이미 있는 문서를 완료 상태로 기록합니다.
+        이미 기록이 있는 경로는 바꾸지 않습니다.
+        """
+        stat = os.stat(path)
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT OR IGNORE INTO files
+                    (store_name, path, size, mtime_ns, content_hash, display_name, metadata,
+                     operation_name, document_name, previous_document_name, status, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, NULL, ?, NULL, ?)
+                """,
+                (self.store_name, os.path.abspath(path), stat.st_size, stat.st_mtime_ns, content_hash,
+                 display_name, json.dumps(metadata, ensure_ascii=False), document_name, STATUS_DONE,
+                 time.time()),
+            )
+            self._conn.commit()
+
+    def mark_uploading(self, path, content_hash, display_name, metadata, operation_name):
+        """업로드 요청이 접수되었음을 기록합니다. 이전 문서 이름은 교체 대상으로 보존합니다."""
+        stat = os.stat(path)
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT document_name, previous_document_name FROM files WHERE store_name = ? AND path = ?",
+                (self.store_name, abs_path),
+            ).fetchone()
+            previous = None
+            if row is not None:
+                previous = row["document_name"] or row["previous_document_name"]
+            self._conn.execute(
+                """
+                INSERT OR REPLACE INTO files
+                    (store_name, path, size, mtime_ns, content_hash, display_name, metadata,
+                     operation_name, document_name, previous_document_name, status, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, NULL, ?)
+                """,
+                (self.store_name, abs_path, stat.st_size, stat.st_mtime_ns, content_hash, display_name,
+                 json.dumps(metadata, ensure_ascii=False), operation_name, previous, STATUS_UPLOADING,
+                 time.time()),
+            )
+            self._conn.commit()
+
+    def mark_done(self, path, document_name):
+        """업로드 및 임베딩 완료를 기록하고, 교체된 이전 문서 이름을 반환합니다."""
+        abs_path = os.path.abspath(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT previous_document_name FROM files WHERE store_name = ? AND path = ?",
+                (self.store_name, abs_path),
+            ).fetchone()
+            self._conn.execute(
+                """
+                UPDATE files SET status = ?, document_name = ?, previous_document_name = NULL,
+                                 error = NULL, updated_at = ?
+                WHERE store_name = ? AND path = ?
+                """,
+                (STATUS_DONE, document_name, time.time(), self.store_name, abs_path),
+            )
+            self._conn.commit()
+        previous = row["previous_document_name"] if row is not None else None
+        return previous if previous != document_name else None
+
+    def mark_failed(self, path, error):
+        """실패를 기록합니다. 다음 실행에서 다시 시도합니다."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE files SET status = ?, error = ?, updated_at = ? WHERE store_name = ? AND path = ?",
+                (STATUS_FAILED, str(error), time.time(), self.store_name, os.path.abspath(path)),
+            )
+            self._conn.commit()
+
+    def stored_document(self, path):
+        """Store 에 남아 있는 이 파일의 문서 이름 (없거나 업로드 진행 중이면 None)"""
+        row = self.get(path)
+        if row is None or row["status"] in (STATUS_UPLOADING, STATUS_DEDUPLICATED):
+            return None
+        return row["document_name"] or row["previous_document_name"]
+
+    def mark_deduplicated(self, path):
+        """근접 중복이라 Store 에서 문서를 삭제했음을 기록합니다."""
+        with self._lock:
+            self._conn.execute(
+                """
+                UPDATE files SET status = ?, document_name = NULL, previous_document_name = NULL,
+                                 operation_name = NULL, error = NULL, updated_at = ?
+                WHERE store_name = ? AND path = ?
+                """,
+                (STATUS_DEDUPLICATED, time.time(), self.store_name, os.path.abspath(path)),
+            )
+            self._conn.commit()
+
+    def in_progress(self):
+        """이전 실행에서 완료를 확인하지 못한 업로드 기록 목록을 반환합니다."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT * FROM files WHERE store_name = ? AND status = ? AND operation_name IS NOT NULL",
+                (self.store_name, STATUS_UPLOADING),
+            ).fetchall()
+
+    def summary(self) -> dict:
+        """상태별 파일 수를 반환합니다."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) AS n FROM files WHERE store_name = ? GROUP BY status",
+                (self.store_name,),
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
@@ -0,0 +1,368 @@
+"""
+동시 업로드 파이프라인
+
+upload_script.py 와 upload_master_data.py 가 공통으로 사용하는 수집 엔진입니다.
+디렉토리 순회 → 메타데이터 파싱 → 업로드를 생산자/소비자 스레드로 분리하고,
+동시에 진행 중인 upload_to_file_search_store 호출 수를 max_in_flight 로 제한합니다.
+업로드 후의 임베딩 작업 완료 대기는 OperationPoller 가 한꺼번에 처리하므로,
+업로드 스레드는 기다리지 않고 바로 다음 파일로 넘어갑니다.
+개별 파일의 실패는 기록만 하고 다음 파일로 계속 진행합니다.
+매니페스트(IngestManifest)를 주면 새 파일이나 내용이 바뀐 파일만 업로드하고,
+이전 실행에서 완료를 확인하지 못한 작업은 이어서 확인합니다.
+데이터 루트마다 처음 실행할 때 먼저 Store 의 문서 목록을 표시 이름(파일명)으로 로컬 파일과 맞춰 기록하므로,
+매니페스트 없이 업로드해 둔 Store 에 처음 실행해도 같은 문서를 다시 올리지 않습니다.
+(같은 매니페스트를 쓰는 다른 스크립트가 먼저 실행되었어도 이 데이터 루트는 따로 맞춥니다.)
+근접 중복 결과(near_dedup.NearDuplicateIndex)를 주면 클러스터 대표 문서만 업로드하고
+대표 문서 메타데이터에 묶인 문서들의 허가번호를 추가합니다. 매니페스트에 Store 문서가 기록된
+중복 문서(이전에 개별 업로드했거나 대표에서 밀려난 문서)는 Store 에서 삭제합니다.
+추출기(pdf_extract.PdfExtractor)를 주면 PDF 는 파싱 단계에서 텍스트 추출을 시작하고,
+업로드 단계에서 원본 대신 추출된 텍스트를 같은 표시 이름과 메타데이터로 업로드합니다.
+"""
+import os
+import json
+import time
+import queue
+import threading
+
+from google.genai import types
+
+from corpus import SUPPORTED_EXTENSIONS, iter_corpus_files
+from ingest_manifest import hash_file
+from operation_poller import OperationPoller
+from upload_utils import upload_to_store
+
+# --- 설정 ---
+# 동시에 진행할 업로드 수 기본값
+DEFAULT_MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT_UPLOADS", "8"))
+
+# 큐 종료 신호
+_DONE = object()
+
+
+class IngestJob:
+    """업로드할 파일 하나의 정보"""
+
+    def __init__(self, path, display_name, metadata, content_hash=None):
+        self.path = path
+        self.display_name = display_name
+        self.metadata = metadata
+        self.content_hash = content_hash
+        # 실제로 업로드할 파일 (PDF 텍스트 추출 시 추출된 .txt)
+        self.upload_path = path
+        # PdfExtractor.submit() 의 반환값
+        self.extraction = None
+        # 근접 중복이라 Store 에서 삭제할 문서 이름 (있으면 업로드 대신 삭제)
+        self.remove_document = None
+
+
+class IngestionPipeline:
+    """
+    File Search Store 동시 업로드 파이프라인
+
+    Args:
+        client: genai.Client
+        store_name: 업로드 대상 File Search Store 이름 (fileSearchStores/...)
+        metadata_fn: (파일 경로) -> custom_metadata 리스트, 빈 리스트/None 이면 건너뜀
+        max_in_flight: 동시에 진행할 업로드 수
+        extensions: 업로드할 파일 확장자 목록
+        manifest: 업로드 상태를 기록할 IngestManifest (None 이면 매번 전체 업로드)
+        poller: 작업 완료를 추적할 OperationPoller (None 이면 새로 생성)
+        extractor: PDF 를 텍스트로 바꿔 업로드할 PdfExtractor (None 이면 PDF 그대로 업로드)
+        dedup: 근접 중복 클러스터 NearDuplicateIndex (None 이면 모든 문서 업로드)
+    """
+
+    def __init__(self, client, store_name, metadata_fn, max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+                 extensions=None, manifest=None, poller=None, extractor=None,
+                 dedup=None):
+        self.client = client
+        self.store_name = store_name
+        self.metadata_fn = metadata_fn
+        self.max_in_flight = max(1, max_in_flight)
+        self.extensions = [e.lower() for e in (extensions or SUPPORTED_EXTENSIONS)]
+        self.manifest = manifest
+        self.poller = poller or OperationPoller(client)
+        self.extractor = extractor
+        self.dedup = dedup
+
+        self._lock = threading.Lock()
+        # 업로드 호출부터 임베딩 작업 완료까지를 진행 중으로 봅니다
+        self._in_flight = threading.BoundedSemaphore(self.max_in_flight)
+        self.uploaded = []
+        self.skipped = []
+        self.failed = []
+        self.deduplicated = []
+        self.removed = []
+
+    # --- 단계 1: 디렉토리 순회 (생산자) ---
+
+    def _walk(self, data_dir, path_queue):
+        try:
+            for root, _, files in os.walk(data_dir):
+                for file in files:
+                    path_queue.put(os.path.join(root, file))
+        finally:
+            path_queue.put(_DONE)
+
+    # --- 단계 2: 필터링 및 메타데이터 파싱 ---
+
+    def _parse(self, path_queue, job_queue):
+        try:
+            while True:
+                path = path_queue.get()
+                if path is _DONE:
+                    break
+
+                file = os.path.basename(path)
+                if os.path.splitext(file)[1].lower() not in self.extensions:
+                    self._record(self.skipped, file)
+                    continue
+
+                if self.dedup is not None and self.dedup.is_duplicate(path):
+                    stored = self.manifest.stored_document(path) if self.manifest is not None else None
+                    if stored:
+                        job = IngestJob(path, file, None)
+                        job.remove_document = stored
+                        job_queue.put(job)
+                    else:
+                        self._record(self.deduplicated, file)
+                    continue
+
+                content_hash = None
+                try:
+                    if self.manifest is not None:
+                        needs_upload, content_hash = self.manifest.check(path)
+                        if not needs_upload and not self._cluster_changed(path):
+                            self._record(self.skipped, file)
+                            continue
+                    metadata = self.metadata_fn(path)
+                except Exception as e:
+                    print(f"  ✗ 메타데이터 파싱 실패: {file} ({e})")
+                    self._record(self.failed, file)
+                    continue
+
+                if not metadata:
+                    print(f"  ⚠ 메타데이터를 추출하지 못했습니다. 건너뜁니다: {file}")
+                    self._record(self.skipped, file)
+                    continue
+                if self.dedup is not None:
+                    metadata = metadata + self.dedup.extra_metadata(path)
+
+                job = IngestJob(path, file, metadata, content_hash)
+                if self.extractor is not None and file.lower().endswith('.pdf'):
+                    # 업로드 차례가 오기 전에 프로세스 풀에서 미리 추출
+                    job.extraction = self.extractor.submit(path, content_hash)
+                job_queue.put(job)
+        finally:
+            for _ in range(self.max_in_flight):
+                job_queue.put(_DONE)
+
+    def _cluster_changed(self, path):
+        """업로드된 대표 문서의 클러스터 구성이 바뀌었는지 (바뀌었으면 메타데이터 갱신을 위해 다시 업로드)"""
+        if self.dedup is None:
+            return False
+        row = self.manifest.get(path)
+        stored = json.loads(row["metadata"]) if row is not None and row["metadata"] else []
+        return self.dedup.metadata_changed(path, stored)
+
+    # --- 단계 3: 업로드 (소비자) ---
+
+    def _upload_worker(self, job_queue):
+        while True:
+            job = job_queue.get()
+            if job is _DONE:
+                break
+            if job.remove_document is not None:
+                self._remove_duplicate(job)
+                continue
+
+            # 추출 대기는 업로드 슬롯을 잡기 전에 (추출 중에는 동시 업로드 수를 차지하지 않음)
+            self._prepare(job)
+            self._in_flight.acquire()
+            try:
+                operation = self.upload(job)
+                if self.manifest is not None:
+                    self.manifest.mark_uploading(job.path, job.content_hash, job.display_name,
+                                                 job.metadata, operation.name)
+                future = self.poller.submit(operation)
+            except Exception as e:
+                self._in_flight.release()
+                print(f"  ✗ 업로드 실패: {job.display_name} ({e})")
+                self._record(self.failed, job.display_name)
+                if self.manifest is not None and self.manifest.get(job.path) is not None:
+                    self.manifest.mark_failed(job.path, e)
+                continue
+
+            future.add_done_callback(lambda f, job=job: self._on_complete(job, f))
+
+    def _remove_duplicate(self, job):
+        """Store 에 남아 있는 근접 중복 문서를 삭제하고 매니페스트에 기록합니다."""
+        try:
+            self.client.file_search_stores.documents.delete(name=job.remove_document, config={'force': True})
+        except Exception as e:
+            print(f"  ✗ 중복 문서 삭제 실패: {job.display_name} ({e})")
+            self._record(self.failed, job.display_name)
+            return
+        print(f"  🗑 근접 중복 문서 삭제: {job.display_name} ({job.remove_document})")
+        try:
+            self.manifest.mark_deduplicated(job.path)
+        except Exception as e:
+            # 업로드 스레드가 죽으면 job_queue 가 차서 실행이 멈추므로 기록만 하고 계속
+            print(f"  ✗ 매니페스트 기록 실패: {job.display_name} ({e})")
+            self._record(self.failed, job.display_name)
+            return
+        self._record(self.deduplicated, job.display_name)
+        self._record(self.removed, job.display_name)
+
+    def _prepare(self, job):
+        """PDF 텍스트 추출이 걸려 있으면 완료를 기다려 업로드할 파일을 정합니다."""
+        if job.extraction is None:
+            return
+        document = self.extractor.result(job.path, job.extraction)
+        job.upload_path = document.path
+        info = document.info
+        if info is None:
+            return
+        if info['scanned']:
+            print(f"  📄 텍스트가 거의 없는 PDF (스캔 문서), 원본을 업로드합니다: {job.display_name}")
+        else:
+            print(f"  📄 텍스트 추출{' (캐시)' if document.cached else ''}: {job.display_name} ({info['pages']}쪽, 표 {info['tables']}개, "
+                  f"{info['original_bytes']:,} → {info['text_bytes']:,} bytes, "
+                  f"{info['original_bytes'] - info['text_bytes']:,} bytes 절약)")
+
+    def _on_complete(self, job, future):
+        try:
+            error = future.exception()
+            if error:
+                print(f"  ✗ 업로드 중 오류 발생: {job.display_name} ({error})")
+                self._record(self.failed, job.display_name)
+                if self.manifest is not None:
+                    self.manifest.mark_failed(job.path, error)
+            else:
+                print(f"  ✓ 업로드 및 처리 완료: {job.display_name}")
+                self._record(self.uploaded, job.display_name)
+                if self.manifest is not None:
+                    self._finish_manifest(job, future.result())
+        finally:
+            self._in_flight.release()
+
+    def _finish_manifest(self, job, operation):
+        """완료를 기록하고, 내용이 바뀌어 교체된 이전 문서는 Store 에서 삭제합니다."""
+        response = getattr(operation, 'response', None)
+        document_name = getattr(response, 'document_name', None)
+        previous = self.manifest.mark_done(job.path, document_name)
+        if previous:
+            try:
+                self.client.file_search_stores.documents.delete(name=previous, config={'force': True})
+                print(f"  🗑 이전 버전 문서 삭제: {previous}")
+            except Exception as e:
+                print(f"  ⚠ 이전 버전 문서 삭제 실패: {previous} ({e})")
+
+    def _bootstrap_manifest(self, data_dir):
+        """
+        data_dir 의 파일을 Store 에 이미 있는 문서와 맞춰 매니페스트에 기록합니다 (표시 이름 = 로컬 파일명).
+        데이터 루트마다 한 번만 실행하며, 문서 목록을 가져오지 못하면 중복 업로드를 막기 위해 실행을 중단합니다.
+        """
+        print("  ↻ 이 데이터 루트는 처음이라 Store 에 이미 있는 문서를 확인합니다...")
+        try:
+            documents = {}
+            for document in self.client.file_search_stores.documents.list(parent=self.store_name):
+                if document.state == types.DocumentState.STATE_FAILED:
+                    continue
+                documents.setdefault(document.display_name, []).append(document)
+        except Exception as e:
+            raise RuntimeError(
+                f"Store 문서 목록을 가져오지 못해 매니페스트를 채울 수 없습니다 ({e}). "
+                f"이대로 실행하면 이미 있는 문서가 모두 다시 업로드됩니다."
+            ) from e
+        if not documents:
+            self.manifest.mark_bootstrapped(data_dir)
+            return
+
+        adopted = 0
+        for path in iter_corpus_files(data_dir, self.extensions):
+            matches = documents.get(os.path.basename(path))
+            if not matches:
+                continue
+            document = matches.pop(0)
+            metadata = [item.model_dump(mode='json', exclude_none=True) for item in document.custom_metadata or []]
+            self.manifest.adopt(path, hash_file(path), document.display_name, metadata, document.name)
+            adopted += 1
+        self.manifest.mark_bootstrapped(data_dir)
+        unmatched = sum(len(matches) for matches in documents.values())
+        print(f"  ✓ Store 문서 {adopted}개를 매니페스트에 기록했습니다 (로컬 파일과 맞지 않는 문서 {unmatched}개).")
+
+    def _resume(self):
+        """이전 실행에서 완료를 확인하지 못한 업로드 작업을 다시 추적합니다."""
+        rows = self.manifest.in_progress()
+        if rows:
+            print(f"  ↻ 이전 실행에서 진행 중이던 작업 {len(rows)}개를 이어서 확인합니다.")
+        for row in rows:
+            job = IngestJob(row["path"], row["display_name"], None, row["content_hash"])
+            operation = types.UploadToFileSearchStoreOperation(name=row["operation_name"])
+            self._in_flight.acquire()
+            try:
+                future = self.poller.submit(operation)
+            except Exception:
+                self._in_flight.release()
+                raise
+            future.add_done_callback(lambda f, job=job: self._on_complete(job, f))
+
+    def upload(self, job):
+        """파일 하나를 업로드하고 임베딩 작업 객체를 반환합니다 (완료를 기다리지 않음)."""
+        print(f"  ⬆ 업로드 및 임베딩 중: {job.display_name}")
+        return upload_to_store(
+            self.client,
+            self.store_name,
+            job.upload_path,
+            display_name=job.display_name,
+            custom_metadata=job.metadata,
+        )
+
+    def _record(self, bucket, name):
+        with self._lock:
+            bucket.append(name)
+
+    def run(self, data_dir):
+        """
+        data_dir 의 파일을 동시 업로드합니다.
+
+        Returns:
+            {"uploaded": [...], "skipped": [...], "failed": [...], "deduplicated": [...],
+             "removed": [...] (deduplicated 중 Store 에서 삭제한 문서), "elapsed": 초,
+             "extraction": 추출 단계 통계 (추출기가 없으면 None)}
+        """
+        start_time = time.time()
+        if self.manifest is not None:
+            if not self.manifest.is_bootstrapped(data_dir):
+                self._bootstrap_manifest(data_dir)
+            self._resume()
+        path_queue = queue.Queue(maxsize=self.max_in_flight * 4)
+        job_queue = queue.Queue(maxsize=self.max_in_flight * 2)
+
+        threads = [
+            threading.Thread(target=self._walk, args=(data_dir, path_queue), daemon=True),
+            threading.Thread(target=self._parse, args=(path_queue, job_queue), daemon=True),
+        ]
+        threads += [
+            threading.Thread(target=self._upload_worker, args=(job_queue,), daemon=True)
+            for _ in range(self.max_in_flight)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 마지막으로 제출된 작업들의 완료 대기: 모든 슬롯이 반환되면 콜백까지 끝난 것
+        for _ in range(self.max_in_flight):
+            self._in_flight.acquire()
+        for _ in range(self.max_in_flight):
+            self._in_flight.release()
+
+        return {
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "deduplicated": self.deduplicated,
+            "removed": self.removed,
+            "elapsed": time.time() - start_time,
+            "extraction": self.extractor.stats.snapshot() if self.extractor is not None else None,
+        }
@@ -0,0 +1,149 @@
+"""
+의료기기 품목 카탈로그 (품목코드/품목명/등급)
+
+서버 시작 시 한 번 로드하여 메모리에 두고,
+- /api/items?prefix= 자동완성 (품목코드 또는 한글 품목명 앞부분)
+- 초안 생성 전 itemCode/grade 검증
+- 프롬프트용 품목명 조회
+에 사용합니다.
+
+정렬된 키 배열에 대한 이진 탐색(bisect)으로 접두어 범위를 찾으므로,
+2천여 개 품목 기준 조회는 수십 마이크로초 수준입니다.
+
+카탈로그 파일 형식 (둘 중 하나):
+- master_codebook.py build 결과: {"A07040.03": {"code", "name", "grade"}, ...}
+- 프론트엔드 medical_devices.json: {"1등급": [{"code", "name"}, ...], "2등급": [...], ...}
+"""
+import os
+import re
+import json
+import bisect
+import unicodedata
+
+from master_codebook import DEFAULT_CODEBOOK_PATH
+
+# --- 설정 ---
+DEFAULT_ITEM_CATALOG_PATH = os.getenv("ITEM_CATALOG_PATH", DEFAULT_CODEBOOK_PATH)
+
+# 품목코드 앞부분 (예: "A07", "a0704", "A07040.0")
+_CODE_PREFIX = re.compile(r"^[A-Za-z]\d[\d.]*$|^[A-Za-z]$")
+
+_loaded_catalogs = {}
+
+
+def _normalize(text: str) -> str:
+    """품목명 비교용 정규화: NFC, 소문자, 공백 제거"""
+    return re.sub(r"\s+", "", unicodedata.normalize("NFC", text or "")).lower()
+
+
+class ItemCatalog:
+    """
+    품목 카탈로그
+
+    Args:
+        items: [{"code": "A07040.03", "name": "혈관용 카테터", "grade": 2}, ...]
+    """
+
+    def __init__(self, items):
+        items = sorted(items, key=lambda item: item["code"])
+        self.codes = [item["code"] for item in items]
+        self.names = [item.get("name") or "" for item in items]
+        self.grades = [item.get("grade") for item in items]
+        self._by_code = {code: i for i, code in enumerate(self.codes)}
+
+        # 품목명 전체와 각 단어 시작 위치를 키로 색인 (예: "카테터" → "혈관용 카테터")
+        name_keys = []
+        for i, name in enumerate(self.names):
+            words = name.split()
+            for start in range(len(words)):
+                name_keys.append((_normalize("".join(words[start:])), i))
+        name_keys.sort()
+        self._name_keys = [key for key, _ in name_keys]
+        self._name_ids = [i for _, i in name_keys]
+
+    def __len__(self):
+        return len(self.codes)
+
+    def get(self, code):
+        """품목코드로 {"code", "name", "grade"} 를 반환합니다. 없으면 None."""
+        i = self._by_code.get(code)
+        if i is None:
+            return None
+        return {"code": self.codes[i], "name": self.names[i], "grade": self.grades[i]}
+
+    def search(self, prefix: str, grade=None, limit: int = 20) -> list:
+        """
+        품목코드 또는 품목명 접두어로 검색합니다.
+
+        Args:
+            prefix: 품목코드 앞부분(예: "A0704") 또는 품목명 앞부분(예: "혈관")
+            grade: 지정하면 해당 등급 품목만
+            limit: 최대 결과 수
+        """
+        prefix = (prefix or "").strip()
+        if not prefix:
+            return []
+
+        if _CODE_PREFIX.match(prefix):
+            key = prefix.upper()
+            start = bisect.bisect_left(self.codes, key)
+            end = bisect.bisect_left(self.codes, key + "\uffff", lo=start)
+            candidates = range(start, end)
+        else:
+            key = _normalize(prefix)
+            start = bisect.bisect_left(self._name_keys, key)
+            end = bisect.bisect_left(self._name_keys, key + "\uffff", lo=start)
+            candidates = self._name_ids[start:end]
+
+        results = []
+        seen = set()
+        for i in candidates:
+            if i in seen or (grade is not None and self.grades[i] != grade):
+                continue
+            seen.add(i)
+            results.append({"code": self.codes[i], "name": self.names[i], "grade": self.grades[i]})
+            if len(results) >= limit:
+                break
+        return results
+
+    def validate(self, code, grade=None):
+        """
+        품목코드와 등급을 검증합니다.
+
+        Returns:
+            오류 메시지, 문제가 없으면 None
+        """
+        item = self.get(code)
+        if item is None:
+            return f"알 수 없는 품목코드입니다: {code}"
+        if grade is not None and item["grade"] is not None and int(grade) != item["grade"]:
+            return f"품목코드 {code}은(는) {item['grade']}등급 품목입니다. (선택한 등급: {grade}등급)"
+        return None
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_ITEM_CATALOG_PATH) -> "ItemCatalog":
+        """코드북 JSON 또는 medical_devices.json 형식의 파일을 로드합니다."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        items = {}
+        for key, value in data.items():
+            if isinstance(value, list):
+                # medical_devices.json: {"N등급": [{"code", "name"}, ...]}
+                grade_match = re.match(r"(\d)", key)
+                for item in value:
+                    items[item["code"]] = {
+                        "code": item["code"],
+                        "name": item.get("name", ""),
+                        "grade": item.get("grade") or (int(grade_match.group(1)) if grade_match else None),
+                    }
+            else:
+                items[key] = {"code": key, "name": value.get("name", ""), "grade": value.get("grade")}
+        return cls(items.values())
+
+
+def get_catalog(path: str = DEFAULT_ITEM_CATALOG_PATH):
+    """프로세스당 한 번만 카탈로그를 로드합니다. 파일이 없으면 None (검증 생략)."""
+    if path not in _loaded_catalogs:
+        _loaded_catalogs[path] = ItemCatalog.load(path) if path and os.path.exists(path) else None
+    return _loaded_catalogs[path]
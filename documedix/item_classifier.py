@@ -0,0 +1,182 @@
+"""
+품목 분류 계층 (결정적 규칙 우선, LLM 은 마지막 수단)
+
+generate_draft.step1_identify_classification 은 매번 File Search + LLM 호출로
+품목코드/등급을 추론합니다. 이 모듈은 다음 순서로 분류를 시도합니다.
+
+1. 캐시: 입력 파일 내용 해시가 같으면 이전 분류 결과를 그대로 사용 (1단계 생략)
+2. 경로 패턴: classN/N등급_품목코드/... 형식의 경로에서 추출 (모든 경로가 같은 코드일 때)
+3. 코드북: 입력 문서 본문에 나오는 품목코드 또는 품목명을 별표 코드북(master_codebook)에서 조회
+4. LLM: 위 방법으로 하나로 정해지지 않을 때만 호출 (코드북 후보가 있으면 함께 전달)
+
+결과 딕셔너리는 step1 과 같은 형식이며, 어떤 방법으로 결정했는지 "source" 에 기록합니다.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from corpus import extract_text
+from ingest_manifest import hash_file
+from master_codebook import get_codebook
+
+# --- 설정 ---
+DEFAULT_CLASSIFICATION_CACHE_PATH = os.getenv("CLASSIFICATION_CACHE_PATH", "classification_cache.sqlite3")
+
+# 승인 문서 경로 형식: classN/N등급_품목코드/...
+PATH_PATTERN = re.compile(r'class(\d+)[/\\](\d+)등급_([A-Z]\d{5}\.\d{2})')
+
+
+def inputs_hash(paths) -> str:
+    """입력 파일들의 내용 해시 (경로와 순서에 무관)"""
+    digest = hashlib.sha256()
+    for file_hash in sorted(hash_file(path) for path in paths):
+        digest.update(file_hash.encode("ascii"))
+    return digest.hexdigest()
+
+
+class ClassificationCache:
+    """
+    입력 내용 해시 → 분류 결과 캐시 (SQLite, WAL)
+
+    Args:
+        db_path: SQLite 파일 경로
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CLASSIFICATION_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifications "
+            "(key TEXT PRIMARY KEY, result TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM classifications WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, result):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO classifications (key, result, updated_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _result(code, grade, item_name, reason, source):
+    return {
+        "classification_code": code,
+        "grade": grade,
+        "item_name": item_name,
+        "reason": reason,
+        "source": source,
+    }
+
+
+def classify_from_paths(paths, codebook=None):
+    """
+    경로 패턴에서 품목코드/등급을 추출합니다.
+    모든 일치 경로가 같은 품목코드를 가리킬 때만 결과를 반환하고, 아니면 None.
+    """
+    matches = {(int(m.group(2)), m.group(3)) for m in map(PATH_PATTERN.search, paths) if m}
+    if len(matches) != 1:
+        return None
+
+    grade, code = matches.pop()
+    entry = codebook.get(code) if codebook else None
+    item_name = entry["name"] if entry and entry["name"] else "추출된 품목"
+    return _result(code, grade, item_name, "파일 경로에서 자동 추출", "path")
+
+
+def codebook_candidates(paths, codebook, text_loader=extract_text) -> list:
+    """
+    입력 문서 본문에서 코드북 후보 품목코드를 찾습니다.
+    본문에 품목코드가 직접 나오면 그것을, 없으면 품목명이 나오는 코드를 반환합니다.
+    """
+    texts = []
+    for path in paths:
+        try:
+            texts.append(text_loader(path))
+        except Exception as e:
+            print(f"   ⚠️ 텍스트 추출 실패: {os.path.basename(path)} ({e})")
+    text = "\n".join(texts)
+    return codebook.find_codes(text) or codebook.find_names(text)
+
+
+def classify_from_codebook(candidates, codebook):
+    """후보가 하나이고 코드북에 등급이 있으면 결과를 반환하고, 아니면 None."""
+    if len(candidates) != 1:
+        return None
+    entry = codebook.get(candidates[0])
+    if entry is None or entry["grade"] is None:
+        return None
+    return _result(entry["code"], entry["grade"], entry["name"], "입력 문서와 품목 분류 코드북(별표) 일치", "codebook")
+
+
+def _verify_with_codebook(result, codebook):
+    """LLM 결과를 코드북과 대조하여 등급/품목명을 보정합니다."""
+    entry = codebook.get(result.get("classification_code")) if codebook else None
+    if entry is None:
+        return result
+    if entry["grade"] is not None and result.get("grade") != entry["grade"]:
+        result["reason"] = f"{result.get('reason') or ''} (코드북 기준 등급으로 보정: {result.get('grade')} → {entry['grade']})"
+        result["grade"] = entry["grade"]
+    if entry["name"] and not result.get("item_name"):
+        result["item_name"] = entry["name"]
+    return result
+
+
+def classify_product(paths, llm_fallback, codebook=None, cache=None, text_loader=extract_text) -> dict:
+    """
+    입력 파일의 품목코드/등급을 결정합니다.
+
+    Args:
+        paths: 입력 파일 경로 리스트
+        llm_fallback: (후보 품목코드 리스트) -> step1 형식 결과, 결정적 방법이 모두 실패했을 때만 호출
+        codebook: master_codebook.Codebook (None 이면 MASTER_CODEBOOK_PATH 에서 로드, 없으면 생략)
+        cache: ClassificationCache (None 이면 기본 경로에 생성)
+        text_loader: 본문 추출 함수
+
+    Returns:
+        {"classification_code", "grade", "item_name", "reason", "source"}
+        source 는 "cache" / "path" / "codebook" / "llm" 중 하나
+    """
+    codebook = codebook if codebook is not None else get_codebook()
+    own_cache = cache is None
+    cache = cache or ClassificationCache()
+    try:
+        key = inputs_hash(paths)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"   ✅ 캐시된 분류 결과 사용: {cached.get('classification_code')} ({cached.get('grade')}등급)")
+            return dict(cached, source="cache")
+
+        result = classify_from_paths(paths, codebook)
+        candidates = []
+        if result is None and codebook:
+            candidates = codebook_candidates(paths, codebook, text_loader)
+            result = classify_from_codebook(candidates, codebook)
+
+        if result is not None:
+            print(f"   ✅ 분류 결과 ({result['source']}): {result['classification_code']} ({result['grade']}등급)")
+        else:
+            result = _verify_with_codebook(dict(llm_fallback(candidates)), codebook)
+            result["source"] = "llm"
+
+        if result.get("classification_code"):
+            cache.put(key, result)
+        return result
+    finally:
+        if own_cache:
+            cache.close()
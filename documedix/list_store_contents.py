@@ -1,7 +1,5 @@
 # 업로드 된 데이터셋 확인
-import os
-from google import genai
-from google.genai import types
+from gemini_client import API_KEY, get_client
 from dotenv import load_dotenv
 
 # .env 파일에서 환경 변수 로드
@@ -17,15 +15,13 @@ def list_uploaded_files():
     print("--- File Search Store 파일 목록 확인 ---")
 
     # API 키 설정 확인
-    api_key = os.getenv("GEMINI_API_KEY")
-    
-    if not api_key:
+    if not API_KEY:
         print("오류: API key가 설정되지 않았습니다.")
         print(".env 파일에 GEMINI_API_KEY를 설정해주세요.")
         return
 
     try:
-        client = genai.Client(api_key=api_key)
+        client = get_client()
         
         print("\n" + "="*60)
         print("=== File Search Store 정보 ===")
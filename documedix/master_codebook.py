@@ -0,0 +1,188 @@
+"""
+의료기기 품목 분류 코드북 (별표) 로컬 파서
+
+upload_master_data.py 가 classification_master 로 태그하는 별표/품목 분류 문서를
+로컬에서 파싱하여 품목코드 → (품목명, 등급) 표를 만듭니다.
+품목 분류를 LLM 호출 없이 결정적으로 조회하는 데 사용합니다.
+
+별표 문서는 한 줄(표의 한 행)에 "분류번호 품목명 ... 등급" 이 함께 나오는 형식을 가정합니다.
+PDF 표 추출 결과가 행을 나누는 경우 등급을 찾지 못한 항목은 grade 가 None 으로 남습니다.
+
+사용법:
+    python master_codebook.py build <마스터 데이터 디렉토리> [--output codebook.json]
+    python master_codebook.py lookup A07040.03
+"""
+import os
+import re
+import json
+import argparse
+
+from corpus import extract_text, iter_corpus_files
+
+# --- 설정 ---
+DEFAULT_CODEBOOK_PATH = os.getenv("MASTER_CODEBOOK_PATH", "master_codebook.json")
+
+# 품목코드 (예: A07040.03)
+CODE_PATTERN = re.compile(r"(?<![A-Z0-9])([A-Z]\d{5}\.\d{2})(?![0-9])")
+# 행 끝 쪽의 등급 (예: "2" 또는 "2등급")
+GRADE_PATTERN = re.compile(r"(?:^|\s)([1-4])(?:등급)?(?=\s|$)")
+# 품목명으로 인정할 최소 글자 수 (짧은 이름은 본문에서 오탐이 많음)
+MIN_NAME_LENGTH = 3
+
+_loaded_codebooks = {}
+
+
+def is_codebook_file(filename: str) -> bool:
+    """품목 분류 기준 문서(별표/품목 분류표)인지 파일명으로 판별합니다."""
+    return "별표" in filename or "품목" in filename
+
+
+def parse_codebook_line(line: str):
+    """
+    별표 한 행에서 (품목코드, 품목명, 등급)을 추출합니다.
+
+    Returns:
+        {"code", "name", "grade"} 또는 품목코드가 없으면 None
+    """
+    match = CODE_PATTERN.search(line)
+    if not match:
+        return None
+
+    rest = line[match.end():].strip()
+    # 품목명: 코드 바로 뒤의 한글 토큰들 (영문명/정의/등급 앞에서 끊음)
+    name_tokens = []
+    for token in rest.split():
+        if not re.search(r"[가-힣]", token) or GRADE_PATTERN.fullmatch(" " + token):
+            break
+        name_tokens.append(token)
+        if len(name_tokens) >= 6:
+            break
+    grades = GRADE_PATTERN.findall(rest)
+
+    return {
+        "code": match.group(1),
+        "name": " ".join(name_tokens),
+        "grade": int(grades[-1]) if grades else None,
+    }
+
+
+class Codebook:
+    """
+    품목코드 → {"code", "name", "grade"} 조회 표
+
+    Args:
+        entries: 품목코드를 키로 하는 딕셔너리
+    """
+
+    def __init__(self, entries: dict):
+        self.entries = entries
+        # 본문에서 품목명을 찾을 때 긴 이름부터 검사
+        self._names = sorted(
+            ((entry["name"].replace(" ", ""), code) for code, entry in entries.items()
+             if len(entry["name"].replace(" ", "")) >= MIN_NAME_LENGTH),
+            key=lambda item: -len(item[0]),
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, code):
+        return self.entries.get(code)
+
+    def find_codes(self, text: str) -> list:
+        """본문에 나오는 품목코드 중 코드북에 있는 것을 등장 순서대로 반환합니다."""
+        codes = []
+        for code in CODE_PATTERN.findall(text or ""):
+            if code in self.entries and code not in codes:
+                codes.append(code)
+        return codes
+
+    def find_names(self, text: str) -> list:
+        """
+        본문에 품목명이 나오는 품목코드를 반환합니다.
+        다른 일치 품목명에 포함되는 짧은 이름(예: '카테터' ⊂ '혈관용카테터')은 제외합니다.
+        """
+        compact = re.sub(r"\s+", "", text or "")
+        matched = []
+        for name, code in self._names:
+            if name in compact and not any(name in longer for longer, _ in matched):
+                matched.append((name, code))
+        return [code for _, code in matched]
+
+    def save(self, path: str = DEFAULT_CODEBOOK_PATH):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False, indent=1)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_CODEBOOK_PATH) -> "Codebook":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+
+def build_codebook(master_dir: str, text_loader=extract_text) -> Codebook:
+    """
+    마스터 데이터 디렉토리의 별표/품목 분류 문서를 파싱하여 코드북을 만듭니다.
+    같은 품목코드가 여러 번 나오면 등급이 있는 항목을 우선합니다.
+    """
+    entries = {}
+    for path in iter_corpus_files(master_dir):
+        if not is_codebook_file(os.path.basename(path)):
+            continue
+        try:
+            text = text_loader(path)
+        except Exception as e:
+            print(f"  ⚠ 텍스트 추출 실패: {os.path.basename(path)} ({e})")
+            continue
+
+        count = 0
+        for line in text.splitlines():
+            entry = parse_codebook_line(line)
+            if entry is None:
+                continue
+            existing = entries.get(entry["code"])
+            if existing is None or (existing["grade"] is None and entry["grade"] is not None):
+                entries[entry["code"]] = entry
+                count += 1
+        print(f"  ✓ {os.path.basename(path)}: 품목 {count}개")
+
+    return Codebook(entries)
+
+
+def get_codebook(path: str = DEFAULT_CODEBOOK_PATH):
+    """프로세스당 한 번만 코드북을 로드합니다. 파일이 없으면 None."""
+    if path not in _loaded_codebooks:
+        _loaded_codebooks[path] = Codebook.load(path) if os.path.exists(path) else None
+    return _loaded_codebooks[path]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="품목 분류 코드북 생성 및 조회")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="마스터 데이터에서 코드북 생성")
+    build_parser.add_argument("master_dir", help="마스터 데이터(별표 등) 디렉토리")
+    build_parser.add_argument("--output", default=DEFAULT_CODEBOOK_PATH, help="코드북 저장 경로")
+
+    lookup_parser = subparsers.add_parser("lookup", help="품목코드 조회")
+    lookup_parser.add_argument("code", help="품목코드 (예: A07040.03)")
+    lookup_parser.add_argument("--codebook", default=DEFAULT_CODEBOOK_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        codebook = build_codebook(args.master_dir)
+        codebook.save(args.output)
+        graded = sum(1 for entry in codebook.entries.values() if entry["grade"] is not None)
+        print(f"코드북 저장: {args.output} (품목 {len(codebook)}개, 등급 확인 {graded}개)")
+        return
+
+    codebook = get_codebook(args.codebook)
+    entry = codebook.get(args.code) if codebook else None
+    if entry is None:
+        print(f"품목코드를 찾을 수 없습니다: {args.code}")
+        return
+    print(f"{entry['code']} {entry['name']} ({entry['grade']}등급)")
+
+
+if __name__ == "__main__":
+    main()
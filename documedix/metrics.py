@@ -0,0 +1,215 @@
+"""
+API 서버 지표 (Prometheus 텍스트 형식)
+
+/api/metrics 에서 다음을 내보냅니다.
+
+- documedix_request_duration_seconds{endpoint,status}: 엔드포인트별 응답 시간 히스토그램
+  (SSE 스트림은 스트림이 끝날 때까지)
+- documedix_stage_duration_seconds{endpoint,stage}: StageTimer 단계별(upload/generate/cleanup/ttfb 등) 히스토그램
+- documedix_requests_in_flight{endpoint}: 처리 중인 요청 수
+- documedix_errors_total{endpoint,type}: 오류 유형별 횟수 (예외 체인의 원인 예외 이름, API 오류는 상태 코드 포함)
+- documedix_tokens_total{kind,category,model}: usage_metadata 토큰 수
+  (kind = prompt / cached / candidates / tool_use)
+- 콜백 게이지: 할당량 대기열, 캐시 적중 등 다른 모듈의 stats() 값
+
+외부 라이브러리 없이 구현했으며 값은 프로세스(워커)별입니다.
+serve.py 로 여러 워커를 띄우면 스크레이프한 워커의 값만 보이므로
+documedix_process_info 의 pid 로 어느 워커의 값인지 구분합니다.
+"""
+import os
+import bisect
+import threading
+
+# 응답/단계 시간 히스토그램 구간(초) — 초안 생성은 수 초~수십 초
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+# usage_metadata 필드 → kind 레이블
+USAGE_FIELDS = {
+    'prompt': 'prompt_token_count',
+    'cached': 'cached_content_token_count',
+    'candidates': 'candidates_token_count',
+    'tool_use': 'tool_use_prompt_token_count',
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def error_type(error) -> str:
+    """
+    오류 유형 레이블: 감싼 예외를 따라가 원인 예외의 클래스 이름을 씁니다.
+    (예: Exception("초안 생성 실패: ...") ← QuotaExceeded → "QuotaExceeded", APIError 404 → "APIError_404")
+    """
+    from quota_governor import find_quota_error
+
+    exceeded = find_quota_error(error)
+    if exceeded is not None:
+        return type(exceeded).__name__
+
+    seen = set()
+    while id(error) not in seen:
+        seen.add(id(error))
+        cause = error.__cause__ or error.__context__
+        if cause is None:
+            break
+        error = cause
+    code = getattr(error, 'code', None)
+    return f"{type(error).__name__}_{code}" if isinstance(code, int) else type(error).__name__
+
+
+class _Metric:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        self._values[tuple(labels)] = self._values.get(tuple(labels), 0) + amount
+
+    def lines(self):
+        for labels, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.label_names, labels)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, label_names, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        entry = self._values.get(tuple(labels))
+        if entry is None:
+            entry = self._values[tuple(labels)] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        counts = entry[0]
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def lines(self):
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                label_text = _format_labels(self.label_names, labels, [('le', _format_value(bound))])
+                yield f"{self.name}_bucket{label_text} {cumulative}"
+            label_text = _format_labels(self.label_names, labels)
+            yield f"{self.name}_sum{label_text} {_format_value(total)}"
+            yield f"{self.name}_count{label_text} {count}"
+
+
+class Metrics:
+    """
+    API 서버 지표 모음 (스레드 안전)
+
+    Args:
+        namespace: 지표 이름 접두어
+    """
+
+    def __init__(self, namespace='documedix'):
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self.request_duration = Histogram(
+            f'{namespace}_request_duration_seconds', '엔드포인트별 응답 시간', ('endpoint', 'status'))
+        self.stage_duration = Histogram(
+            f'{namespace}_stage_duration_seconds', '요청 단계별 소요 시간', ('endpoint', 'stage'))
+        self.in_flight = Gauge(
+            f'{namespace}_requests_in_flight', '처리 중인 요청 수', ('endpoint',))
+        self.errors = Counter(
+            f'{namespace}_errors_total', '오류 유형별 횟수', ('endpoint', 'type'))
+        self.tokens = Counter(
+            f'{namespace}_tokens_total', 'Gemini usage_metadata 토큰 수', ('kind', 'category', 'model'))
+        self._metrics = [self.request_duration, self.stage_duration, self.in_flight, self.errors, self.tokens]
+
+    def request_started(self, endpoint):
+        with self._lock:
+            self.in_flight.inc((endpoint,))
+
+    def request_finished(self, endpoint, status, seconds):
+        with self._lock:
+            self.in_flight.dec((endpoint,))
+            self.request_duration.observe((endpoint, str(status)), seconds)
+
+    def observe_timer(self, endpoint, timer):
+        """StageTimer 의 단계별 시간(ms)을 기록합니다."""
+        with self._lock:
+            for stage, ms in timer.stages.items():
+                self.stage_duration.observe((endpoint, stage), ms / 1000)
+
+    def count_error(self, endpoint, error):
+        with self._lock:
+            self.errors.inc((endpoint, error_type(error)))
+
+    def count_tokens(self, usage, category, model):
+        """응답 usage_metadata 의 토큰 수를 kind 별로 더합니다."""
+        if usage is None:
+            return
+        with self._lock:
+            for kind, field in USAGE_FIELDS.items():
+                value = getattr(usage, field, None)
+                if value:
+                    self.tokens.inc((kind, category or '', model), value)
+
+    def add_gauge_callback(self, name, help_text, label_names, fn, kind='gauge'):
+        """
+        스크레이프할 때마다 fn() 으로 값을 읽는 지표를 추가합니다.
+
+        Args:
+            fn: {레이블 값 튜플: 값} 을 반환하는 함수
+            kind: 'gauge' 또는 'counter'
+        """
+        self._callbacks.append((name, help_text, tuple(label_names), fn, kind))
+
+    def render(self) -> str:
+        """Prometheus 텍스트 형식으로 내보냅니다."""
+        lines = []
+        with self._lock:
+            for metric in self._metrics:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+                lines.append(f"# TYPE {metric.name} {metric.kind}")
+                lines.extend(metric.lines())
+
+        for name, help_text, label_names, fn, kind in self._callbacks:
+            try:
+                values = fn()
+            except Exception as e:
+                print(f"  ⚠ 지표 수집 실패 ({name}): {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels(label_names, labels)} {_format_value(value)}")
+
+        lines.append("# HELP documedix_process_info 지표를 내보낸 워커 프로세스")
+        lines.append("# TYPE documedix_process_info gauge")
+        lines.append(f"documedix_process_info{_format_labels(('pid',), (os.getpid(),))} 1")
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,320 @@
+"""
+승인 문서 근접 중복 제거 (MinHash/LSH)
+
+같은 회사가 형제 허가번호(approval_number)마다 같은 항목(document_section)을 거의 같은 내용으로
+제출한 문서가 많아, Store 크기를 키우고 File Search 결과를 같은 내용의 조각으로 채웁니다.
+업로드 전에 코퍼스 전체를 한 번 훑어 근접 중복 문서를 클러스터로 묶고, 클러스터마다 대표 문서 하나만
+업로드합니다. 대표 문서에는 묶인 문서들의 허가번호를 custom_metadata 로 기록합니다.
+
+- 문서 텍스트(corpus.extract_text)의 문자 SHINGLE_SIZE-gram 집합으로 MinHash 서명(NUM_PERM 개)을 만들고,
+  LSH(BANDS 밴드)로 후보 쌍을 찾은 뒤 서명 일치율(추정 자카드 유사도)이 NEAR_DEDUP_THRESHOLD 이상이면 병합
+- 등급/품목코드/항목(GROUP_KEYS)이 같은 문서끼리만 병합 (File Search 필터 결과가 달라지지 않도록)
+- 대표 문서: 클러스터에서 텍스트가 가장 긴 문서 (같으면 경로 순)
+- 대표 문서 메타데이터: duplicate_approval_numbers (대표 포함 전체 허가번호 목록), duplicate_count
+- 서명은 프로세스 풀(spawn)에서 계산하고 경로/크기/수정시각을 키로 SQLite(NEAR_DEDUP_CACHE_PATH)에 캐시
+  (재실행 시 바뀐 파일만 다시 계산)
+- extract_cache_dir 를 주면 PDF 는 pdf_extract 의 내용 해시 캐시에서 텍스트를 읽고, 없으면 추출해 캐시에 넣습니다.
+  업로드 단계의 PdfExtractor 가 같은 캐시를 쓰므로 코퍼스의 PDF 를 한 번만 파싱하고,
+  업로드되는 텍스트와 같은 텍스트로 유사도를 계산합니다.
+
+이미 개별 문서로 업로드된 중복 문서는 IngestionPipeline 이 매니페스트의 문서 이름으로 Store 에서 삭제합니다.
+"""
+import os
+import time
+import zlib
+import functools
+import sqlite3
+import threading
+import unicodedata
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from corpus import extract_text, metadata_to_dict
+
+# --- 설정 ---
+NEAR_DEDUP_ENABLED = os.getenv("NEAR_DEDUP", "1") != "0"
+# 이 값 이상의 추정 자카드 유사도면 같은 클러스터
+NEAR_DEDUP_THRESHOLD = float(os.getenv("NEAR_DEDUP_THRESHOLD", "0.85"))
+NEAR_DEDUP_CACHE_PATH = os.getenv("NEAR_DEDUP_CACHE_PATH", "near_dedup.sqlite3")
+NEAR_DEDUP_WORKERS = int(os.getenv("NEAR_DEDUP_WORKERS", str(os.cpu_count() or 1)))
+
+NUM_PERM = 128
+# 16 밴드 × 8 행: 유사도 0.7 에서 후보가 될 확률 약 0.5, 0.85 에서 약 0.99
+BANDS = 16
+SHINGLE_SIZE = 5
+# 한 번에 순열을 적용할 shingle 수 (메모리: 이 수 × NUM_PERM × 8 bytes)
+_HASH_BATCH = 8192
+GROUP_KEYS = ('grade', 'classification_number', 'document_section')
+MEMBERS_KEY = 'duplicate_approval_numbers'
+COUNT_KEY = 'duplicate_count'
+
+# MinHash 순열 h(x) = (a*x + b) mod p — crc32(32비트) 값과 곱해도 uint64 를 넘지 않도록 p = 2^31 - 1
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240101)
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    num_perm INTEGER NOT NULL,
+    signature BLOB,
+    text_bytes INTEGER NOT NULL
+);
+"""
+
+
+def minhash(text: str):
+    """텍스트의 MinHash 서명 (uint32 NUM_PERM 개), 텍스트가 너무 짧으면 None"""
+    text = " ".join(unicodedata.normalize("NFC", text).lower().split())
+    if len(text) < SHINGLE_SIZE:
+        return None
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    signature = np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), _HASH_BATCH):
+        batch = hashes[start:start + _HASH_BATCH, None]
+        np.minimum(signature, ((batch * _PERM_A + _PERM_B) % _PRIME).min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def similarity(a, b) -> float:
+    """두 서명의 추정 자카드 유사도"""
+    return float(np.mean(a == b))
+
+
+def _document_text(path, extract_cache_dir=None) -> str:
+    """중복 검사할 텍스트 (PDF 는 extract_cache_dir 의 추출 캐시 사용)"""
+    if not extract_cache_dir or not path.lower().endswith('.pdf'):
+        return extract_text(path)
+    from ingest_manifest import hash_file
+    from pdf_extract import ExtractionCache, extract_pdf
+
+    content_hash = hash_file(path)
+    cache = ExtractionCache(extract_cache_dir)
+    info = cache.get(content_hash)
+    if info is None:
+        info = extract_pdf(path, content_hash, extract_cache_dir)
+    if info["scanned"]:
+        return ""
+    with open(cache.text_path(content_hash), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def compute_signature(path, extract_cache_dir=None):
+    """
+    파일 하나의 서명을 계산합니다 (프로세스 풀 작업 함수).
+
+    Returns:
+        (서명 bytes 또는 None, 텍스트 바이트 수)
+    """
+    try:
+        text = _document_text(path, extract_cache_dir)
+    except Exception as e:
+        print(f"  ⚠ 중복 검사용 텍스트 추출 실패: {os.path.basename(path)} ({e})")
+        return None, 0
+    signature = minhash(text)
+    return (signature.tobytes() if signature is not None else None), len(text.encode("utf-8"))
+
+
+class SignatureCache:
+    """경로/크기/수정시각 → 서명 SQLite 캐시"""
+
+    def __init__(self, db_path=NEAR_DEDUP_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    def get(self, path, stat):
+        """(서명 bytes 또는 None, 텍스트 바이트 수), 캐시에 없거나 파일이 바뀌었으면 None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, num_perm, signature, text_bytes FROM signatures WHERE path = ?",
+                (os.path.abspath(path),),
+            ).fetchone()
+        if row is None or (row[0], row[1], row[2]) != (stat.st_size, stat.st_mtime_ns, NUM_PERM):
+            return None
+        return row[3], row[4]
+
+    def put_many(self, rows):
+        """rows: [(경로, os.stat 결과, 서명 bytes, 텍스트 바이트 수), ...]"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?, ?, ?, ?, ?)",
+                [(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, NUM_PERM, signature, text_bytes)
+                 for path, stat, signature, text_bytes in rows],
+            )
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+
+class NearDuplicateIndex:
+    """
+    근접 중복 클러스터 결과
+
+    Attributes:
+        clusters: [[대표 경로, 멤버 경로, ...], ...] (멤버 2개 이상인 클러스터만)
+    """
+
+    def __init__(self, clusters, approval_numbers, file_bytes, text_bytes, documents, elapsed):
+        self.clusters = clusters
+        self._approval_numbers = approval_numbers
+        self._representative = {}
+        for cluster in clusters:
+            for path in cluster:
+                self._representative[path] = cluster[0]
+        self._members = {cluster[0]: cluster for cluster in clusters}
+        self._file_bytes = file_bytes
+        self._text_bytes = text_bytes
+        self.documents = documents
+        self.elapsed = elapsed
+
+    def is_duplicate(self, path) -> bool:
+        """대표 문서가 아닌 클러스터 멤버인지 (업로드하지 않을 문서)"""
+        path = os.path.abspath(path)
+        return self._representative.get(path, path) != path
+
+    def extra_metadata(self, path) -> list:
+        """대표 문서에 추가할 custom_metadata (대표가 아니거나 단독 문서면 빈 리스트)"""
+        members = self._members.get(os.path.abspath(path))
+        if not members:
+            return []
+        numbers = sorted({self._approval_numbers[p] for p in members if self._approval_numbers.get(p)})
+        return [
+            {"key": MEMBERS_KEY, "string_list_value": {"values": numbers}},
+            {"key": COUNT_KEY, "numeric_value": len(members)},
+        ]
+
+    def metadata_changed(self, path, stored_metadata) -> bool:
+        """이전에 업로드한 메타데이터와 클러스터 구성이 달라졌는지"""
+        stored = [item for item in stored_metadata or [] if item.get("key") in (MEMBERS_KEY, COUNT_KEY)]
+        return stored != self.extra_metadata(path)
+
+    def stats(self) -> dict:
+        duplicates = [path for cluster in self.clusters for path in cluster[1:]]
+        return {
+            'documents': self.documents,
+            'clusters': len(self.clusters),
+            'duplicates': len(duplicates),
+            'file_bytes_saved': sum(self._file_bytes.get(path, 0) for path in duplicates),
+            'text_bytes_saved': sum(self._text_bytes.get(path, 0) for path in duplicates),
+            'elapsed': self.elapsed,
+        }
+
+
+def _group_key(metadata):
+    values = metadata_to_dict(metadata or [])
+    return tuple(values.get(key) for key in GROUP_KEYS)
+
+
+def find_near_duplicates(paths, metadata_fn, threshold=NEAR_DEDUP_THRESHOLD, workers=NEAR_DEDUP_WORKERS,
+                         cache_path=NEAR_DEDUP_CACHE_PATH, extract_cache_dir=None) -> NearDuplicateIndex:
+    """
+    파일 목록에서 근접 중복 클러스터를 찾습니다.
+
+    Args:
+        paths: 검사할 파일 경로 목록 (업로드 파이프라인이 순회하는 것과 같은 파일)
+        metadata_fn: (파일 경로) -> custom_metadata 리스트 (허가번호와 그룹 키 추출용)
+        threshold: 병합할 최소 추정 자카드 유사도
+        workers: 서명 계산 프로세스 수
+        cache_path: 서명 캐시 SQLite 경로 (빈 값이면 캐시하지 않음)
+        extract_cache_dir: PDF 텍스트 추출 캐시 디렉토리 (pdf_extract, None 이면 corpus.extract_text 로 추출)
+    """
+    started = time.perf_counter()
+    paths = [os.path.abspath(path) for path in paths]
+    cache = SignatureCache(cache_path) if cache_path else None
+
+    signatures = {}
+    text_bytes = {}
+    file_bytes = {}
+    stats = {}
+    missing = []
+    for path in paths:
+        stats[path] = os.stat(path)
+        file_bytes[path] = stats[path].st_size
+        cached = cache.get(path, stats[path]) if cache is not None else None
+        if cached is None:
+            missing.append(path)
+        else:
+            signatures[path], text_bytes[path] = cached
+
+    if missing:
+        print(f"  중복 검사 서명 계산: {len(missing)}개 (캐시 {len(paths) - len(missing)}개)")
+        # 여러 스레드가 있는 프로세스를 fork 하지 않도록 spawn 으로 작업 프로세스를 시작
+        with ProcessPoolExecutor(max_workers=max(1, workers),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(functools.partial(compute_signature, extract_cache_dir=extract_cache_dir),
+                                        missing, chunksize=16))
+        for path, (signature, size) in zip(missing, results):
+            signatures[path], text_bytes[path] = signature, size
+        if cache is not None:
+            cache.put_many([(path, stats[path], signatures[path], text_bytes[path]) for path in missing])
+    if cache is not None:
+        cache.close()
+
+    metadata = {path: metadata_fn(path) for path in paths}
+    approval_numbers = {path: metadata_to_dict(metadata[path] or []).get('approval_number') for path in paths}
+    vectors = {path: np.frombuffer(signature, dtype=np.uint32)
+               for path, signature in signatures.items() if signature is not None}
+
+    # LSH: (그룹, 밴드, 밴드 값) 이 같은 문서가 후보
+    rows = NUM_PERM // BANDS
+    buckets = {}
+    for path, vector in vectors.items():
+        group = _group_key(metadata[path])
+        for band in range(BANDS):
+            key = (group, band, vector[band * rows:(band + 1) * rows].tobytes())
+            buckets.setdefault(key, []).append(path)
+
+    union_find = _UnionFind()
+    compared = set()
+    for bucket in buckets.values():
+        # 상용구 문서가 한 버킷에 많이 모여도 비교가 제곱으로 늘지 않도록 첫 문서와 직전 문서하고만 비교
+        for i in range(1, len(bucket)):
+            for other in {bucket[0], bucket[i - 1]}:
+                pair = (other, bucket[i])
+                if pair in compared:
+                    continue
+                compared.add(pair)
+                if similarity(vectors[other], vectors[bucket[i]]) >= threshold:
+                    union_find.union(other, bucket[i])
+
+    groups = {}
+    for path in vectors:
+        groups.setdefault(union_find.find(path), []).append(path)
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda p: (-text_bytes.get(p, 0), p))
+        clusters.append(members)
+    clusters.sort(key=lambda members: members[0])
+
+    return NearDuplicateIndex(clusters, approval_numbers, file_bytes, text_bytes, len(paths),
+                              time.perf_counter() - started)
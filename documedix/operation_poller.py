@@ -0,0 +1,227 @@
+"""
+장기 실행 작업(Long-running operation) 공용 폴러
+
+업로드 스크립트마다 작업 하나씩 고정 간격(10초, 2초)으로 client.operations.get 을
+반복하던 대신, 하나의 백그라운드 스레드가 진행 중인 작업 전체를 추적합니다.
+
+- 완료된 작업들의 소요 시간(지수 이동 평균)으로 다음 확인 시점을 예측하고,
+  예측 시간이 지나면 간격을 지수적으로 늘립니다.
+- 여러 작업이 같은 순간에 몰리지 않도록 간격에 지터를 줍니다.
+- 작업이 끝나면 submit() 이 반환한 Future 를 완료시키고 콜백을 호출합니다.
+- operations.get 이 일시적 오류(429/5xx, 연결 오류)로 실패하면 백오프 후 다시 확인하고,
+  연속 MAX_POLL_ERRORS 회를 넘기거나 재시도할 수 없는 오류(404 등)일 때만 작업을 실패로 처리합니다.
+  (업로드 자체는 이미 성공했으므로 확인 한 번의 실패로 파일을 실패 처리하지 않음)
+"""
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future
+
+# --- 설정 ---
+MIN_INTERVAL = 1.0      # 최소 확인 간격(초)
+MAX_INTERVAL = 30.0     # 최대 확인 간격(초)
+INITIAL_ESTIMATE = 5.0  # 관측값이 없을 때 예상 완료 시간(초)
+JITTER = 0.2            # 간격에 적용할 ±비율
+EWMA_ALPHA = 0.2        # 완료 시간 이동 평균 가중치
+MAX_POLL_ERRORS = 5     # 연속 확인 실패 허용 횟수
+# 다시 확인할 operations.get 오류 상태 코드
+RETRY_STATUS_CODES = (408, 429, 500, 502, 503, 504)
+
+
+class OperationError(Exception):
+    """작업이 오류 상태로 완료되었을 때 발생합니다."""
+
+    def __init__(self, operation):
+        super().__init__(str(operation.error))
+        self.operation = operation
+
+
+class _PendingOperation:
+    def __init__(self, operation, future, submitted_at):
+        self.operation = operation
+        self.future = future
+        self.submitted_at = submitted_at
+        self.interval = None
+        self.polls = 0
+        # 연속 확인 실패 횟수
+        self.errors = 0
+
+
+class OperationPoller:
+    """
+    여러 진행 중 작업을 적응형 간격으로 확인하는 폴러
+
+    Args:
+        client: genai.Client (client.operations.get 사용)
+        min_interval: 최소 확인 간격(초)
+        max_interval: 최대 확인 간격(초)
+        initial_estimate: 관측값이 없을 때의 예상 완료 시간(초)
+        jitter: 간격에 적용할 ±비율
+        max_poll_errors: 작업을 실패로 처리하기 전까지 허용할 연속 확인 실패 횟수
+    """
+
+    def __init__(self, client, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 initial_estimate=INITIAL_ESTIMATE, jitter=JITTER, max_poll_errors=MAX_POLL_ERRORS):
+        self.client = client
+        self.max_poll_errors = max_poll_errors
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.estimate = initial_estimate
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        self.completed_count = 0
+        self.poll_count = 0
+        self.poll_error_count = 0
+
+    def submit(self, operation, callback=None) -> Future:
+        """
+        작업을 추적 목록에 추가합니다.
+
+        Args:
+            operation: upload_to_file_search_store 등이 반환한 작업 객체
+            callback: 완료 시 Future 를 인자로 호출할 함수
+
+        Returns:
+            완료된 작업 객체로 resolve 되는 Future (작업 오류 시 OperationError)
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
+
+        if operation.done:
+            self._resolve(_PendingOperation(operation, future, time.time()), record=False)
+            return future
+
+        pending = _PendingOperation(operation, future, time.time())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("OperationPoller 가 이미 종료되었습니다.")
+            self._schedule(pending, pending.submitted_at)
+            self._ensure_thread()
+            self._condition.notify()
+        return future
+
+    def wait(self, operation, timeout=None):
+        """작업 하나가 끝날 때까지 기다려 완료된 작업 객체를 반환합니다."""
+        return self.submit(operation).result(timeout=timeout)
+
+    def close(self):
+        """폴링 스레드를 종료합니다. 남은 작업의 Future 는 취소됩니다."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread:
+            self._thread.join()
+        for _, _, pending in self._heap:
+            pending.future.cancel()
+        self._heap.clear()
+
+    @property
+    def pending_count(self):
+        with self._condition:
+            return len(self._heap)
+
+    def next_interval(self, pending, now):
+        """
+        다음 확인까지의 간격을 계산합니다.
+
+        예상 완료 시점 전에는 그 시점에 맞춰 확인하고,
+        예상 시간을 넘긴 작업은 이전 간격의 두 배로 늘립니다.
+        """
+        age = now - pending.submitted_at
+        if age < self.estimate:
+            interval = self.estimate - age
+        else:
+            interval = (pending.interval or self.min_interval) * 2
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _schedule(self, pending, now):
+        pending.interval = self.next_interval(pending, now)
+        heapq.heappush(self._heap, (now + pending.interval, next(self._counter), pending))
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="operation-poller", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed:
+                    if self._heap:
+                        delay = self._heap[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+                if self._closed:
+                    return
+
+                now = time.time()
+                due = []
+                while self._heap and self._heap[0][0] <= now:
+                    due.append(heapq.heappop(self._heap)[2])
+
+            for pending in due:
+                self._refresh(pending)
+
+    def _refresh(self, pending):
+        try:
+            pending.operation = self.client.operations.get(pending.operation)
+            pending.polls += 1
+            pending.errors = 0
+            self.poll_count += 1
+        except Exception as e:
+            self._poll_failed(pending, e)
+            return
+
+        if pending.operation.done:
+            self._resolve(pending)
+            return
+
+        with self._condition:
+            self._schedule(pending, time.time())
+
+    def _poll_failed(self, pending, error):
+        """확인 실패: 일시적 오류면 백오프 후 다시 확인하고, 아니면 작업을 실패로 완료합니다."""
+        from google.genai import errors
+        from quota_governor import retry_hint
+
+        pending.errors += 1
+        self.poll_error_count += 1
+        code = getattr(error, "code", None)
+        if (isinstance(error, errors.APIError) and code not in RETRY_STATUS_CODES) \
+                or pending.errors > self.max_poll_errors:
+            pending.future.set_exception(error)
+            return
+
+        hint = retry_hint(error)
+        delay = hint if hint is not None else self.min_interval * 2 ** pending.errors
+        delay = min(self.max_interval, max(self.min_interval, delay)) * random.uniform(1, 1 + self.jitter)
+        print(f"  ⚠ 작업 상태 확인 실패 ({pending.errors}/{self.max_poll_errors}), {delay:.1f}초 후 다시 확인: {error}")
+        with self._condition:
+            now = time.time()
+            pending.interval = delay
+            heapq.heappush(self._heap, (now + delay, next(self._counter), pending))
+
+    def _resolve(self, pending, record=True):
+        if record:
+            elapsed = time.time() - pending.submitted_at
+            with self._condition:
+                self.estimate = (1 - EWMA_ALPHA) * self.estimate + EWMA_ALPHA * elapsed
+                self.completed_count += 1
+
+        if pending.operation.error:
+            pending.future.set_exception(OperationError(pending.operation))
+        else:
+            pending.future.set_result(pending.operation)
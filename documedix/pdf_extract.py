@@ -0,0 +1,378 @@
+"""
+PDF 텍스트 추출 단계 (업로드 전)
+
+코퍼스를 PDF 그대로 upload_to_file_search_store 로 올리면 큰 PDF 를 매번 전송하고
+서버에서 다시 파싱합니다. 이 모듈은 업로드 전에 로컬에서 PDF 를 정규화된 텍스트로 바꿉니다.
+
+- 추출: pdfplumber (표는 Markdown 표 형식의 구조화된 텍스트로 유지, 본문과 같은 읽기 순서),
+  pdfplumber 가 실패하면 pypdfium2 로 본문 텍스트만 추출
+- 정규화: 유니코드 NFC, 공백 정리, 여러 쪽에 반복되는 머리말/꼬리말(쪽 번호 포함) 제거
+- 프로세스 풀(PDF_EXTRACT_WORKERS)에서 병렬 추출, 결과는 내용 해시(SHA-256)를 키로
+  디스크(PDF_EXTRACT_CACHE_DIR)에 캐시하므로 같은 PDF 는 다시 파싱하지 않습니다.
+- 쪽당 글자 수가 PDF_MIN_CHARS_PER_PAGE 미만이면 스캔 문서로 보고 원본 PDF 를 업로드합니다
+  (텍스트 레이어가 없는 PDF 는 서버의 OCR 이 필요).
+
+IngestionPipeline(extractor=PdfExtractor()) 로 사용하면 PDF 대신 추출된 텍스트(.txt)를
+원래 표시 이름과 메타데이터로 업로드하고, 업로드마다 줄어든 바이트 수와 전체 pages/sec 를 보고합니다.
+"""
+import os
+import re
+import json
+import time
+import threading
+import unicodedata
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# --- 설정 ---
+PDF_EXTRACT_ENABLED = os.getenv("PDF_EXTRACT", "1") != "0"
+PDF_EXTRACT_CACHE_DIR = os.getenv("PDF_EXTRACT_CACHE_DIR", ".pdf_text_cache")
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+# 쪽당 평균 글자 수가 이보다 적으면 스캔 PDF 로 보고 원본을 업로드
+PDF_MIN_CHARS_PER_PAGE = int(os.getenv("PDF_MIN_CHARS_PER_PAGE", "20"))
+# 추출/정규화 방식을 바꾸면 올려서 캐시를 무효화
+EXTRACTOR_VERSION = 1
+
+# 머리말/꼬리말 판정: 각 쪽의 처음/마지막 몇 줄 중 이 비율 이상의 쪽에 반복되는 줄
+_EDGE_LINES = 2
+_REPEATED_RATIO = 0.6
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200b\u3000]+")
+_DIGITS = re.compile(r"\d+")
+
+
+# --- 추출 (프로세스 풀 작업자에서 실행) ---
+
+def _cell_text(cell) -> str:
+    return _SPACES.sub(" ", (cell or "").replace("\n", " ")).strip()
+
+
+def table_to_text(rows) -> str:
+    """표를 Markdown 표 형식의 텍스트로 변환합니다 (첫 행을 머리글로 사용)."""
+    rows = [[_cell_text(cell) for cell in row] for row in rows if row and any(row)]
+    if not rows:
+        return ""
+    width = max(len(row) for row in rows)
+    lines = ["| " + " | ".join(row + [""] * (width - len(row))) + " |" for row in rows]
+    lines.insert(1, "|" + " --- |" * width)
+    return "\n".join(lines)
+
+
+def _outside(bboxes):
+    """표 영역 밖의 글자만 남기는 pdfplumber 필터"""
+    def keep(obj):
+        x = (obj.get("x0", 0) + obj.get("x1", 0)) / 2
+        y = (obj.get("top", 0) + obj.get("bottom", 0)) / 2
+        return not any(x0 <= x <= x1 and top <= y <= bottom for x0, top, x1, bottom in bboxes)
+    return keep
+
+
+def _extract_page(page):
+    """
+    쪽 하나를 읽기 순서(위→아래)대로 본문과 표를 섞어 추출합니다.
+
+    Returns:
+        (텍스트, 표 개수)
+    """
+    tables = sorted(page.find_tables(), key=lambda table: table.bbox[1])
+    if not tables:
+        return page.extract_text() or "", 0
+
+    body = page.filter(_outside([table.bbox for table in tables]))
+    blocks = []
+    cursor = 0
+    for table in tables:
+        top = table.bbox[1]
+        if top > cursor:
+            blocks.append(body.crop((0, cursor, page.width, top)).extract_text() or "")
+        blocks.append(table_to_text(table.extract()))
+        cursor = max(cursor, table.bbox[3])
+    if cursor < page.height:
+        blocks.append(body.crop((0, cursor, page.width, page.height)).extract_text() or "")
+    return "\n\n".join(block for block in blocks if block.strip()), len(tables)
+
+
+def _extract_pages_pdfplumber(path):
+    import pdfplumber
+
+    with pdfplumber.open(path) as pdf:
+        pages = []
+        tables = 0
+        for page in pdf.pages:
+            text, page_tables = _extract_page(page)
+            pages.append(text)
+            tables += page_tables
+            page.flush_cache()
+        return pages, tables
+
+
+def _extract_pages_pypdfium2(path):
+    import pypdfium2
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        pages = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            pages.append(textpage.get_text_range())
+            textpage.close()
+            page.close()
+        return pages, 0
+    finally:
+        pdf.close()
+
+
+def normalize_pages(pages) -> str:
+    """쪽별 텍스트를 정규화하고 반복되는 머리말/꼬리말을 제거해 하나로 합칩니다."""
+    cleaned = []
+    for text in pages:
+        text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+        cleaned.append([_SPACES.sub(" ", line).strip() for line in text.split("\n")])
+
+    repeated = set()
+    if len(cleaned) >= 3:
+        counts = Counter()
+        for lines in cleaned:
+            content = [line for line in lines if line]
+            # 쪽 번호가 달라도 같은 줄로 보도록 숫자를 지움
+            counts.update({_DIGITS.sub("#", line) for line in content[:_EDGE_LINES] + content[-_EDGE_LINES:]})
+        repeated = {line for line, count in counts.items() if count >= len(cleaned) * _REPEATED_RATIO}
+
+    page_texts = []
+    for lines in cleaned:
+        count = sum(1 for line in lines if line)
+        edges = set(range(_EDGE_LINES)) | set(range(count - _EDGE_LINES, count))
+        kept = []
+        index = 0
+        for line in lines:
+            if not line:
+                # 문단 구분(빈 줄)은 하나만 유지
+                if kept and kept[-1]:
+                    kept.append("")
+                continue
+            if index not in edges or _DIGITS.sub("#", line) not in repeated:
+                kept.append(line)
+            index += 1
+        text = "\n".join(kept).strip()
+        if text:
+            page_texts.append(text)
+    return "\n\n".join(page_texts)
+
+
+def extract_pdf(path, content_hash, cache_dir):
+    """
+    PDF 하나를 추출해 캐시 디렉토리에 저장하고 결과 정보를 반환합니다 (프로세스 풀 작업 함수).
+
+    Returns:
+        {"pages", "tables", "chars", "extractor", "scanned", "seconds", "original_bytes", "text_bytes"}
+        scanned 가 True 면 텍스트 파일을 쓰지 않습니다.
+    """
+    started = time.perf_counter()
+    try:
+        pages, tables = _extract_pages_pdfplumber(path)
+        extractor = "pdfplumber"
+    except ImportError:
+        pages, tables = _extract_pages_pypdfium2(path)
+        extractor = "pypdfium2"
+    except Exception as e:
+        print(f"  ⚠ pdfplumber 추출 실패, pypdfium2 로 재시도: {os.path.basename(path)} ({e})")
+        pages, tables = _extract_pages_pypdfium2(path)
+        extractor = "pypdfium2"
+
+    text = normalize_pages(pages)
+    info = {
+        "pages": len(pages),
+        "tables": tables,
+        "chars": len(text),
+        "extractor": extractor,
+        "scanned": len(text) < PDF_MIN_CHARS_PER_PAGE * max(1, len(pages)),
+        "seconds": time.perf_counter() - started,
+        "original_bytes": os.path.getsize(path),
+        "text_bytes": len(text.encode("utf-8")),
+    }
+    ExtractionCache(cache_dir).put(content_hash, text, info)
+    return info
+
+
+# --- 캐시 ---
+
+class ExtractionCache:
+    """내용 해시 → 추출 텍스트(.txt) + 정보(.json) 디스크 캐시"""
+
+    def __init__(self, cache_dir=PDF_EXTRACT_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def _base(self, content_hash):
+        key = f"{content_hash}.v{EXTRACTOR_VERSION}"
+        return os.path.join(self.cache_dir, content_hash[:2], key)
+
+    def text_path(self, content_hash) -> str:
+        return self._base(content_hash) + ".txt"
+
+    def get(self, content_hash):
+        """캐시된 정보 딕셔너리, 없으면 None"""
+        base = self._base(content_hash)
+        try:
+            with open(base + ".json", "r", encoding="utf-8") as f:
+                info = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not info.get("scanned") and not os.path.exists(base + ".txt"):
+            return None
+        return info
+
+    def put(self, content_hash, text, info):
+        base = self._base(content_hash)
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        # 다른 프로세스가 읽는 중에 반쯤 쓴 파일이 보이지 않도록 임시 파일에 쓴 뒤 교체
+        if not info["scanned"]:
+            temp_path = f"{base}.txt.{os.getpid()}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(temp_path, base + ".txt")
+        temp_path = f"{base}.json.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(info, f, ensure_ascii=False)
+        os.replace(temp_path, base + ".json")
+
+
+# --- 추출 단계 ---
+
+class ExtractionStats:
+    """추출 단계 통계 (스레드 안전)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.extracted = 0
+        self.cache_hits = 0
+        self.scanned = 0
+        self.failed = 0
+        self.pages = 0
+        self.original_bytes = 0
+        self.text_bytes = 0
+        self._first_submit = None
+        self._last_done = None
+
+    def submitted(self):
+        with self._lock:
+            if self._first_submit is None:
+                self._first_submit = time.perf_counter()
+
+    def record(self, info, cached):
+        with self._lock:
+            if cached:
+                self.cache_hits += 1
+            else:
+                self.extracted += 1
+                self.pages += info["pages"]
+                self._last_done = time.perf_counter()
+            if info["scanned"]:
+                self.scanned += 1
+            else:
+                self.original_bytes += info["original_bytes"]
+                self.text_bytes += info["text_bytes"]
+
+    def record_failure(self):
+        with self._lock:
+            self.failed += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            elapsed = (self._last_done - self._first_submit) if self._last_done and self._first_submit else 0.0
+            return {
+                'extracted': self.extracted,
+                'cache_hits': self.cache_hits,
+                'scanned': self.scanned,
+                'failed': self.failed,
+                'pages': self.pages,
+                'pages_per_sec': self.pages / elapsed if elapsed > 0 else 0.0,
+                'bytes_saved': self.original_bytes - self.text_bytes,
+            }
+
+
+class ExtractedDocument:
+    """추출 결과: path 가 업로드할 파일 (스캔 PDF 이거나 추출에 실패하면 원본 PDF)"""
+
+    def __init__(self, path, info=None, cached=False):
+        self.path = path
+        self.info = info
+        self.cached = cached
+
+
+def extractor_available() -> bool:
+    """pdfplumber 또는 pypdfium2 를 사용할 수 있는지 확인합니다."""
+    for module in ("pdfplumber", "pypdfium2"):
+        try:
+            __import__(module)
+            return True
+        except ImportError:
+            continue
+    return False
+
+
+class PdfExtractor:
+    """
+    PDF → 텍스트 변환 단계 (프로세스 풀 + 내용 해시 캐시)
+
+    submit() 으로 미리 추출을 시작하고, result() 로 업로드할 경로를 받습니다.
+    작업 프로세스는 spawn 으로 시작하므로 실행 스크립트는 if __name__ == "__main__": 가드가 필요합니다.
+
+    Args:
+        workers: 추출 프로세스 수
+        cache_dir: 추출 결과 캐시 디렉토리
+    """
+
+    def __init__(self, workers=PDF_EXTRACT_WORKERS, cache_dir=PDF_EXTRACT_CACHE_DIR):
+        self.workers = max(1, workers)
+        self.cache = ExtractionCache(cache_dir)
+        self.stats = ExtractionStats()
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # 풀은 업로드/폴링 스레드와 httpx 연결이 이미 돌고 있을 때 파싱 스레드에서 만들어지므로,
+                # 여러 스레드가 있는 프로세스를 fork 하지 않도록 spawn 으로 작업 프로세스를 시작
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def submit(self, path, content_hash=None):
+        """
+        PDF 추출을 시작합니다. 캐시에 있으면 바로 끝난 결과를 반환합니다.
+
+        Returns:
+            (content_hash, 캐시된 정보 또는 None, Future 또는 None)
+        """
+        if content_hash is None:
+            from ingest_manifest import hash_file
+            content_hash = hash_file(path)
+        info = self.cache.get(content_hash)
+        if info is not None:
+            return content_hash, info, None
+        self.stats.submitted()
+        return content_hash, None, self._executor().submit(extract_pdf, path, content_hash, self.cache.cache_dir)
+
+    def result(self, path, pending) -> ExtractedDocument:
+        """submit() 의 반환값으로 추출 완료를 기다려 업로드할 문서를 반환합니다."""
+        content_hash, info, future = pending
+        cached = future is None
+        try:
+            if future is not None:
+                info = future.result()
+        except Exception as e:
+            print(f"  ⚠ PDF 텍스트 추출 실패, 원본을 업로드합니다: {os.path.basename(path)} ({e})")
+            self.stats.record_failure()
+            return ExtractedDocument(path)
+
+        self.stats.record(info, cached)
+        if info["scanned"]:
+            return ExtractedDocument(path, info, cached)
+        return ExtractedDocument(self.cache.text_path(content_hash), info, cached)
+
+    def close(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
@@ -0,0 +1,133 @@
+"""
+정적/동적 프롬프트 분리와 캐시/비캐시 입력 토큰 집계
+
+초안/채팅 프롬프트 중 요청마다 같은 부분(역할 설명, HTML 표 출력 규칙 등)을
+system_instruction 으로 분리하고, 요청마다 달라지는 부분(제품 정보, 사용자 입력)만 contents 로 보냅니다.
+같은 정적 프롬프트가 항상 요청 앞부분에 오므로 Gemini 의 암시적 캐시(implicit caching)가
+공통 접두부를 재사용할 수 있고, 재사용된 토큰은 usage_metadata.cached_content_token_count 로 보고됩니다.
+
+- 명시적 컨텍스트 캐시(client.caches)는 쓰지 않습니다. 정적 프롬프트가 모델별 최소 캐시 크기
+  (gemini-2.5-flash 1,024 토큰)보다 작고, cached_content 를 쓰는 요청은 도구(File Search 메타데이터 필터)를
+  캐시에 함께 넣어야 해서 품목/항목 조합마다 캐시가 따로 생기기 때문입니다.
+- 응답의 usage_metadata 로 요청별 캐시/비캐시 입력 토큰 수를 집계합니다.
+"""
+import threading
+
+from google.genai import types
+
+
+class PromptParts:
+    """
+    정적/동적으로 나눈 프롬프트
+
+    Args:
+        static: 요청마다 같은 지시문 (system_instruction 으로 전달, 암시적 캐시 대상)
+        dynamic: 요청마다 달라지는 내용 (contents 로 전달)
+        tools: types.Tool 리스트 (File Search 설정)
+        label: 토큰 사용량 집계용 분류 (예: 초안 항목명, 'chat')
+    """
+
+    def __init__(self, static, dynamic, tools=None, label=None):
+        self.static = static
+        self.dynamic = dynamic
+        self.tools = tools or []
+        self.label = label
+
+    def request(self, extra_contents=()):
+        """(contents, GenerateContentConfig) 를 반환합니다."""
+        return [self.dynamic] + list(extra_contents), types.GenerateContentConfig(
+            system_instruction=self.static, tools=self.tools
+        )
+
+
+class PromptCache:
+    """
+    요청별 캐시/비캐시 입력 토큰 집계 (암시적 캐시 적중 확인용)
+
+    Args:
+        model: 모델 이름
+        on_usage: 응답마다 (usage_metadata, PromptParts.label, model) 로 호출할 함수 (지표 수집용)
+    """
+
+    def __init__(self, model, on_usage=None):
+        self.model = model
+        self.on_usage = on_usage
+        self._lock = threading.Lock()
+
+        self.requests = 0
+        self.input_tokens = 0
+        self.cached_tokens = 0
+
+    def record_usage(self, usage, label=None):
+        """
+        응답 usage_metadata 의 입력 토큰을 캐시/비캐시로 나눠 집계합니다.
+        on_usage 가 있으면 label(PromptParts.label)과 함께 전달합니다.
+
+        Returns:
+            {"input": 전체 입력 토큰, "cached": 캐시에서 읽은 토큰, "uncached": 새로 처리한 토큰}
+        """
+        input_tokens = getattr(usage, 'prompt_token_count', None) or 0
+        cached_tokens = getattr(usage, 'cached_content_token_count', None) or 0
+        with self._lock:
+            self.requests += 1
+            self.input_tokens += input_tokens
+            self.cached_tokens += cached_tokens
+        if self.on_usage is not None:
+            self.on_usage(usage, label, self.model)
+        return {'input': input_tokens, 'cached': cached_tokens, 'uncached': input_tokens - cached_tokens}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'input_tokens': self.input_tokens,
+                'cached_tokens': self.cached_tokens,
+                'cached_ratio': self.cached_tokens / self.input_tokens if self.input_tokens else 0.0,
+            }
+
+
+def input_tokens_header(tokens) -> str:
+    """record_usage 결과를 X-Input-Tokens 헤더 값으로 만듭니다 (예: 'input=1800, cached=1500, uncached=300')."""
+    return ', '.join(f'{key}={value}' for key, value in tokens.items())
+
+
+def generate_content(client, prompt_cache, parts, model, extra_contents=()):
+    """
+    정적 프롬프트를 system_instruction 으로 넣어 generate_content 를 호출합니다.
+
+    Returns:
+        (응답, {"input", "cached", "uncached"} 입력 토큰 수)
+    """
+    contents, config = parts.request(extra_contents)
+    response = client.models.generate_content(model=model, contents=contents, config=config)
+    return response, prompt_cache.record_usage(response.usage_metadata, parts.label)
+
+
+async def generate_content_async(client, prompt_cache, parts, model, extra_contents=()):
+    """generate_content 의 비동기 버전"""
+    contents, config = parts.request(extra_contents)
+    response = await client.aio.models.generate_content(model=model, contents=contents, config=config)
+    return response, prompt_cache.record_usage(response.usage_metadata, parts.label)
+
+
+def generate_content_stream(client, prompt_cache, parts, model, extra_contents=()):
+    """
+    정적 프롬프트를 system_instruction 으로 넣어 generate_content_stream 을 호출합니다.
+    실제 API 는 청크마다 (누적) usage_metadata 를 싣므로, 마지막으로 받은 값을 스트림이 끝난 뒤 한 번만 집계합니다.
+    """
+    contents, config = parts.request(extra_contents)
+    usage = None
+    for chunk in client.models.generate_content_stream(model=model, contents=contents, config=config):
+        usage = chunk.usage_metadata or usage
+        yield chunk
+    prompt_cache.record_usage(usage, parts.label)
+
+
+async def generate_content_stream_async(client, prompt_cache, parts, model, extra_contents=()):
+    """generate_content_stream 의 비동기 버전 (async generator)"""
+    contents, config = parts.request(extra_contents)
+    usage = None
+    async for chunk in await client.aio.models.generate_content_stream(model=model, contents=contents, config=config):
+        usage = chunk.usage_metadata or usage
+        yield chunk
+    prompt_cache.record_usage(usage, parts.label)
@@ -0,0 +1,596 @@
+"""
+프로세스 전체 Gemini 호출 할당량 관리 (토큰 버킷 + 재시도)
+
+api_server, 업로드 스크립트, generate_draft 가 각자 API 를 호출하면서
+부하가 몰리면 429(RESOURCE_EXHAUSTED)가 나고, 이것이 그대로 500 으로 사용자에게 전달되었습니다.
+이 모듈은 genai.Client 를 감싸서 한 프로세스의 모든 호출이 같은 한도를 공유하도록 합니다.
+
+- 모델별 분당 요청 수(RPM)·분당 토큰 수(TPM) 토큰 버킷: 호출 전에 한도가 찰 때까지 대기
+  (요청 토큰은 입력 길이로 추정해 미리 차감하고, 응답의 usage_metadata 로 보정)
+- 429/5xx 응답은 서버가 알려준 재시도 시간(RetryInfo.retryDelay, Retry-After)을 우선 사용하고,
+  없으면 지수 백오프로 재시도합니다 (지터 포함). 429 를 받은 모델은 다른 호출도 같은 시간만큼 대기합니다.
+- 대기열 제한: 모델별 대기 중인 호출이 GEMINI_QUEUE_MAX 를 넘거나 예상 대기 시간이
+  GEMINI_MAX_WAIT 를 넘으면 기다리지 않고 QuotaExceeded 를 발생시킵니다 (API 서버는 429 + Retry-After 로 응답).
+- stats() 로 모델별 대기열 길이, 대기 시간, 429/재시도/거절 횟수를 확인할 수 있습니다.
+
+사용법:
+    client = govern(genai.Client(api_key=API_KEY))
+    client.models.generate_content(...)  # 기존 코드 그대로
+
+파일 업로드(files.upload, upload_to_file_search_store)는 모델과 별도로 "files" 키의 RPM 을 적용합니다.
+업로드는 멱등이 아니므로(500/502/504 는 서버가 문서를 이미 만들었을 수 있음) 요청이 처리되지 않았음이
+확실한 429/503 에만 재시도합니다 (UPLOAD_RETRY_STATUS_CODES).
+"""
+import os
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+
+# --- 설정 ---
+# 모델별 기본 한도 (0 이면 제한 없음)
+GEMINI_RPM = int(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = int(os.getenv("GEMINI_TPM", "1000000"))
+# 모델별 한도 재정의, 예: "gemini-2.5-flash=1000/1000000,files=300/0"
+GEMINI_MODEL_QUOTAS = os.getenv("GEMINI_MODEL_QUOTAS", "")
+# 모델별 최대 대기 호출 수 / 최대 예상 대기 시간(초)
+GEMINI_QUEUE_MAX = int(os.getenv("GEMINI_QUEUE_MAX", "64"))
+GEMINI_MAX_WAIT = float(os.getenv("GEMINI_MAX_WAIT", "60"))
+# 429/5xx 최대 재시도 횟수
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+
+# 파일 업로드용 한도 키
+FILES_QUOTA_KEY = "files"
+# 재시도 대상 HTTP 상태 코드
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# 업로드(멱등 아님) 재시도 대상: 서버가 요청을 처리하지 않았음이 확실한 상태 코드만
+UPLOAD_RETRY_STATUS_CODES = (429, 503)
+# 재시도 힌트가 없을 때의 지수 백오프 (초)
+BASE_BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# 대기 시간에 더하는 무작위 비율 (동시에 429 를 받은 호출이 한꺼번에 재시도하지 않도록)
+JITTER = 0.25
+
+# 요청 토큰 추정 (응답의 usage_metadata 로 보정됨)
+CHARS_PER_TOKEN = 2
+FILE_TOKEN_ESTIMATE = 1000
+OUTPUT_TOKEN_ESTIMATE = 1000
+
+_RETRY_DELAY = re.compile(r'"retryDelay":\s*"(\d+(?:\.\d+)?)s"')
+_RETRY_IN = re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE)
+
+
+class QuotaExceeded(Exception):
+    """
+    할당량 때문에 호출하지 못했을 때 (대기열 초과, 대기 시간 초과, 429 재시도 소진)
+
+    Attributes:
+        model: 모델 이름 (또는 "files")
+        retry_after: 다시 시도하기까지 권장 대기 시간(초)
+    """
+
+    def __init__(self, model, reason, retry_after):
+        self.model = model
+        self.retry_after = retry_after
+        super().__init__(
+            f"Gemini 요청 한도 초과 ({model}): {reason}. {math.ceil(retry_after)}초 후 다시 시도하세요."
+        )
+
+
+def find_quota_error(error):
+    """예외 체인(__cause__/__context__)에서 QuotaExceeded 를 찾습니다. 없으면 None."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, QuotaExceeded):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def quota_error_status(error):
+    """
+    API 서버 오류 응답의 (상태 코드, 헤더)를 결정합니다.
+    할당량 초과면 (429, Retry-After), 그 외에는 (500, {}).
+    """
+    exceeded = find_quota_error(error)
+    if exceeded is None:
+        return 500, {}
+    return 429, {'Retry-After': str(max(1, math.ceil(exceeded.retry_after)))}
+
+
+def retry_hint(error):
+    """
+    오류 응답에서 서버가 알려준 재시도 대기 시간(초)을 찾습니다. 없으면 None.
+    Retry-After 헤더, RetryInfo.retryDelay("17s"), 메시지의 "retry in 17.3s" 순으로 확인합니다.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        value = headers.get("retry-after") or headers.get("Retry-After")
+        if value:
+            return float(value)
+    except (TypeError, ValueError):
+        pass
+
+    details = getattr(error, "details", None)
+    text = json.dumps(details, ensure_ascii=False) if details is not None else str(error)
+    match = _RETRY_DELAY.search(text) or _RETRY_IN.search(text)
+    return float(match.group(1)) if match else None
+
+
+def estimate_tokens(contents, config=None) -> int:
+    """요청 contents/system_instruction 길이로 입력+출력 토큰 수를 추정합니다."""
+    def count(value):
+        if value is None:
+            return 0
+        if isinstance(value, str):
+            return len(value) // CHARS_PER_TOKEN
+        if isinstance(value, (list, tuple)):
+            return sum(count(item) for item in value)
+        text = getattr(value, "text", None)
+        if isinstance(text, str):
+            return count(text)
+        parts = getattr(value, "parts", None)
+        if parts is not None:
+            return count(parts)
+        return FILE_TOKEN_ESTIMATE
+
+    system_instruction = getattr(config, "system_instruction", None) if config is not None else None
+    return count(contents) + count(system_instruction) + OUTPUT_TOKEN_ESTIMATE
+
+
+def _total_tokens(usage):
+    return getattr(usage, "total_token_count", None) if usage is not None else None
+
+
+class TokenBucket:
+    """
+    분당 한도 토큰 버킷 (한 번에 최대 1분치까지 몰아 쓸 수 있음)
+
+    호출마다 필요한 양을 먼저 차감(예약)하므로 잔량이 음수가 될 수 있고,
+    뒤에 온 호출은 그만큼 더 기다립니다 (도착 순서대로 처리).
+
+    Args:
+        per_minute: 분당 한도
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now) -> float:
+        """amount 만큼 쓸 수 있을 때까지의 대기 시간(초)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate)
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def adjust(self, amount):
+        """예약량과 실제 사용량의 차이를 반영합니다 (양수면 추가 차감)."""
+        self.level = min(self.capacity, self.level - amount)
+
+
+class _ModelQuota:
+    """모델 하나의 버킷과 통계"""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self.blocked_until = 0.0
+
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.acquired = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.throttled = 0
+        self.retries = 0
+        self.rejected = 0
+
+
+def parse_model_quotas(spec: str) -> dict:
+    """"model=rpm/tpm,..." 형식의 설정을 {model: (rpm, tpm)} 으로 파싱합니다."""
+    quotas = {}
+    for entry in (spec or "").split(","):
+        if "=" not in entry:
+            continue
+        model, limits = entry.split("=", 1)
+        rpm, _, tpm = limits.partition("/")
+        quotas[model.strip()] = (int(rpm or 0), int(tpm or 0))
+    return quotas
+
+
+class QuotaGovernor:
+    """
+    모델별 RPM/TPM 한도와 재시도를 관리합니다 (스레드/asyncio 모두 사용 가능).
+
+    Args:
+        rpm: 기본 분당 요청 수 (0 이면 제한 없음)
+        tpm: 기본 분당 토큰 수 (0 이면 제한 없음)
+        model_quotas: {model: (rpm, tpm)} 모델별 재정의
+        queue_max: 모델별 최대 대기 호출 수
+        max_wait: 최대 예상 대기 시간(초), 넘으면 바로 QuotaExceeded
+        max_retries: 429/5xx 최대 재시도 횟수
+    """
+
+    def __init__(self, rpm=GEMINI_RPM, tpm=GEMINI_TPM, model_quotas=None, queue_max=GEMINI_QUEUE_MAX,
+                 max_wait=GEMINI_MAX_WAIT, max_retries=GEMINI_MAX_RETRIES):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.model_quotas = model_quotas if model_quotas is not None else parse_model_quotas(GEMINI_MODEL_QUOTAS)
+        self.queue_max = queue_max
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self._quotas = {}
+
+    def _quota(self, model):
+        quota = self._quotas.get(model)
+        if quota is None:
+            rpm, tpm = self.model_quotas.get(model, (self.rpm, 0 if model == FILES_QUOTA_KEY else self.tpm))
+            quota = self._quotas[model] = _ModelQuota(rpm, tpm)
+        return quota
+
+    def _reserve(self, model, tokens) -> float:
+        """버킷에서 요청 1건과 tokens 를 예약하고 대기 시간을 반환합니다."""
+        with self._lock:
+            quota = self._quota(model)
+            now = time.monotonic()
+            wait = max(
+                quota.blocked_until - now,
+                quota.requests.wait_time(1, now) if quota.requests else 0.0,
+                quota.tokens.wait_time(tokens, now) if quota.tokens and tokens else 0.0,
+            )
+            if wait > 0 and quota.queue_depth >= self.queue_max:
+                quota.rejected += 1
+                raise QuotaExceeded(model, f"대기 중인 요청이 {quota.queue_depth}건입니다", wait)
+            if wait > self.max_wait:
+                quota.rejected += 1
+                raise QuotaExceeded(model, f"예상 대기 시간 {wait:.0f}초가 제한({self.max_wait:.0f}초)을 넘습니다", wait)
+
+            if quota.requests:
+                quota.requests.take(1)
+            if quota.tokens and tokens:
+                quota.tokens.take(tokens)
+            quota.acquired += 1
+            if wait > 0:
+                quota.queue_depth += 1
+                quota.max_queue_depth = max(quota.max_queue_depth, quota.queue_depth)
+            return wait
+
+    def _finish_wait(self, model, wait):
+        with self._lock:
+            quota = self._quota(model)
+            quota.queue_depth -= 1
+            quota.waited += 1
+            quota.total_wait += wait
+            quota.max_wait = max(quota.max_wait, wait)
+
+    def acquire(self, model, tokens=0):
+        """한도 안에서 호출할 수 있을 때까지 대기합니다."""
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            try:
+                time.sleep(wait)
+            finally:
+                self._finish_wait(model, wait)
+
+    async def acquire_async(self, model, tokens=0):
+        """acquire 의 비동기 버전"""
+        wait = self._reserve(model, tokens)
+        if wait > 0:
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self._finish_wait(model, wait)
+
+    def settle(self, model, estimated, usage):
+        """응답의 usage_metadata 로 TPM 버킷의 예약량을 보정합니다."""
+        actual = _total_tokens(usage)
+        if actual is None:
+            return
+        with self._lock:
+            quota = self._quota(model)
+            if quota.tokens:
+                quota.tokens.adjust(actual - estimated)
+
+    def retry_delay(self, model, error, attempt, retry_codes=RETRY_STATUS_CODES) -> float:
+        """
+        attempt 번째 실패 후 재시도까지의 대기 시간(초)을 반환합니다.
+        재시도 대상(retry_codes)이 아니면 error 를, 429 재시도를 모두 소진했으면 QuotaExceeded 를 발생시킵니다.
+        """
+        from google.genai import errors
+
+        code = getattr(error, "code", None)
+        if not isinstance(error, errors.APIError) or code not in retry_codes:
+            raise error
+
+        hint = retry_hint(error)
+        delay = hint if hint is not None else min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempt - 1))
+        delay *= 1 + random.uniform(0, JITTER)
+
+        with self._lock:
+            quota = self._quota(model)
+            if code == 429:
+                quota.throttled += 1
+                # 같은 모델의 다른 호출도 서버가 알려준 시간만큼 기다리게 함
+                quota.blocked_until = max(quota.blocked_until, time.monotonic() + delay)
+            if attempt > self.max_retries:
+                if code == 429:
+                    raise QuotaExceeded(model, f"429 응답 후 {self.max_retries}회 재시도에 실패했습니다", delay) from error
+                raise error
+            quota.retries += 1
+
+        print(f"  ⏳ Gemini {code} ({model}), {delay:.1f}초 후 재시도 ({attempt}/{self.max_retries})")
+        return delay
+
+    def call(self, model, fn, tokens=0, on_retry=None, retry_codes=RETRY_STATUS_CODES):
+        """
+        한도 안에서 fn() 을 호출하고, 429/5xx 면 대기 후 재시도합니다.
+
+        Args:
+            model: 모델 이름 (또는 FILES_QUOTA_KEY)
+            fn: 인자 없는 호출 함수
+            tokens: 예상 토큰 수 (응답에 usage_metadata 가 있으면 보정)
+            on_retry: 재시도 전에 호출할 함수 (업로드 스트림 되감기 등)
+            retry_codes: 재시도할 상태 코드 (멱등이 아닌 업로드는 UPLOAD_RETRY_STATUS_CODES)
+        """
+        attempt = 0
+        while True:
+            self.acquire(model, tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                attempt += 1
+                time.sleep(self.retry_delay(model, e, attempt, retry_codes))
+                if on_retry:
+                    on_retry()
+                continue
+            if tokens:
+                self.settle(model, tokens, getattr(result, "usage_metadata", None))
+            return result
+
+    async def call_async(self, model, fn, tokens=0, on_retry=None, retry_codes=RETRY_STATUS_CODES):
+        """call 의 비동기 버전 (fn 은 코루틴을 반환하는 함수)"""
+        attempt = 0
+        while True:
+            await self.acquire_async(model, tokens)
+            try:
+                result = await fn()
+            except Exception as e:
+                attempt += 1
+                await asyncio.sleep(self.retry_delay(model, e, attempt, retry_codes))
+                if on_retry:
+                    on_retry()
+                continue
+            if tokens:
+                self.settle(model, tokens, getattr(result, "usage_metadata", None))
+            return result
+
+    def stats(self) -> dict:
+        """모델별 한도, 대기열 길이, 대기 시간, 429/재시도/거절 횟수"""
+        with self._lock:
+            return {
+                model: {
+                    "rpm": quota.rpm,
+                    "tpm": quota.tpm,
+                    "queue_depth": quota.queue_depth,
+                    "max_queue_depth": quota.max_queue_depth,
+                    "acquired": quota.acquired,
+                    "waited": quota.waited,
+                    "avg_wait_ms": round(quota.total_wait * 1000 / quota.waited, 1) if quota.waited else 0.0,
+                    "max_wait_ms": round(quota.max_wait * 1000, 1),
+                    "throttled": quota.throttled,
+                    "retries": quota.retries,
+                    "rejected": quota.rejected,
+                }
+                for model, quota in self._quotas.items()
+            }
+
+
+_governor = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> QuotaGovernor:
+    """프로세스 전체에서 공유하는 QuotaGovernor (환경 변수 설정으로 한 번 생성)"""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = QuotaGovernor()
+        return _governor
+
+
+def _rewinder(file):
+    """업로드 재시도 전에 파일 객체를 처음 위치로 되돌리는 함수"""
+    if not hasattr(file, "seek") or not hasattr(file, "tell"):
+        return None
+    position = file.tell()
+    return lambda: file.seek(position)
+
+
+class _Proxy:
+    """감싸지 않은 속성은 원래 객체로 전달"""
+
+    def __init__(self, target, governor):
+        self._target = target
+        self._governor = governor
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class _GovernedModels(_Proxy):
+    def generate_content(self, *, model, contents, config=None, **kwargs):
+        return self._governor.call(
+            model,
+            lambda: self._target.generate_content(model=model, contents=contents, config=config, **kwargs),
+            estimate_tokens(contents, config),
+        )
+
+    def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        # 첫 청크를 받기 전에 실패했을 때만 재시도 (이미 전송한 청크는 되돌릴 수 없음)
+        governor = self._governor
+        tokens = estimate_tokens(contents, config)
+        attempt = 0
+        while True:
+            governor.acquire(model, tokens)
+            usage = None
+            started = False
+            try:
+                for chunk in self._target.generate_content_stream(
+                    model=model, contents=contents, config=config, **kwargs
+                ):
+                    started = True
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    yield chunk
+            except Exception as e:
+                if started:
+                    raise
+                attempt += 1
+                time.sleep(governor.retry_delay(model, e, attempt))
+                continue
+            governor.settle(model, tokens, usage)
+            return
+
+    def embed_content(self, *, model, contents, config=None, **kwargs):
+        return self._governor.call(
+            model,
+            lambda: self._target.embed_content(model=model, contents=contents, config=config, **kwargs),
+            estimate_tokens(contents) - OUTPUT_TOKEN_ESTIMATE,
+        )
+
+
+class _GovernedAsyncModels(_Proxy):
+    async def generate_content(self, *, model, contents, config=None, **kwargs):
+        return await self._governor.call_async(
+            model,
+            lambda: self._target.generate_content(model=model, contents=contents, config=config, **kwargs),
+            estimate_tokens(contents, config),
+        )
+
+    async def generate_content_stream(self, *, model, contents, config=None, **kwargs):
+        governor = self._governor
+        tokens = estimate_tokens(contents, config)
+
+        async def stream():
+            attempt = 0
+            while True:
+                await governor.acquire_async(model, tokens)
+                usage = None
+                started = False
+                try:
+                    async for chunk in await self._target.generate_content_stream(
+                        model=model, contents=contents, config=config, **kwargs
+                    ):
+                        started = True
+                        usage = getattr(chunk, "usage_metadata", None) or usage
+                        yield chunk
+                except Exception as e:
+                    if started:
+                        raise
+                    attempt += 1
+                    await asyncio.sleep(governor.retry_delay(model, e, attempt))
+                    continue
+                governor.settle(model, tokens, usage)
+                return
+
+        return stream()
+
+    async def embed_content(self, *, model, contents, config=None, **kwargs):
+        return await self._governor.call_async(
+            model,
+            lambda: self._target.embed_content(model=model, contents=contents, config=config, **kwargs),
+            estimate_tokens(contents) - OUTPUT_TOKEN_ESTIMATE,
+        )
+
+
+class _GovernedFiles(_Proxy):
+    def upload(self, *, file, config=None, **kwargs):
+        return self._governor.call(
+            FILES_QUOTA_KEY,
+            lambda: self._target.upload(file=file, config=config, **kwargs),
+            on_retry=_rewinder(file),
+            retry_codes=UPLOAD_RETRY_STATUS_CODES,
+        )
+
+
+class _GovernedAsyncFiles(_Proxy):
+    async def upload(self, *, file, config=None, **kwargs):
+        return await self._governor.call_async(
+            FILES_QUOTA_KEY,
+            lambda: self._target.upload(file=file, config=config, **kwargs),
+            on_retry=_rewinder(file),
+            retry_codes=UPLOAD_RETRY_STATUS_CODES,
+        )
+
+
+class _GovernedFileSearchStores(_Proxy):
+    def upload_to_file_search_store(self, *, file, file_search_store_name, config=None, **kwargs):
+        return self._governor.call(
+            FILES_QUOTA_KEY,
+            lambda: self._target.upload_to_file_search_store(
+                file=file, file_search_store_name=file_search_store_name, config=config, **kwargs
+            ),
+            on_retry=_rewinder(file),
+            retry_codes=UPLOAD_RETRY_STATUS_CODES,
+        )
+
+
+class _GovernedAio(_Proxy):
+    @property
+    def models(self):
+        return _GovernedAsyncModels(self._target.models, self._governor)
+
+    @property
+    def files(self):
+        return _GovernedAsyncFiles(self._target.files, self._governor)
+
+
+class GovernedClient(_Proxy):
+    """
+    genai.Client 와 같은 방식으로 사용하는 래퍼
+    (models.generate_content/generate_content_stream/embed_content, 파일 업로드만 한도 적용)
+    """
+
+    @property
+    def governor(self):
+        return self._governor
+
+    @property
+    def models(self):
+        return _GovernedModels(self._target.models, self._governor)
+
+    @property
+    def files(self):
+        return _GovernedFiles(self._target.files, self._governor)
+
+    @property
+    def file_search_stores(self):
+        return _GovernedFileSearchStores(self._target.file_search_stores, self._governor)
+
+    @property
+    def aio(self):
+        return _GovernedAio(self._target.aio, self._governor)
+
+
+def govern(client, governor=None):
+    """client 를 프로세스 공용(또는 지정한) QuotaGovernor 로 감쌉니다. 이미 감싼 client 는 그대로 반환."""
+    if isinstance(client, GovernedClient):
+        return client
+    return GovernedClient(client, governor or get_governor())
@@ -0,0 +1,157 @@
+"""
+도큐메딕 API 서버 운영 실행 (gunicorn 프리포크)
+
+api_server.py 의 app.run() 은 Flask 개발 서버이고, 첫 요청이 google.genai 클라이언트 생성과
+연결 설정 비용을 모두 떠안았습니다. 이 스크립트는 gunicorn 으로 다음과 같이 실행합니다.
+
+1. 마스터 프로세스에서 앱과 공유 읽기 전용 데이터(프롬프트, 품목 카탈로그, google.genai 모듈 등)를
+   한 번만 로드한 뒤 워커를 포크합니다 (preload_app, 워커는 copy-on-write 로 공유).
+   Gemini 클라이언트와 HTTP 연결은 포크 전에 만들지 않습니다 (gemini_client 지연 생성).
+2. 각 워커는 요청을 받기 전에 워밍업으로 클라이언트를 만들고 모델 정보를 한 번 조회하여
+   업스트림 TLS 연결을 미리 열어 둡니다 (SERVE_WARMUP=0 이면 생략).
+3. 마스터 preload 시간과 워커별 포크~준비 완료 시간을 로그와 /api/health 의 startup 으로 보고합니다.
+   오토스케일링으로 새로 뜬 워커의 콜드 스타트를 여기서 추적합니다.
+
+워커는 gthread (스레드 워커) 를 사용하므로 SSE 스트리밍 응답도 스레드 하나만 점유합니다.
+
+사용법:
+    python serve.py                                  # SERVE_* 환경 변수 또는 기본값
+    python serve.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+"""
+import time
+
+SERVE_STARTED = time.monotonic()
+
+import os
+import argparse
+
+# --- 설정 ---
+SERVE_BIND = os.getenv("SERVE_BIND", "0.0.0.0:5000")
+SERVE_WORKERS = int(os.getenv("SERVE_WORKERS", str(min(4, os.cpu_count() or 1))))
+# 워커당 요청 처리 스레드 수
+SERVE_THREADS = int(os.getenv("SERVE_THREADS", "8"))
+# 초안 생성/스트리밍 응답이 길어질 수 있으므로 넉넉하게 (초)
+SERVE_TIMEOUT = int(os.getenv("SERVE_TIMEOUT", "300"))
+# 워커가 이 수만큼 요청을 처리하면 재시작 (0 이면 재시작 안 함)
+SERVE_MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", "0"))
+# 워커 시작 시 업스트림 연결 워밍업 여부
+SERVE_WARMUP = os.getenv("SERVE_WARMUP", "1") != "0"
+
+# 마스터 preload 결과 (포크 후 워커가 그대로 물려받음)
+_preload_timing = {}
+
+
+def preload():
+    """마스터에서 앱과 공유 데이터를 로드합니다 (포크 전 1회)."""
+    started = time.monotonic()
+    import api_server
+
+    # 로컬 검색 인덱스를 쓰는 경우 모듈도 미리 로드 (요청 처리 중 import 방지)
+    if api_server.LOCAL_VECTOR_INDEX_DIR:
+        import vector_index  # noqa: F401
+    elif api_server.LOCAL_INDEX_DIR:
+        import bm25_index  # noqa: F401
+
+    _preload_timing['preload_ms'] = round((time.monotonic() - started) * 1000, 1)
+    _preload_timing['master_ready_ms'] = round((time.monotonic() - SERVE_STARTED) * 1000, 1)
+    print(f"  ⏱ preload: {_preload_timing['preload_ms']}ms "
+          f"(마스터 시작 후 {_preload_timing['master_ready_ms']}ms)", flush=True)
+    return api_server.app
+
+
+def warm_up(pool_size):
+    """
+    공용 클라이언트를 만들고 모델 정보를 조회해 업스트림 연결을 엽니다.
+
+    Returns:
+        연결 워밍업 성공 여부 (API 키가 없거나 SERVE_WARMUP=0 이면 False)
+    """
+    from draft_service import MODEL_NAME
+    from gemini_client import API_KEY, get_client
+
+    if not API_KEY:
+        return False
+    try:
+        # SERVE_WARMUP=0 이어도 워커의 연결 풀 크기로 클라이언트는 미리 생성
+        client = get_client(pool_size)
+    except Exception as e:
+        print(f"  ⚠ 클라이언트 생성 실패 (첫 요청에서 다시 시도): {e}", flush=True)
+        return False
+    if not SERVE_WARMUP:
+        return False
+    try:
+        client.models.get(model=MODEL_NAME)
+        return True
+    except Exception as e:
+        print(f"  ⚠ 워밍업 실패 (첫 요청에서 연결): {e}", flush=True)
+        return False
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+
+
+def post_worker_init(worker):
+    """워커가 요청을 받기 전에 워밍업하고 시작 시간을 기록합니다."""
+    import api_server
+    from draft_service import APPLICATION_MAX_PARALLEL
+
+    started = time.monotonic()
+    # 요청 스레드마다 호출 1개 + 신청서 엔드포인트의 항목별 동시 생성
+    warmed = warm_up(worker.cfg.threads + APPLICATION_MAX_PARALLEL)
+    ready = time.monotonic()
+
+    api_server.startup_timing.update(_preload_timing, **{
+        'pid': os.getpid(),
+        'warmup_ok': warmed,
+        'warmup_ms': round((ready - started) * 1000, 1),
+        'worker_ready_ms': round((ready - worker.forked_at) * 1000, 1),
+    })
+    print(f"  ⏱ worker {os.getpid()} ready: {api_server.startup_timing['worker_ready_ms']}ms "
+          f"(warmup {api_server.startup_timing['warmup_ms']}ms, "
+          f"{'연결됨' if warmed else '연결 안 함'})", flush=True)
+
+
+def run(bind=SERVE_BIND, workers=SERVE_WORKERS, threads=SERVE_THREADS):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print(" 오류: gunicorn 이 설치되어 있지 않습니다. (pip install gunicorn)")
+        raise SystemExit(1)
+
+    class DocumedixApplication(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': bind,
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread',
+                'timeout': SERVE_TIMEOUT,
+                'max_requests': SERVE_MAX_REQUESTS,
+                'max_requests_jitter': SERVE_MAX_REQUESTS // 10,
+                'preload_app': True,
+                'accesslog': '-',
+                'post_fork': post_fork,
+                'post_worker_init': post_worker_init,
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return preload()
+
+    DocumedixApplication().run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="도큐메딕 API 서버 (gunicorn 프리포크)")
+    parser.add_argument("--bind", default=SERVE_BIND, help="바인드 주소 (기본 0.0.0.0:5000)")
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS, help="워커 프로세스 수")
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help="워커당 스레드 수")
+    args = parser.parse_args()
+
+    run(args.bind, args.workers, args.threads)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+동일 요청 단일 실행 (single-flight)
+
+여러 탭이나 버튼 더블클릭으로 같은 /api/generate-draft, /api/chat 요청이 동시에 들어오면
+요청마다 Gemini 를 호출하던 것을, 진행 중인 요청 표(키 → Future)로 묶어
+처음 들어온 요청만 실행하고 나중에 들어온 같은 요청은 그 결과(또는 예외)를 함께 받도록 합니다.
+
+- 키는 정규화된 요청 내용 (초안은 draft_cache.make_key, 채팅은 request_key)
+- 실행이 끝나면 표에서 제거되므로 결과를 보관하지 않습니다 (보관은 draft_cache 담당).
+- 스레드(Flask)용 do 와 asyncio(Quart)용 do_async 를 제공합니다.
+  do_async 는 실행을 별도 Task 로 돌리므로 처음 요청한 클라이언트가 연결을 끊어도
+  기다리는 다른 요청은 결과를 받습니다.
+- stats() 의 coalesced 가 절약된 Gemini 호출(업로드 포함 생성 작업) 수입니다.
+"""
+import json
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+
+from draft_cache import normalize_text
+
+
+def request_key(*parts) -> str:
+    """요청 구성 요소로 키를 만듭니다 (문자열은 공백/유니코드 정규화)."""
+    payload = json.dumps(
+        [normalize_text(part) if isinstance(part, str) else part for part in parts],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SingleFlight:
+    """진행 중인 요청 표"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+
+        self.executed = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def do(self, key, fn):
+        """
+        같은 키로 진행 중인 실행이 있으면 그 결과를 기다리고, 없으면 fn() 을 실행합니다.
+
+        Returns:
+            (결과, 다른 요청의 실행 결과를 공유했는지 여부)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            shared = future is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                future = self._calls[key] = Future()
+                self.executed += 1
+
+        if shared:
+            return future.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+                self.failed += 1
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+        return result, False
+
+    async def do_async(self, key, coro_fn):
+        """do 의 비동기 버전 (coro_fn 은 코루틴을 반환하는 함수)"""
+        with self._lock:
+            task = self._tasks.get(key)
+            shared = task is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                task = self._tasks[key] = asyncio.ensure_future(coro_fn())
+                task.add_done_callback(lambda done, key=key: self._finish_task(key, done))
+                self.executed += 1
+
+        return await asyncio.shield(task), shared
+
+    def _finish_task(self, key, task):
+        with self._lock:
+            self._tasks.pop(key, None)
+            if task.cancelled() or task.exception() is not None:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            requests = self.executed + self.coalesced
+            return {
+                'executed': self.executed,
+                'coalesced': self.coalesced,
+                'failed': self.failed,
+                'in_flight': len(self._calls) + len(self._tasks),
+                'saved_rate': self.coalesced / requests if requests else 0.0,
+            }
@@ -0,0 +1,116 @@
+"""
+매니페스트 부트스트랩 회귀 테스트
+
+upload_master_data.py 와 upload_script.py 는 같은 Store 와 같은 매니페스트를 씁니다.
+마스터 데이터를 먼저 올려 매니페스트에 기록이 생겨도, 이후 upload_script.py 를 처음 실행하면
+Store 에 이미 있는 승인 문서를 다시 업로드하지 않아야 합니다.
+
+사용법:
+    python -m pytest test_ingest_bootstrap.py
+"""
+import os
+import sys
+import itertools
+
+import pytest
+from google.genai import types
+
+# 스크립트 모듈은 임포트 시 API 키를 확인하므로 가짜 키와 오프라인 설정으로 임포트
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ["NEAR_DEDUP"] = "0"
+os.environ["PDF_EXTRACT"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import upload_master_data  # noqa: E402
+import upload_script  # noqa: E402
+from upload_utils import upload_stats  # noqa: E402
+
+
+class _Documents:
+    def __init__(self, owner):
+        self._owner = owner
+
+    def list(self, parent):
+        return list(self._owner.documents)
+
+    def delete(self, name, config=None):
+        self._owner.documents = [d for d in self._owner.documents if d.name != name]
+
+
+class _FileSearchStores:
+    def __init__(self, owner):
+        self._owner = owner
+        self.documents = _Documents(owner)
+
+    def upload_to_file_search_store(self, file, file_search_store_name, config=None):
+        number = next(self._owner.counter)
+        document_name = f"{file_search_store_name}/documents/{number}"
+        self._owner.uploads.append(config['display_name'])
+        self._owner.documents.append(types.Document(
+            name=document_name, display_name=config['display_name'], state=types.DocumentState.STATE_ACTIVE
+        ))
+        return types.UploadToFileSearchStoreOperation(
+            name=f"operations/{number}", done=True,
+            response=types.UploadToFileSearchStoreResponse(document_name=document_name),
+        )
+
+
+class FakeStoreClient:
+    """File Search Store 업로드/문서 목록만 흉내 내는 가짜 클라이언트 (모든 작업은 즉시 완료)"""
+
+    def __init__(self, documents=()):
+        self.counter = itertools.count()
+        self.uploads = []
+        self.documents = []
+        self.file_search_stores = _FileSearchStores(self)
+        for display_name in documents:
+            self.documents.append(types.Document(
+                name=f"fileSearchStores/test/documents/old-{len(self.documents)}",
+                display_name=display_name, state=types.DocumentState.STATE_ACTIVE,
+            ))
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    master_dir = tmp_path / "master"
+    data_dir = tmp_path / "approvals"
+    _write(str(master_dir / "의료기기 품목 고시.txt"), "품목 분류 고시")
+    approvals = [
+        "class2/2등급_A07040.03/회사가_제허00-001호_모양및구조-외형.txt",
+        "class2/2등급_A07040.03/회사나_제허00-002호_모양및구조-작용원리.txt",
+        "class3/3등급_A12345.01/회사다_제허00-003호_사용목적.txt",
+    ]
+    for i, relative in enumerate(approvals):
+        _write(str(data_dir / relative), f"승인 문서 {i}")
+    return str(master_dir), str(data_dir), [os.path.basename(p) for p in approvals]
+
+
+def test_master_upload_first_does_not_reupload_approvals(corpus, tmp_path, monkeypatch):
+    master_dir, data_dir, approval_names = corpus
+    manifest_path = str(tmp_path / "manifest.sqlite3")
+    store = types.FileSearchStore(name="fileSearchStores/test", display_name="test")
+
+    # 매니페스트 없이 승인 문서만 올라가 있는 Store
+    client = FakeStoreClient(approval_names)
+    monkeypatch.setattr(upload_master_data, "client", client)
+    monkeypatch.setattr(upload_script, "client", client)
+
+    upload_master_data.upload_master_files(master_dir, store, max_in_flight=2, manifest_path=manifest_path)
+    assert client.uploads == ["의료기기 품목 고시.txt"]
+
+    upload_script.upload_files_to_store(data_dir, store, max_in_flight=2, manifest_path=manifest_path)
+    assert client.uploads == ["의료기기 품목 고시.txt"]
+    # 업로드는 원본 파일 객체를 스트리밍하므로 임시 복사본이 없어야 함
+    assert upload_stats.snapshot()['bytes_copied'] == 0
+    assert len(client.documents) == len(approval_names) + 1
+
+    # 다시 실행해도 부트스트랩이나 업로드를 반복하지 않음
+    upload_master_data.upload_master_files(master_dir, store, max_in_flight=2, manifest_path=manifest_path)
+    upload_script.upload_files_to_store(data_dir, store, max_in_flight=2, manifest_path=manifest_path)
+    assert client.uploads == ["의료기기 품목 고시.txt"]
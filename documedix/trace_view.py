@@ -0,0 +1,219 @@
+"""
+generate_draft 트레이스 보기 (waterfall + 임계 경로)
+
+tracing.py 가 기록한 JSON Lines 파일을 읽어 실행(트레이스) 하나의 span 들을
+시작 시각 순 트리와 막대 그래프로 보여 주고, 전체 소요 시간을 결정한 임계 경로를 출력합니다.
+
+임계 경로: 부모 span 의 끝에서 거꾸로, 가장 늦게 끝난 자식 → 그 자식이 시작하기 전에 끝난 자식 … 을
+따라가며 재귀적으로 이어 붙인 span 들입니다. 여기 있는 단계를 줄여야 전체 시간이 줄어듭니다.
+
+사용법:
+    python trace_view.py                          # DRAFT_TRACE_PATH 의 마지막 실행 (지정한 경우)
+    python trace_view.py draft_trace.jsonl --list # 기록된 실행 목록
+    python trace_view.py draft_trace.jsonl --trace <trace_id> --width 60
+"""
+import sys
+import json
+import argparse
+import unicodedata
+from datetime import datetime
+
+from tracing import TRACE_PATH
+
+# span 이름 옆에 함께 표시할 속성
+LABEL_ATTRIBUTES = ('documedix.category', 'file.name', 'documedix.pipeline_mode')
+
+
+def load_spans(path) -> list:
+    """JSON Lines 파일에서 span 을 읽습니다 (깨진 줄은 건너뜀)."""
+    spans = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                print(f"  ⚠ {line_number}번째 줄을 읽을 수 없어 건너뜁니다.", file=sys.stderr)
+    return spans
+
+
+def group_traces(spans) -> dict:
+    """{trace_id: [span, ...]} (시작 시각 순)"""
+    traces = {}
+    for span in sorted(spans, key=lambda s: s['start_time_unix_nano']):
+        traces.setdefault(span['trace_id'], []).append(span)
+    return traces
+
+
+def build_tree(spans):
+    """
+    Returns:
+        (루트 span 리스트, {span_id: [자식 span, ...]})
+        부모가 기록되지 않은 span(실행 도중 중단 등)은 루트로 취급합니다.
+    """
+    ids = {span['span_id'] for span in spans}
+    children = {}
+    roots = []
+    for span in spans:
+        parent = span.get('parent_span_id')
+        if parent and parent in ids:
+            children.setdefault(parent, []).append(span)
+        else:
+            roots.append(span)
+    return roots, children
+
+
+def duration_ms(span) -> float:
+    return (span['end_time_unix_nano'] - span['start_time_unix_nano']) / 1e6
+
+
+def display_width(text) -> int:
+    """터미널 표시 너비 (한글 등 전각 문자는 2칸)"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def pad(text, width) -> str:
+    return text + ' ' * max(0, width - display_width(text))
+
+
+def span_label(span) -> str:
+    attributes = span.get('attributes', {})
+    details = [str(attributes[key]) for key in LABEL_ATTRIBUTES if attributes.get(key)]
+    label = span['name'] + (f" [{', '.join(details)}]" if details else '')
+    if span.get('status', {}).get('code') == 'ERROR':
+        label += ' ❌'
+    return label
+
+
+def span_metrics(span) -> str:
+    """토큰/검색 조각 수 요약"""
+    attributes = span.get('attributes', {})
+    parts = []
+    if 'gen_ai.usage.input_tokens' in attributes or 'gen_ai.usage.output_tokens' in attributes:
+        parts.append(f"in {attributes.get('gen_ai.usage.input_tokens', 0)}"
+                     f"/out {attributes.get('gen_ai.usage.output_tokens', 0)}")
+    if attributes.get('documedix.usage.cached_tokens'):
+        parts.append(f"cached {attributes['documedix.usage.cached_tokens']}")
+    if attributes.get('documedix.retrieval.chunks'):
+        parts.append(f"chunks {attributes['documedix.retrieval.chunks']}")
+    return ' '.join(parts)
+
+
+def walk(spans, children, depth=0):
+    """(span, 깊이) 를 트리 순서(형제는 시작 시각 순)로 반환합니다."""
+    for span in sorted(spans, key=lambda s: s['start_time_unix_nano']):
+        yield span, depth
+        yield from walk(children.get(span['span_id'], []), children, depth + 1)
+
+
+def critical_path(span, children) -> list:
+    """span 과 그 아래 임계 경로 span 들을 (span, 깊이) 로 시간 순서대로 반환합니다."""
+    def collect(current, depth):
+        segments = []
+        cursor = current['end_time_unix_nano']
+        for child in sorted(children.get(current['span_id'], []),
+                            key=lambda s: s['end_time_unix_nano'], reverse=True):
+            if child['end_time_unix_nano'] <= cursor:
+                segments = collect(child, depth + 1) + segments
+                cursor = child['start_time_unix_nano']
+        return [(current, depth)] + segments
+    return collect(span, 0)
+
+
+def render_waterfall(spans, width=50) -> str:
+    roots, children = build_tree(spans)
+    start = min(span['start_time_unix_nano'] for span in spans)
+    end = max(span['end_time_unix_nano'] for span in spans)
+    total = max(end - start, 1)
+
+    rows = []
+    for span, depth in walk(roots, children):
+        offset = int((span['start_time_unix_nano'] - start) / total * width)
+        length = max(1, round((span['end_time_unix_nano'] - span['start_time_unix_nano']) / total * width))
+        length = min(length, width - offset) or 1
+        bar = ' ' * offset + '█' * length
+        offset_ms = (span['start_time_unix_nano'] - start) / 1e6
+        rows.append((
+            '  ' * depth + span_label(span),
+            f"|{bar:<{width}}|",
+            f"+{offset_ms:7.0f}ms {duration_ms(span):7.0f}ms",
+            span_metrics(span),
+        ))
+
+    name_width = max(display_width(row[0]) for row in rows)
+    return '\n'.join(f"{pad(name, name_width)} {bar} {timing} {metrics}".rstrip()
+                     for name, bar, timing, metrics in rows)
+
+
+def render_critical_path(spans) -> str:
+    roots, children = build_tree(spans)
+    root = max(roots, key=duration_ms)
+    lines = []
+    for span, depth in critical_path(root, children):
+        # 임계 경로 안에서 자식이 아닌 자기 자신이 쓴 시간
+        own = duration_ms(span) - sum(duration_ms(child) for child, child_depth
+                                      in critical_path(span, children) if child_depth == 1)
+        lines.append(f"{'  ' * depth}{span_label(span)}  {duration_ms(span):.0f}ms (자체 {max(own, 0):.0f}ms)")
+    return '\n'.join(lines)
+
+
+def summarize(spans) -> str:
+    calls = [span for span in spans if span['name'] == 'gemini.generate_content']
+    total = lambda key: sum(span.get('attributes', {}).get(key, 0) for span in calls)
+    errors = sum(1 for span in spans if span.get('status', {}).get('code') == 'ERROR')
+    return (f"span {len(spans)}개, 모델 호출 {len(calls)}회, "
+            f"입력 토큰 {total('gen_ai.usage.input_tokens')}, 출력 토큰 {total('gen_ai.usage.output_tokens')}, "
+            f"검색 조각 {total('documedix.retrieval.chunks')}개, 오류 {errors}개")
+
+
+def list_traces(traces):
+    print(f"{'trace_id':<34} {'시작 시각':<20} {'소요(ms)':>10} {'span':>5}  루트")
+    for trace_id, spans in traces.items():
+        roots, _ = build_tree(spans)
+        root = max(roots, key=duration_ms)
+        started = datetime.fromtimestamp(root['start_time_unix_nano'] / 1e9).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{trace_id:<34} {started:<20} {duration_ms(root):>10.0f} {len(spans):>5}  {span_label(root)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="generate_draft 트레이스 보기 (waterfall + 임계 경로)")
+    parser.add_argument("path", nargs="?", default=TRACE_PATH, help="트레이스 파일 (기본 DRAFT_TRACE_PATH)")
+    parser.add_argument("--trace", help="볼 trace_id (앞부분만 입력 가능, 생략 시 마지막 실행)")
+    parser.add_argument("--list", action="store_true", help="기록된 실행 목록만 출력")
+    parser.add_argument("--width", type=int, default=50, help="막대 그래프 너비 (글자 수)")
+    args = parser.parse_args()
+
+    if not args.path:
+        print("❌ 오류: 트레이스 파일이 지정되지 않았습니다. (DRAFT_TRACE_PATH 또는 path 인자)")
+        return
+    traces = group_traces(load_spans(args.path))
+    if not traces:
+        print("❌ 기록된 트레이스가 없습니다.")
+        return
+
+    if args.list:
+        list_traces(traces)
+        return
+
+    if args.trace:
+        matches = [trace_id for trace_id in traces if trace_id.startswith(args.trace)]
+        if len(matches) != 1:
+            print(f"❌ trace_id '{args.trace}' 에 해당하는 실행이 {len(matches)}개입니다.")
+            return
+        trace_id = matches[0]
+    else:
+        trace_id = next(reversed(traces))
+    spans = traces[trace_id]
+
+    print(f"🧭 트레이스 {trace_id}")
+    print(f"   {summarize(spans)}")
+    print("\n📊 Waterfall")
+    print(render_waterfall(spans, args.width))
+    print("\n🔥 임계 경로")
+    print(render_critical_path(spans))
+
+
+if __name__ == "__main__":
+    main()
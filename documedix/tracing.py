@@ -0,0 +1,200 @@
+"""
+generate_draft 파이프라인 트레이싱 (span)
+
+파일 분류, 파일 업로드, 1~3단계, 모델 호출, 정리 단계를 span 으로 기록해
+DRAFT_TRACE_PATH 를 지정하면 JSON Lines 로 한 줄씩 저장합니다. (기본값은 기록하지 않음)
+
+- 한 줄이 span 하나이며 필드 이름은 OTLP(OpenTelemetry) span 과 같습니다.
+  trace_id(32자리 hex), span_id(16자리 hex), parent_span_id, name,
+  start_time_unix_nano, end_time_unix_nano, status{code, message}, attributes, events
+- 속성 이름은 OpenTelemetry 시맨틱 규약을 따릅니다.
+  gen_ai.request.model, gen_ai.usage.input_tokens, gen_ai.usage.output_tokens 등
+  규약에 없는 값은 documedix.* (예: documedix.retrieval.chunks = 그라운딩 문서 조각 수)
+- 부모 span 은 contextvars 로 전달됩니다. 작업자 스레드에서 실행할 함수는 bind() 로 감싸야
+  호출한 스레드의 span 아래에 기록됩니다.
+
+기록된 트레이스는 trace_view.py 로 waterfall 과 임계 경로를 볼 수 있습니다.
+"""
+import os
+import json
+import time
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# --- 설정 ---
+TRACE_PATH = os.getenv("DRAFT_TRACE_PATH", "")  # 예: draft_trace.jsonl
+SERVICE_NAME = "documedix.generate_draft"
+
+# usage_metadata 필드 → span 속성
+USAGE_ATTRIBUTES = {
+    'prompt_token_count': 'gen_ai.usage.input_tokens',
+    'candidates_token_count': 'gen_ai.usage.output_tokens',
+    'cached_content_token_count': 'documedix.usage.cached_tokens',
+    'tool_use_prompt_token_count': 'documedix.usage.tool_use_tokens',
+}
+
+_current_span = contextvars.ContextVar('documedix_span', default=None)
+
+
+class Span:
+    """실행 구간 하나 (with span(...) 로 생성)"""
+
+    def __init__(self, name, trace_id, parent_span_id=None, attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status_code = 'UNSET'
+        self.status_message = ''
+        self.start_time_unix_nano = time.time_ns()
+        self.end_time_unix_nano = None
+        self._started = time.perf_counter_ns()
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_usage(self, usage):
+        """응답 usage_metadata 의 토큰 수를 속성에 더합니다 (같은 span 에서 여러 번 호출 가능)."""
+        if usage is None:
+            return
+        for field, key in USAGE_ATTRIBUTES.items():
+            value = getattr(usage, field, None)
+            if value:
+                self.attributes[key] = self.attributes.get(key, 0) + value
+
+    def record_exception(self, error):
+        """예외를 exception 이벤트로 남기고 상태를 ERROR 로 바꿉니다 (예외를 삼키는 단계용)."""
+        self.status_code = 'ERROR'
+        self.status_message = str(error)[:200]
+        self.events.append({
+            'name': 'exception',
+            'time_unix_nano': time.time_ns(),
+            'attributes': {
+                'exception.type': type(error).__name__,
+                'exception.message': str(error)[:500],
+            },
+        })
+
+    def end(self):
+        # 벽시계 시각은 시작 시점만 쓰고 길이는 단조 시계로 계산
+        self.end_time_unix_nano = self.start_time_unix_nano + (time.perf_counter_ns() - self._started)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_span_id or '',
+            'name': self.name,
+            'start_time_unix_nano': self.start_time_unix_nano,
+            'end_time_unix_nano': self.end_time_unix_nano,
+            'status': {'code': self.status_code, 'message': self.status_message},
+            'attributes': self.attributes,
+            'events': self.events,
+            'resource': {'service.name': SERVICE_NAME, 'process.pid': os.getpid()},
+        }
+
+
+class _NoSpan:
+    """활성 span 이 없을 때 current_span() 이 반환하는 빈 객체"""
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_usage(self, usage):
+        pass
+
+    def record_exception(self, error):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class SpanWriter:
+    """끝난 span 을 JSON Lines 파일에 추가합니다 (스레드 안전)."""
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, span):
+        if not self.path:
+            return
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(line + '\n')
+            except OSError as e:
+                print(f"  ⚠ 트레이스 기록 실패: {e}")
+
+
+writer = SpanWriter()
+
+
+@contextmanager
+def span(name, attributes=None):
+    """
+    현재 span 의 자식 span 을 엽니다 (현재 span 이 없으면 새 트레이스의 루트).
+
+    with 블록에서 예외가 나가면 상태를 ERROR 로 기록한 뒤 예외를 그대로 다시 발생시킵니다.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        current = Span(name, os.urandom(16).hex(), attributes=attributes)
+    else:
+        current = Span(name, parent.trace_id, parent.span_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_exception(e)
+        raise
+    else:
+        if current.status_code == 'UNSET':
+            current.status_code = 'OK'
+    finally:
+        _current_span.reset(token)
+        current.end()
+        writer.write(current)
+
+
+def traced(name):
+    """함수 호출 전체를 span 으로 감싸는 데코레이터"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_span():
+    """현재 span (없으면 아무것도 기록하지 않는 빈 객체)"""
+    return _current_span.get() or _NO_SPAN
+
+
+def bind(fn):
+    """
+    현재 span 을 부모로 유지한 채 다른 스레드에서 실행할 수 있도록 fn 을 감쌉니다.
+    (ThreadPoolExecutor 는 contextvars 를 전달하지 않으므로 submit 전에 감쌈)
+    """
+    context = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+    return wrapper
@@ -1,10 +1,10 @@
 import os
-import time
-import shutil
-import tempfile
 from dotenv import load_dotenv
-from google import genai
-from google.genai import types
+from ingest_manifest import DEFAULT_MANIFEST_PATH, IngestManifest
+from ingest_pipeline import DEFAULT_MAX_IN_FLIGHT, IngestionPipeline
+from master_codebook import is_codebook_file
+from gemini_client import API_KEY, lazy_client, resolve_store
+from upload_utils import upload_stats
 
 # .env 로드
 load_dotenv()
@@ -16,20 +16,22 @@ MASTER_DATA_DIR = r""
 # 기존 스토어와 동일한 이름을 사용해야 하나의 DB에서 검색 가능합니다.
 FILE_SEARCH_STORE_DISPLAY_NAME = ""
 
+# 마스터 데이터로 업로드할 파일 확장자
+MASTER_EXTENSIONS = ['.pdf', '.txt', '.xlsx']
+
 # --- Gemini Client ---
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
+if not API_KEY:
     print("Error: GEMINI_API_KEY not found.")
     exit()
-client = genai.Client(api_key=api_key)
+client = lazy_client(pool_size=DEFAULT_MAX_IN_FLIGHT)
 
 def get_store(display_name: str):
     """기존 Store를 찾습니다."""
     print(f"Store '{display_name}' 연결 중...")
-    for store in client.file_search_stores.list():
-        if store.display_name == display_name:
-            print(f"  ✓ Store ID: {store.name}")
-            return store
+    store = resolve_store(display_name, client)
+    if store is not None:
+        print(f"  ✓ Store ID: {store.name}")
+        return store
     print(f"  X Store를 찾을 수 없습니다. 먼저 upload_script.py를 실행해 Store를 생성하세요.")
     return None
 
@@ -39,7 +41,7 @@ def get_master_metadata(filename: str) -> list:
     metadata = []
     
     # 1. 품목 분류 리스트 (Codebook)
-    if "별표" in filename or "품목" in filename:
+    if is_codebook_file(filename):
         print(f"  🏷️  [메타데이터 분류] 품목 분류 기준 문서로 식별됨")
         metadata.append({"key": "doc_type", "string_value": "classification_master"})
         metadata.append({"key": "importance", "string_value": "high"})
@@ -56,67 +58,35 @@ def get_master_metadata(filename: str) -> list:
 
     return metadata
 
-def upload_master_files(data_dir: str, store):
+def upload_master_files(data_dir: str, store, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                        manifest_path: str = DEFAULT_MANIFEST_PATH):
     if not os.path.exists(data_dir):
         print(f"오류: '{data_dir}' 폴더가 없습니다. 폴더를 생성하고 마스터 PDF를 넣어주세요.")
         return
 
     print(f"\n--- 마스터 데이터 업로드 시작: {data_dir} ---")
     
-    # 이미 업로드된 파일 확인 (중복 방지)
-    existing_files = set()
-    try:
-        for f in client.files.list():
-            if f.file_search_stores and store.name in f.file_search_stores:
-                existing_files.add(f.display_name)
-    except:
-        pass
-
-    for root, _, files in os.walk(data_dir):
-        for file in files:
-            if not file.lower().endswith(('.pdf', '.txt', '.xlsx')):
-                continue
-
-            if file in existing_files:
-                print(f"  ℹ [Skip] 이미 존재함: {file}")
-                continue
-
-            file_path = os.path.join(root, file)
-            print(f"\n처리 중: {file}")
-
-            # 1. 메타데이터 생성
-            custom_metadata = get_master_metadata(file)
-
-            # 2. 업로드 (한글명 처리)
-            temp_file = None
-            try:
-                file_ext = os.path.splitext(file)[1]
-                temp_fd, temp_file = tempfile.mkstemp(suffix=file_ext, prefix='master_')
-                os.close(temp_fd)
-                shutil.copy2(file_path, temp_file)
-
-                print("  ⬆ 업로드 중...")
-                operation = client.file_search_stores.upload_to_file_search_store(
-                    file=temp_file,
-                    file_search_store_name=store.name,
-                    config={
-                        'display_name': file,
-                        'custom_metadata': custom_metadata
-                    }
-                )
-
-                # 대기
-                while not operation.done:
-                    time.sleep(2)
-                    operation = client.operations.get(operation)
-
-                print("  ✓ 완료!")
-
-            except Exception as e:
-                print(f"  X 실패: {e}")
-            finally:
-                if temp_file and os.path.exists(temp_file):
-                    os.unlink(temp_file)
+    # 업로드 매니페스트로 새 파일이나 내용이 바뀐 파일만 업로드 (중복 방지)
+    manifest = IngestManifest(manifest_path, store_name=store.name)
+
+    pipeline = IngestionPipeline(
+        client,
+        store.name,
+        metadata_fn=lambda path: get_master_metadata(os.path.basename(path)),
+        max_in_flight=max_in_flight,
+        extensions=MASTER_EXTENSIONS,
+        manifest=manifest,
+    )
+    result = pipeline.run(data_dir)
+    manifest.close()
+
+    print(f"\n--- 마스터 데이터 업로드 완료 ({result['elapsed']:.1f}초) ---")
+    print(f"  ✓ 완료: {len(result['uploaded'])}개 / ℹ 건너뜀: {len(result['skipped'])}개 / X 실패: {len(result['failed'])}개")
+    for name in result["failed"]:
+        print(f"    - {name}")
+    stats = upload_stats.snapshot()
+    print(f"  업로드 바이트: {stats['bytes_uploaded']:,} / 임시 복사 바이트: {stats['bytes_copied']:,}")
+    return result
 
 if __name__ == "__main__":
     store = get_store(FILE_SEARCH_STORE_DISPLAY_NAME)
@@ -1,9 +1,13 @@
 import os
-import re
-import time
 from dotenv import load_dotenv
-from google import genai
 from google.genai import types
+from corpus import SUPPORTED_EXTENSIONS, iter_corpus_files, parse_metadata_for_store
+from ingest_manifest import DEFAULT_MANIFEST_PATH, IngestManifest
+from ingest_pipeline import DEFAULT_MAX_IN_FLIGHT, IngestionPipeline
+from pdf_extract import PDF_EXTRACT_CACHE_DIR, PDF_EXTRACT_ENABLED, PdfExtractor, extractor_available
+from near_dedup import NEAR_DEDUP_ENABLED, NEAR_DEDUP_THRESHOLD, find_near_duplicates
+from gemini_client import API_KEY, lazy_client, remember_store, resolve_store
+from upload_utils import upload_stats
 
 # .env 파일에서 환경 변수 로드
 load_dotenv()
@@ -15,73 +19,35 @@ DATA_ROOT_DIR = r" "
 # File Search Store의 표시 이름
 FILE_SEARCH_STORE_DISPLAY_NAME = "medical-device-certification-store"
 
-# --- Gemini API 클라이언트 초기화 ---
-try:
-    api_key = os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        print("ERROR: GEMINI_API_KEY or GOOGLE_API_KEY not found in .env file.")
-        exit()
-    client = genai.Client(api_key=api_key)
-    print("Gemini API configured successfully.")
-except Exception as e:
-    print(f"Error initializing Gemini client: {e}")
-    print("Please ensure GEMINI_API_KEY or GOOGLE_API_KEY is set correctly in your .env file.")
+# --- Gemini API 클라이언트 (동시 업로드 수만큼 연결 풀, 첫 호출 시 생성) ---
+if not API_KEY:
+    print("ERROR: GEMINI_API_KEY or GOOGLE_API_KEY not found in .env file.")
     exit()
+client = lazy_client(pool_size=DEFAULT_MAX_IN_FLIGHT)
 
 def get_or_create_file_search_store(display_name: str):
     """표시 이름으로 기존 File Search Store를 가져오거나 새로 생성합니다."""
     print(f"File Search Store '{display_name}' 확인 중...")
-    for store in client.file_search_stores.list():
-        if store.display_name == display_name:
-            print(f"  ✓ 기존 Store 발견: {store.name}")
-            return store
+    store = resolve_store(display_name, client)
+    if store is not None:
+        print(f"  ✓ 기존 Store 발견: {store.name}")
+        return store
     
     print(f"  ! Store를 찾을 수 없습니다. 새로 생성합니다...")
     new_store = client.file_search_stores.create(config={'display_name': display_name})
+    remember_store(new_store)
     print(f"  ✓ 새 Store 생성 완료: {new_store.name}")
     return new_store
 
-def parse_metadata_for_store(file_path: str, base_dir: str) -> list:
-    """
-    파일 경로에서 File Search Store의 custom_metadata 형식에 맞는 메타데이터를 파싱합니다.
-    """
-    relative_path = os.path.relpath(file_path, base_dir)
-    parts = relative_path.split(os.sep)
-
-    if len(parts) < 3:
-        return []
-
-    grade_match = re.match(r"class(\d+)", parts[0])
-    grade = int(grade_match.group(1)) if grade_match else None
-
-    classification_part = parts[1]
-    classification_number_match = re.match(r"\d+등급_([A-Z0-9.]+)", classification_part)
-    classification_number = classification_number_match.group(1) if classification_number_match else None
-
-    filename_without_ext = os.path.splitext(parts[2])[0]
-    file_name_parts = filename_without_ext.split('_', 2)
-
-    company_name = file_name_parts[0] if len(file_name_parts) > 0 else None
-    approval_number = file_name_parts[1] if len(file_name_parts) > 1 else None
-    document_section = file_name_parts[2] if len(file_name_parts) > 2 else None
-
-    metadata = []
-    if grade is not None:
-        metadata.append({"key": "grade", "numeric_value": grade})
-    if classification_number:
-        metadata.append({"key": "classification_number", "string_value": classification_number})
-    if company_name:
-        metadata.append({"key": "company_name", "string_value": company_name})
-    if approval_number:
-        metadata.append({"key": "approval_number", "string_value": approval_number})
-    if document_section:
-        metadata.append({"key": "document_section", "string_value": document_section})
-    
-    return metadata
-
-def upload_files_to_store(data_root_dir: str, file_search_store: types.FileSearchStore):
+def upload_files_to_store(data_root_dir: str, file_search_store: types.FileSearchStore,
+                          max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                          manifest_path: str = DEFAULT_MANIFEST_PATH):
     """
     data_root_dir을 순회하며 메타데이터와 함께 PDF 파일을 File Search Store에 업로드합니다.
+    업로드는 최대 max_in_flight 개까지 동시에 진행되며, 개별 파일 실패는 건너뛰고 계속합니다.
+    manifest_path 의 기록과 비교하여 새 파일이나 내용이 바뀐 파일만 업로드합니다.
+    PDF 는 로컬에서 추출한 텍스트를 업로드합니다 (PDF_EXTRACT=0 이면 PDF 그대로).
+    근접 중복 문서는 클러스터 대표 문서 하나만 업로드합니다 (NEAR_DEDUP=0 이면 모두 업로드).
     """
     print(f"파일 업로드 시작: {data_root_dir}")
     
@@ -89,101 +55,90 @@ def upload_files_to_store(data_root_dir: str, file_search_store: types.FileSearc
         print(f"오류: 디렉토리를 찾을 수 없습니다: {data_root_dir}")
         return
 
-    # File Search Store에 이미 있는 파일 목록 가져오기 (중복 업로드 방지)
+    # 업로드 매니페스트: 새 파일이나 내용이 바뀐 파일만 업로드 (중복 업로드 방지)
+    manifest = IngestManifest(manifest_path, store_name=file_search_store.name)
+    print(f"매니페스트: {manifest_path} {manifest.summary()}\n")
+
+    metadata_fn = lambda path: parse_metadata_for_store(path, data_root_dir)
+
+    # 근접 중복 검사 (MinHash/LSH): 클러스터 구성을 알아야 대표 문서 메타데이터를 정할 수 있으므로 업로드 전에 전체 순회
+    dedup = None
+    if NEAR_DEDUP_ENABLED:
+        print(f"근접 중복 검사 중 (유사도 {NEAR_DEDUP_THRESHOLD} 이상)...")
+        # PDF 는 업로드 단계와 같은 추출 캐시를 써서 한 번만 파싱
+        extract_cache_dir = PDF_EXTRACT_CACHE_DIR if PDF_EXTRACT_ENABLED and extractor_available() else None
+        dedup = find_near_duplicates(list(iter_corpus_files(data_root_dir, SUPPORTED_EXTENSIONS)), metadata_fn,
+                                     extract_cache_dir=extract_cache_dir)
+        dedup_stats = dedup.stats()
+        print(f"  ✓ 문서 {dedup_stats['documents']}개 중 클러스터 {dedup_stats['clusters']}개, "
+              f"제외할 중복 문서 {dedup_stats['duplicates']}개 ({dedup_stats['elapsed']:.1f}초)\n")
+
+    # PDF 텍스트 추출 단계 (프로세스 풀 + 내용 해시 캐시)
+    extractor = None
+    if PDF_EXTRACT_ENABLED:
+        if extractor_available():
+            extractor = PdfExtractor()
+            print(f"PDF 텍스트 추출: 프로세스 {extractor.workers}개, 캐시 {extractor.cache.cache_dir}\n")
+        else:
+            print("⚠ pdfplumber/pypdfium2 가 설치되어 있지 않아 PDF 를 그대로 업로드합니다.\n")
+
+    # 디렉토리 순회, 메타데이터 파싱, 업로드를 동시에 진행
+    pipeline = IngestionPipeline(
+        client,
+        file_search_store.name,
+        metadata_fn=metadata_fn,
+        max_in_flight=max_in_flight,
+        extensions=SUPPORTED_EXTENSIONS,
+        manifest=manifest,
+        extractor=extractor,
+        dedup=dedup,
+    )
+    print(f"동시 업로드 수: {pipeline.max_in_flight}개\n")
     try:
-        all_files = list(client.files.list())
-        existing_files_in_store = {
-            f.display_name for f in all_files 
-            if hasattr(f, 'file_search_stores') and f.file_search_stores 
-            and file_search_store.name in f.file_search_stores
-        }
-        print(f"'{file_search_store.display_name}'에 이미 있는 파일: {len(existing_files_in_store)}개\n")
-    except Exception as e:
-        print(f"  ℹ 기존 파일 목록을 가져올 수 없습니다. 계속 진행합니다. (오류: {e})\n")
-        existing_files_in_store = set()
-
-    uploaded_count = 0
-    skipped_count = 0
-    
-    # 지원하는 파일 확장자
-    SUPPORTED_EXTENSIONS = ['.pdf', '.txt', '.xlsx', '.xls', '.csv']
-    
-    for root, _, files in os.walk(data_root_dir):
-        for file in files:
-            file_ext = os.path.splitext(file)[1].lower()
-            
-            if file_ext in SUPPORTED_EXTENSIONS:
-                full_file_path = os.path.join(root, file)
-                
-                if file in existing_files_in_store:
-                    print(f"  ℹ 이미 Store에 존재합니다. 건너뜁니다: {file}")
-                    skipped_count += 1
-                    continue
-
-                print(f"처리 중: {file}")
-                
-                metadata = parse_metadata_for_store(full_file_path, data_root_dir)
-                if not metadata:
-                    print(f"  ⚠ 메타데이터를 추출하지 못했습니다. 건너뜁니다.")
-                    skipped_count += 1
-                    continue
-                
-                print(f"  📋 메타데이터: {metadata}")
-                
-                # 파일 업로드 (한글 파일명 지원)
-                import tempfile
-                import shutil
-                temp_file = None
-                try:
-                    # 임시 파일 생성 (영문 이름)
-                    temp_fd, temp_file = tempfile.mkstemp(suffix=file_ext, prefix='upload_')
-                    os.close(temp_fd)
-                    shutil.copy2(full_file_path, temp_file)
-                    
-                    print(f"  ⬆ 업로드 및 임베딩 중...")
-                    operation = client.file_search_stores.upload_to_file_search_store(
-                        file=temp_file,  # 임시 영문 파일 사용
-                        file_search_store_name=file_search_store.name,
-                        config={
-                            'display_name': file,  # 원본 파일명은 display_name으로
-                            'custom_metadata': metadata
-                        }
-                    )
-                    
-                    # 작업 완료 대기 (시간이 오래 걸릴 수 있음)
-                    while not operation.done:
-                        print(f"    - 작업 진행 중... (파일: {file})")
-                        time.sleep(10)
-                        operation = client.operations.get(operation)
-                    
-                    if operation.error:
-                        print(f"  ✗ 업로드 중 오류 발생: {operation.error}")
-                        skipped_count += 1
-                    else:
-                        print(f"  ✓ 업로드 및 처리 완료!")
-                        uploaded_count += 1
-                        existing_files_in_store.add(file) # 중복 체크 목록에 추가
-
-                except Exception as e:
-                    print(f"  ✗ 업로드 중 심각한 예외 발생: {e}")
-                    skipped_count += 1
-                finally:
-                    # 임시 파일 정리
-                    if temp_file and os.path.exists(temp_file):
-                        try:
-                            os.unlink(temp_file)
-                        except:
-                            pass
-            else:
-                skipped_count += 1
+        result = pipeline.run(data_root_dir)
+    finally:
+        if extractor is not None:
+            extractor.close()
+
+    uploaded_count = len(result["uploaded"])
+    skipped_count = len(result["skipped"]) + len(result["failed"])
 
     print(f"\n{'='*60}")
     print(f"--- 업로드 요약 ---")
     print(f"{'='*60}")
     print(f"새로 업로드됨: {uploaded_count}개")
-    print(f"건너뜀 (이미 존재하거나, 지원되지 않는 형식이거나, 오류 발생): {skipped_count}개")
+    print(f"건너뜀 (변경 없음, 지원되지 않는 형식이거나, 오류 발생): {skipped_count}개")
+    print(f"실패: {len(result['failed'])}개")
+    if dedup is not None:
+        dedup_stats = dedup.stats()
+        # 업로드 1건당 평균 소요 시간으로 제외한 문서의 수집 시간을 추정
+        per_upload = result['elapsed'] / uploaded_count if uploaded_count else 0.0
+        print(f"근접 중복 제외: {len(result['deduplicated'])}개 (클러스터 {dedup_stats['clusters']}개, "
+              f"이 중 Store 에서 삭제한 기존 문서 {len(result['removed'])}개)")
+        print(f"  절약한 Store 텍스트 크기: {dedup_stats['text_bytes_saved']:,} bytes "
+              f"(원본 파일 {dedup_stats['file_bytes_saved']:,} bytes)")
+        if per_upload:
+            saved_seconds = per_upload * len(result['deduplicated'])
+            print(f"  절약한 수집 시간(추정): {saved_seconds:.1f}초 (업로드당 평균 {per_upload:.1f}초), "
+                  f"중복 검사 {dedup_stats['elapsed']:.1f}초를 빼면 {saved_seconds - dedup_stats['elapsed']:.1f}초")
+    for name in result["failed"]:
+        print(f"  - {name}")
+    print(f"소요 시간: {result['elapsed']:.1f}초")
+    stats = upload_stats.snapshot()
+    print(f"업로드 바이트: {stats['bytes_uploaded']:,} / 임시 복사 바이트: {stats['bytes_copied']:,}")
+    extraction = result["extraction"]
+    if extraction:
+        converted = extraction['extracted'] + extraction['cache_hits'] - extraction['scanned']
+        print(f"PDF 텍스트 추출: {extraction['extracted']}개 ({extraction['pages']}쪽, "
+              f"{extraction['pages_per_sec']:.1f} pages/sec), 캐시 적중 {extraction['cache_hits']}개, "
+              f"스캔 PDF {extraction['scanned']}개, 실패 {extraction['failed']}개")
+        print(f"PDF 대신 텍스트 업로드로 절약한 바이트: {extraction['bytes_saved']:,}"
+              f" (업로드당 평균 {extraction['bytes_saved'] // max(1, converted):,})")
     print(f"지원 형식: PDF, TXT, Excel (xlsx, xls), CSV")
+    print(f"매니페스트 상태: {manifest.summary()}")
     print(f"{'='*60}")
+    manifest.close()
+    return result
 
 if __name__ == "__main__":
     print("="*60)
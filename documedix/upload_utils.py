@@ -0,0 +1,126 @@
+"""
+공용 파일 업로드 헬퍼
+
+한글 파일명 때문에 모든 업로드가 영문 이름의 임시 파일로 전체 복사(shutil.copy2)되던 것을
+원본 파일 객체를 SDK 에 그대로 스트리밍하는 방식으로 바꿉니다.
+파일 객체로 업로드하면 SDK 가 경로(파일명)를 사용하지 않으므로 한글 파일명 문제가 없고,
+mime_type 과 display_name 은 명시적으로 전달합니다.
+
+설치된 SDK 는 파일 객체 업로드를 지원하므로 임시 파일 복사 대체 경로는 두지 않습니다.
+(TypeError 를 잡아 복사본으로 다시 올리면 설정/SDK 버그가 가려지고 같은 파일을 두 번 업로드하게 됨)
+"""
+import os
+import threading
+
+# 확장자별 MIME 형식 (파일 객체 업로드 시 SDK 가 추측할 수 없으므로 명시)
+MIME_TYPES = {
+    '.pdf': 'application/pdf',
+    '.txt': 'text/plain',
+    '.md': 'text/markdown',
+    '.csv': 'text/csv',
+    '.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    '.xls': 'application/vnd.ms-excel',
+}
+
+
+class UploadStats:
+    """
+    업로드/임시 복사 바이트 카운터 (스레드 안전)
+
+    모든 업로드가 원본 파일 객체를 스트리밍하므로 bytes_copied 는 항상 0 이어야 합니다.
+    (업로드 전에 임시 복사본을 만드는 경로가 생기면 record_copy 로 기록)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files_uploaded = 0
+        self.bytes_uploaded = 0
+        self.files_copied = 0
+        self.bytes_copied = 0
+
+    def record_upload(self, size):
+        with self._lock:
+            self.files_uploaded += 1
+            self.bytes_uploaded += size
+
+    def record_copy(self, size):
+        with self._lock:
+            self.files_copied += 1
+            self.bytes_copied += size
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'files_uploaded': self.files_uploaded,
+                'bytes_uploaded': self.bytes_uploaded,
+                'files_copied': self.files_copied,
+                'bytes_copied': self.bytes_copied,
+            }
+
+
+# 프로세스 전체 업로드 통계
+upload_stats = UploadStats()
+
+
+def guess_mime_type(path: str) -> str:
+    """확장자로 MIME 형식을 결정합니다."""
+    return MIME_TYPES.get(os.path.splitext(path)[1].lower(), 'application/octet-stream')
+
+
+def _upload_file_object(path, upload_fn):
+    """원본 파일 객체로 업로드하고 업로드량을 기록합니다."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        result = upload_fn(f)
+    upload_stats.record_upload(size)
+    return result
+
+
+def upload_file(client, path: str, display_name: str = None):
+    """
+    client.files.upload 로 파일을 업로드합니다 (임시 복사 없음).
+
+    Args:
+        client: genai.Client
+        path: 업로드할 파일 경로 (한글 파일명 가능)
+        display_name: 표시 이름, None 이면 원본 파일명
+
+    Returns:
+        업로드된 Gemini 파일 객체
+    """
+    config = {
+        'display_name': display_name or os.path.basename(path),
+        'mime_type': guess_mime_type(path),
+    }
+    return _upload_file_object(path, lambda file: client.files.upload(file=file, config=config))
+
+
+def upload_to_store(client, store_name: str, path: str, display_name: str = None,
+                    custom_metadata: list = None):
+    """
+    upload_to_file_search_store 로 파일을 Store 에 업로드합니다 (임시 복사 없음).
+
+    Args:
+        client: genai.Client
+        store_name: File Search Store 이름
+        path: 업로드할 파일 경로 (한글 파일명 가능)
+        display_name: 표시 이름, None 이면 원본 파일명
+        custom_metadata: custom_metadata 리스트
+
+    Returns:
+        임베딩 작업(Operation) 객체
+    """
+    config = {
+        'display_name': display_name or os.path.basename(path),
+        'mime_type': guess_mime_type(path),
+    }
+    if custom_metadata:
+        config['custom_metadata'] = custom_metadata
+    return _upload_file_object(
+        path,
+        lambda file: client.file_search_stores.upload_to_file_search_store(
+            file=file,
+            file_search_store_name=store_name,
+            config=config,
+        ),
+    )
@@ -0,0 +1,543 @@
+"""
+메모리 매핑 기반 밀집 벡터 인덱스
+
+File Search 와 별도로 로컬에서 임베딩 유사도 검색을 수행합니다.
+
+- 문서 임베딩은 L2 정규화된 float16/float32 행렬(vectors.npy)로 저장하고,
+  parse_metadata_for_store 필드는 구조화 배열(metadata.npy)로 나란히 저장합니다.
+- 로드는 np.load(mmap_mode='r') 로 복사 없이 이루어지므로 여러 gunicorn 워커가
+  같은 페이지 캐시를 공유합니다.
+- IVF 모드에서는 k-means 중심점으로 문서를 묶어 연속 구간으로 재배열해 두고,
+  질의와 가까운 nprobe 개 구간만 스캔합니다.
+- 임베더는 교체 가능합니다: 운영은 Gemini embed_content, 오프라인 테스트는 해싱 임베더.
+
+사용법:
+    python vector_index.py build <데이터 디렉토리> <인덱스 디렉토리> --embedder hashing --nlist 256
+    python vector_index.py query <인덱스 디렉토리> "검색어" --grade 2 --nprobe 8
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+
+import numpy as np
+
+from bm25_index import tokenize
+from corpus import extract_text, iter_corpus_files, metadata_to_dict, parse_metadata_for_store
+
+# --- 설정 ---
+GEMINI_EMBEDDING_MODEL = "gemini-embedding-001"
+DEFAULT_DIM = 768
+HASHING_DIM = 256
+
+# 전체 스캔 시 한 번에 내적을 계산할 행 수 (float16 → float32 변환 버퍼 크기)
+SCAN_BLOCK_ROWS = 32768
+
+# IVF 학습 설정
+KMEANS_ITERATIONS = 20
+KMEANS_SAMPLE_SIZE = 50000
+
+META_FILE = "meta.json"
+DOCS_FILE = "docs.json"
+
+# parse_metadata_for_store 필드를 담는 사이드카 구조화 배열 형식
+# 문자열 폭은 최소값이며, 실제 폭은 인덱스 생성 시 데이터의 최대 길이에 맞춰 늘어납니다.
+METADATA_DTYPE = np.dtype([
+    ("grade", np.int8),
+    ("classification_number", "U16"),
+    ("company_name", "U64"),
+    ("approval_number", "U32"),
+    ("document_section", "U32"),
+])
+
+
+# --- 임베더 ---
+
+class HashingEmbedder:
+    """
+    결정적 해싱 임베더 (오프라인 테스트용)
+
+    bm25_index.tokenize 로 나눈 토큰을 blake2b 로 차원/부호에 해싱합니다.
+    네트워크 호출이 없고 같은 입력에는 항상 같은 벡터를 반환합니다.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def _embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dim] += 1.0 if (value >> 63) else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        return np.stack([self._embed(t) for t in texts]) if texts else np.zeros((0, self.dim), np.float32)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._embed(text)
+
+
+class GeminiEmbedder:
+    """
+    Gemini embed_content 임베더 (운영용)
+
+    문서는 RETRIEVAL_DOCUMENT, 질의는 RETRIEVAL_QUERY 태스크로 임베딩합니다.
+    """
+    name = "gemini"
+    batch_size = 100
+
+    def __init__(self, client=None, model: str = GEMINI_EMBEDDING_MODEL, dim: int = DEFAULT_DIM):
+        self.model = model
+        self.dim = dim
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            from gemini_client import get_client
+            self._client = get_client()
+        return self._client
+
+    def _embed(self, texts, task_type):
+        from google.genai import types
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            response = self.client.models.embed_content(
+                model=self.model,
+                contents=texts[start:start + self.batch_size],
+                config=types.EmbedContentConfig(task_type=task_type, output_dimensionality=self.dim),
+            )
+            vectors.extend(e.values for e in response.embeddings)
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+    def embed_documents(self, texts: list) -> np.ndarray:
+        return self._embed(texts, "RETRIEVAL_DOCUMENT")
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self._embed([text], "RETRIEVAL_QUERY")[0]
+
+
+EMBEDDERS = {
+    HashingEmbedder.name: HashingEmbedder,
+    GeminiEmbedder.name: GeminiEmbedder,
+}
+
+
+def get_embedder(name: str, dim: int = None):
+    """이름으로 임베더를 생성합니다."""
+    if name not in EMBEDDERS:
+        raise ValueError(f"지원하지 않는 임베더입니다: {name} (가능: {', '.join(EMBEDDERS)})")
+    return EMBEDDERS[name](dim=dim) if dim else EMBEDDERS[name]()
+
+
+# --- IVF(coarse quantizer) ---
+
+def train_kmeans(vectors: np.ndarray, nlist: int, seed: int = 0) -> np.ndarray:
+    """구면 k-means 로 nlist 개 중심점을 학습합니다 (내적 기준)."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), KMEANS_SAMPLE_SIZE)
+    sample = np.asarray(vectors[rng.choice(len(vectors), sample_size, replace=False)], dtype=np.float32)
+    centroids = sample[rng.choice(sample_size, nlist, replace=False)].copy()
+
+    for _ in range(KMEANS_ITERATIONS):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroids[list_id] = members.sum(axis=0)
+            else:
+                centroids[list_id] = sample[rng.integers(sample_size)]
+        norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+        centroids /= np.where(norms == 0, 1, norms)
+    return centroids
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """각 벡터를 가장 가까운 중심점 리스트에 할당합니다."""
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), SCAN_BLOCK_ROWS):
+        block = np.asarray(vectors[start:start + SCAN_BLOCK_ROWS], dtype=np.float32)
+        assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return assignments
+
+
+# --- 인덱스 ---
+
+class VectorIndex:
+    """
+    밀집 벡터 인덱스
+
+    Attributes:
+        vectors: (N, d) 정규화 임베딩 행렬 (mmap 가능)
+        metadata: (N,) metadata_dtype 구조화 배열 (mmap 가능)
+        docs: 문서별 {path, display_name} 리스트
+        centroids: IVF 중심점 (nlist, d), 전체 스캔 모드면 None
+        list_offsets: IVF 리스트별 시작 위치 (nlist+1), 전체 스캔 모드면 None
+    """
+
+    def __init__(self, vectors, metadata, docs, embedder_name, centroids=None, list_offsets=None):
+        self.vectors = vectors
+        self.metadata = metadata
+        self.docs = docs
+        self.embedder_name = embedder_name
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self._embedder = None
+
+    @property
+    def dim(self):
+        return self.vectors.shape[1]
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = get_embedder(self.embedder_name, dim=self.dim)
+        return self._embedder
+
+    def filter_mask(self, start, end, filters=None):
+        """[start, end) 구간에서 메타데이터 필터에 해당하는 행 마스크를 반환합니다."""
+        if not filters:
+            return None
+        block = self.metadata[start:end]
+        mask = np.ones(end - start, dtype=bool)
+        for key, wanted in filters.items():
+            if wanted is None:
+                continue
+            if key not in METADATA_DTYPE.names:
+                raise ValueError(f"지원하지 않는 필터 키입니다: {key}")
+            if not isinstance(wanted, (list, tuple, set)):
+                wanted = [wanted]
+            field = self.metadata.dtype[key]
+            mask &= np.isin(block[key], np.asarray(_filter_values(field, wanted), dtype=field))
+        return mask
+
+    def _candidate_ranges(self, query, nprobe):
+        if self.centroids is None:
+            return [(0, len(self.vectors))]
+        nprobe = min(nprobe, len(self.centroids))
+        list_ids = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+        return [
+            (int(self.list_offsets[i]), int(self.list_offsets[i + 1]))
+            for i in sorted(list_ids)
+            if self.list_offsets[i + 1] > self.list_offsets[i]
+        ]
+
+    def search_vectors(self, queries: np.ndarray, top_k: int = 10, filters=None, nprobe: int = 8) -> list:
+        """
+        정규화된 질의 벡터(들)로 검색합니다.
+
+        Args:
+            queries: (d,) 또는 (Q, d) 질의 행렬
+            top_k: 질의당 반환할 문서 수 (1 ~ 문서 수 범위로 보정)
+            filters: {키: 값 또는 값 리스트} 메타데이터 필터
+            nprobe: IVF 모드에서 스캔할 리스트 수
+
+        Returns:
+            질의별 [{"doc_id", "score", "path", "display_name", "metadata"}, ...] 리스트
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        top_k = max(1, min(int(top_k), len(self.vectors)))
+        if self.centroids is None:
+            # 전체 스캔 모드: 블록마다 모든 질의를 한 번의 행렬곱으로 처리
+            return self._scan([(0, len(self.vectors))], queries, top_k, filters)
+        return [
+            self._scan(self._candidate_ranges(query, nprobe), query[None, :], top_k, filters)[0]
+            for query in queries
+        ]
+
+    def _scan(self, ranges, queries, top_k, filters):
+        """ranges 구간을 블록 단위로 스캔하며 질의별 상위 top_k 후보를 모읍니다."""
+        best_ids = [[] for _ in queries]
+        best_scores = [[] for _ in queries]
+        for range_start, range_end in ranges:
+            for start in range(range_start, range_end, SCAN_BLOCK_ROWS):
+                end = min(start + SCAN_BLOCK_ROWS, range_end)
+                mask = self.filter_mask(start, end, filters)
+                if mask is not None and not mask.any():
+                    continue
+                block = np.asarray(self.vectors[start:end], dtype=np.float32)
+                ids = np.arange(start, end)
+                if mask is not None:
+                    block, ids = block[mask], ids[mask]
+                block_scores = block @ queries.T
+                for q in range(len(queries)):
+                    scores, q_ids = block_scores[:, q], ids
+                    if len(scores) > top_k:
+                        top = np.argpartition(scores, -top_k)[-top_k:]
+                        scores, q_ids = scores[top], q_ids[top]
+                    best_scores[q].append(scores)
+                    best_ids[q].append(q_ids)
+
+        return [self._rank(ids, scores, top_k) for ids, scores in zip(best_ids, best_scores)]
+
+    def _rank(self, best_ids, best_scores, top_k):
+        if not best_ids:
+            return []
+        ids = np.concatenate(best_ids)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return [
+            {
+                "doc_id": int(ids[i]),
+                "score": float(scores[i]),
+                **self.docs[ids[i]],
+                "metadata": self._metadata_dict(ids[i]),
+            }
+            for i in order
+        ]
+
+    def _metadata_dict(self, doc_id):
+        row = self.metadata[doc_id]
+        result = {}
+        for key in self.metadata.dtype.names:
+            value = row[key].item()
+            if value not in ("", 0):
+                result[key] = value
+        return result
+
+    def search(self, query: str, top_k: int = 10, filters=None, nprobe: int = 8) -> list:
+        """텍스트 질의를 임베딩하여 검색합니다."""
+        return self.search_vectors(self.embedder.embed_query(query), top_k, filters, nprobe)[0]
+
+    def save(self, index_dir: str):
+        os.makedirs(index_dir, exist_ok=True)
+        np.save(os.path.join(index_dir, "vectors.npy"), self.vectors)
+        np.save(os.path.join(index_dir, "metadata.npy"), self.metadata)
+        if self.centroids is not None:
+            np.save(os.path.join(index_dir, "centroids.npy"), self.centroids)
+            np.save(os.path.join(index_dir, "list_offsets.npy"), self.list_offsets)
+        with open(os.path.join(index_dir, DOCS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "num_docs": len(self.docs),
+                "dim": self.dim,
+                "dtype": str(self.vectors.dtype),
+                "embedder": self.embedder_name,
+                "nlist": 0 if self.centroids is None else len(self.centroids),
+            }, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True):
+        """인덱스를 로드합니다. mmap=True 이면 벡터와 메타데이터 배열을 복사 없이 매핑합니다."""
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(index_dir, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, DOCS_FILE), encoding="utf-8") as f:
+            docs = json.load(f)
+        centroids = list_offsets = None
+        if meta["nlist"]:
+            centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+            list_offsets = np.load(os.path.join(index_dir, "list_offsets.npy"))
+        return cls(
+            vectors=np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode=mmap_mode),
+            metadata=np.load(os.path.join(index_dir, "metadata.npy"), mmap_mode=mmap_mode),
+            docs=docs,
+            embedder_name=meta["embedder"],
+            centroids=centroids,
+            list_offsets=list_offsets,
+        )
+
+
+def _filter_values(field, wanted) -> list:
+    """
+    필터 값을 필드 형식으로 바꿉니다. 바꿀 수 없는 값은 어떤 행과도 일치하지 않으므로 제외합니다
+    (bm25_index 처럼 문자열로 비교: 정수 필드에 'abc', 범위를 넘는 수, 필드 폭보다 긴 문자열).
+    """
+    values = []
+    for value in wanted:
+        text = str(value).strip()
+        if field.kind == "i":
+            try:
+                number = int(text)
+            except ValueError:
+                continue
+            info = np.iinfo(field)
+            if info.min <= number <= info.max:
+                values.append(number)
+        elif len(str(value)) <= field.itemsize // 4:
+            values.append(str(value))
+    return values
+
+
+def metadata_record(metadata: dict) -> tuple:
+    """metadata_to_dict 결과를 METADATA_DTYPE 행으로 변환합니다."""
+    return tuple(
+        metadata.get(key) or (0 if METADATA_DTYPE[key].kind == "i" else "")
+        for key in METADATA_DTYPE.names
+    )
+
+
+def metadata_dtype(metadata_rows) -> np.dtype:
+    """METADATA_DTYPE 의 문자열 필드 폭을 metadata_rows 의 최대 길이에 맞춘 형식을 반환합니다."""
+    fields = []
+    for position, key in enumerate(METADATA_DTYPE.names):
+        field = METADATA_DTYPE[key]
+        if field.kind == "U":
+            width = max((len(str(row[position])) for row in metadata_rows), default=0)
+            field = np.dtype(f"U{max(width, field.itemsize // 4)}")
+        fields.append((key, field))
+    return np.dtype(fields)
+
+
+def create_index(vectors, metadata_rows, docs, embedder_name, dtype="float16", nlist=0) -> VectorIndex:
+    """
+    임베딩 행렬과 메타데이터로 VectorIndex 를 만듭니다.
+    nlist > 0 이면 IVF 리스트 순서로 행을 재배열합니다.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    metadata = np.array(metadata_rows, dtype=metadata_dtype(metadata_rows))
+    centroids = list_offsets = None
+
+    if nlist and len(vectors) >= nlist:
+        centroids = train_kmeans(vectors, nlist)
+        assignments = assign_lists(vectors, centroids)
+        order = np.argsort(assignments, kind="stable")
+        vectors, metadata = vectors[order], metadata[order]
+        docs = [docs[i] for i in order]
+        list_offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=nlist), out=list_offsets[1:])
+
+    return VectorIndex(vectors.astype(dtype), metadata, docs, embedder_name, centroids, list_offsets)
+
+
+def build_index(data_root_dir: str, index_dir: str, embedder, dtype="float16", nlist=0,
+                batch_size=64, text_loader=extract_text) -> VectorIndex:
+    """
+    data_root_dir 을 순회하며 임베딩 인덱스를 만들고 index_dir 에 저장합니다.
+
+    Args:
+        data_root_dir: 승인 문서 코퍼스 루트
+        index_dir: 인덱스를 저장할 디렉토리
+        embedder: HashingEmbedder 또는 GeminiEmbedder
+        dtype: 저장 정밀도 ('float16' 또는 'float32')
+        nlist: IVF 리스트 수, 0이면 전체 스캔 모드
+        batch_size: 임베딩 호출당 문서 수
+        text_loader: 파일 경로를 받아 텍스트를 반환하는 함수
+    """
+    print(f"벡터 인덱스 생성 시작: {data_root_dir} (임베더: {embedder.name}, {embedder.dim}차원)")
+    start_time = time.time()
+    vectors, metadata_rows, docs = [], [], []
+    pending_texts, pending_docs = [], []
+    skipped_count = 0
+
+    def flush():
+        if pending_texts:
+            vectors.append(embedder.embed_documents(pending_texts))
+            for doc, meta in pending_docs:
+                docs.append(doc)
+                metadata_rows.append(metadata_record(meta))
+            pending_texts.clear()
+            pending_docs.clear()
+
+    for file_path in iter_corpus_files(data_root_dir):
+        metadata = parse_metadata_for_store(file_path, data_root_dir)
+        if not metadata:
+            skipped_count += 1
+            continue
+        try:
+            text = text_loader(file_path)
+        except Exception as e:
+            print(f"  ✗ 텍스트 추출 실패: {os.path.basename(file_path)} ({e})")
+            skipped_count += 1
+            continue
+        if not text.strip():
+            skipped_count += 1
+            continue
+
+        relative_path = os.path.relpath(file_path, data_root_dir)
+        pending_texts.append(text)
+        pending_docs.append(({"path": relative_path, "display_name": os.path.basename(file_path)},
+                             metadata_to_dict(metadata)))
+        if len(pending_texts) >= batch_size:
+            flush()
+            print(f"  - {len(docs)}개 문서 임베딩됨...")
+    flush()
+
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, embedder.dim), np.float32)
+    index = create_index(matrix, metadata_rows, docs, embedder.name, dtype=dtype, nlist=nlist)
+    index.save(index_dir)
+
+    print(f"\n{'='*60}")
+    print(f"임베딩된 문서: {len(docs)}개 / 건너뜀: {skipped_count}개")
+    print(f"행렬: {index.vectors.shape} {index.vectors.dtype} / IVF 리스트: {nlist or '사용 안 함'}")
+    print(f"소요 시간: {time.time() - start_time:.1f}초")
+    print(f"저장 위치: {index_dir}")
+    print(f"{'='*60}")
+    return index
+
+
+# --- API 서버용 인프로세스 API ---
+
+_loaded_indexes = {}
+
+
+def get_index(index_dir: str) -> VectorIndex:
+    """프로세스당 한 번만 인덱스를 매핑하여 재사용합니다."""
+    index = _loaded_indexes.get(index_dir)
+    if index is None:
+        index = _loaded_indexes[index_dir] = VectorIndex.load(index_dir)
+    return index
+
+
+def search(index_dir: str, query: str, top_k: int = 10, filters=None, nprobe: int = 8) -> list:
+    """index_dir 의 인덱스에서 검색합니다. Flask 핸들러에서 직접 호출할 수 있습니다."""
+    return get_index(index_dir).search(query, top_k=top_k, filters=filters, nprobe=nprobe)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="로컬 밀집 벡터 인덱스 생성 및 검색")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="코퍼스에서 인덱스 생성")
+    build_parser.add_argument("data_dir", help="승인 문서 루트 디렉토리")
+    build_parser.add_argument("index_dir", help="인덱스 저장 디렉토리")
+    build_parser.add_argument("--embedder", default=GeminiEmbedder.name, choices=list(EMBEDDERS))
+    build_parser.add_argument("--dim", type=int, help="임베딩 차원")
+    build_parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    build_parser.add_argument("--nlist", type=int, default=0, help="IVF 리스트 수 (0이면 전체 스캔)")
+
+    query_parser = subparsers.add_parser("query", help="인덱스 검색")
+    query_parser.add_argument("index_dir", help="인덱스 디렉토리")
+    query_parser.add_argument("query", help="검색어")
+    query_parser.add_argument("--top-k", type=int, default=10)
+    query_parser.add_argument("--nprobe", type=int, default=8)
+    query_parser.add_argument("--grade", type=int)
+    query_parser.add_argument("--code", help="품목코드 (classification_number)")
+    query_parser.add_argument("--section", help="항목 (document_section)")
+    query_parser.add_argument("--approval", help="허가번호 (approval_number)")
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.data_dir, args.index_dir, get_embedder(args.embedder, args.dim),
+                    dtype=args.dtype, nlist=args.nlist)
+        return
+
+    filters = {
+        "grade": args.grade,
+        "classification_number": args.code,
+        "document_section": args.section,
+        "approval_number": args.approval,
+    }
+    index = get_index(args.index_dir)
+    start_time = time.perf_counter()
+    results = index.search(args.query, top_k=args.top_k, filters=filters, nprobe=args.nprobe)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    print(f"검색 결과 {len(results)}건 ({elapsed_ms:.2f} ms)")
+    for rank, result in enumerate(results, 1):
+        meta = result["metadata"]
+        print(f"{rank:2d}. [{result['score']:.3f}] {result['display_name']}")
+        print(f"    {meta.get('grade')}등급 / {meta.get('classification_number')} / {meta.get('document_section')}")
+
+
+if __name__ == "__main__":
+    main()